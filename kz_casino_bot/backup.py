@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Sauvegardes à chaud de la base (API backup de SQLite).
+
+Copier casino.db pendant que le bot écrit (WAL) donne un fichier incohérent.
+Ici la copie passe par sqlite3.Connection.backup, par petites étapes
+(Database.backup_to), puis est compressée en gzip:
+
+    BACKUP_DIR/casino-YYYYmmdd-HHMMSS-<label>.db.gz
+
+label = auto (tâche planifiée), manual (/backup now), pre-wipeall, pre-restore.
+On garde les BACKUP_KEEP plus récents de chaque label. Inspection et
+restauration passent par une copie décompressée temporaire, ouverte en
+lecture seule.
+"""
+from __future__ import annotations
+
+import asyncio
+import calendar
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+from .db import Database
+from .metrics import METRICS
+
+_NAME_RE = re.compile(r"^casino-(\d{8}-\d{6})-([a-z0-9-]+)\.db\.gz$")
+
+METRICS.describe("kz_backups_total", "counter", "Sauvegardes de la base (label, result=ok|error)")
+
+
+@dataclass(frozen=True, slots=True)
+class SnapshotInfo:
+    name: str
+    path: str
+    label: str
+    created: float  # epoch (UTC)
+    size: int  # octets (compressé)
+
+
+class BackupManager:
+    def __init__(self, db: Database, directory: str, keep: int = 14, pages: int = 256, pause: float = 0.01):
+        self.db = db
+        self.directory = directory
+        self.keep = max(1, int(keep))
+        self.pages = int(pages)
+        self.pause = float(pause)
+        self._lock = threading.Lock()  # une seule copie / restauration à la fois
+        self.last_ok: float | None = None
+        METRICS.gauge("kz_backup_age_seconds", self._age, "Âge de la dernière sauvegarde réussie")
+
+    def _age(self) -> float:
+        return float("nan") if self.last_ok is None else time.time() - self.last_ok
+
+    # ---------- fichiers ----------
+    def list_snapshots(self) -> list[SnapshotInfo]:
+        """Snapshots présents, du plus récent au plus ancien."""
+        out: list[SnapshotInfo] = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return out
+        for name in names:
+            m = _NAME_RE.match(name)
+            if not m:
+                continue
+            path = os.path.join(self.directory, name)
+            created = calendar.timegm(time.strptime(m.group(1), "%Y%m%d-%H%M%S"))
+            out.append(SnapshotInfo(name, path, m.group(2), created, os.path.getsize(path)))
+        return sorted(out, key=lambda s: s.name, reverse=True)
+
+    def _resolve(self, name: str) -> SnapshotInfo:
+        for snap in self.list_snapshots():
+            if snap.name == name:
+                return snap
+        raise FileNotFoundError(name)
+
+    def _rotate(self, label: str) -> None:
+        for snap in [s for s in self.list_snapshots() if s.label == label][self.keep:]:
+            os.remove(snap.path)
+
+    @contextmanager
+    def _decompressed(self, snap: SnapshotInfo) -> Iterator[str]:
+        fd, raw = tempfile.mkstemp(suffix=".db", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as out, gzip.open(snap.path, "rb") as src:
+                shutil.copyfileobj(src, out, 1 << 20)
+            yield raw
+        finally:
+            os.remove(raw)
+
+    # ---------- opérations (bloquantes: via asyncio.to_thread) ----------
+    def snapshot(self, label: str = "manual") -> SnapshotInfo:
+        """Copie à chaud + compression + rotation. Retourne le snapshot créé."""
+        label = re.sub(r"[^a-z0-9-]+", "-", label.lower()).strip("-") or "manual"
+        with self._lock:
+            return self._snapshot(label)
+
+    def _snapshot(self, label: str) -> SnapshotInfo:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"casino-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{label}.db.gz"
+        path = os.path.join(self.directory, name)
+        fd, raw = tempfile.mkstemp(suffix=".db", dir=self.directory)
+        os.close(fd)
+        try:
+            self.db.backup_to(raw, self.pages, self.pause)
+            with open(raw, "rb") as src, gzip.open(path + ".part", "wb", compresslevel=6) as out:
+                shutil.copyfileobj(src, out, 1 << 20)
+            os.replace(path + ".part", path)
+        except Exception:
+            METRICS.inc("kz_backups_total", label=label, result="error")
+            if os.path.exists(path + ".part"):
+                os.remove(path + ".part")
+            raise
+        finally:
+            os.remove(raw)
+        METRICS.inc("kz_backups_total", label=label, result="ok")
+        self.last_ok = time.time()
+        self._rotate(label)
+        return self._resolve(name)
+
+    def inspect(self, name: str) -> dict:
+        """Résumé d'un snapshot, lu en lecture seule (la base live n'est pas touchée)."""
+        snap = self._resolve(name)
+        with self._decompressed(snap) as raw:
+            con = sqlite3.connect(f"file:{raw}?mode=ro", uri=True)
+            try:
+                one = lambda sql: con.execute(sql).fetchone()[0]
+                return {
+                    "name": snap.name,
+                    "label": snap.label,
+                    "created": snap.created,
+                    "size": snap.size,
+                    "raw_size": os.path.getsize(raw),
+                    "integrity": str(one("PRAGMA quick_check")),
+                    "users": int(one("SELECT COUNT(*) FROM users")),
+                    "total_balance": int(one("SELECT COALESCE(SUM(balance), 0) FROM users")),
+                    "active_loans": int(one("SELECT COUNT(*) FROM loans WHERE status='ACTIVE'")),
+                    "predictions": int(one("SELECT COUNT(*) FROM predictions")),
+                }
+            finally:
+                con.close()
+
+    def restore(self, name: str) -> SnapshotInfo:
+        """Remplace la base live par un snapshot (un snapshot pre-restore est pris avant)."""
+        snap = self._resolve(name)
+        with self._lock:
+            self._snapshot("pre-restore")
+            with self._decompressed(snap) as raw:
+                con = sqlite3.connect(f"file:{raw}?mode=ro", uri=True)
+                try:
+                    check = str(con.execute("PRAGMA quick_check").fetchone()[0])
+                finally:
+                    con.close()
+                if check != "ok":
+                    raise sqlite3.DatabaseError(f"snapshot corrompu: {check}")
+                self.db.restore_from(raw)
+        return snap
+
+    # ---------- planification ----------
+    async def run(self, interval_s: float) -> None:
+        """Snapshot « auto » toutes les interval_s secondes (à lancer dans la boucle)."""
+        snaps = [s for s in self.list_snapshots() if s.label == "auto"]
+        if snaps:
+            self.last_ok = snaps[0].created
+        while True:
+            last = self.last_ok or 0.0
+            await asyncio.sleep(max(0.0, last + interval_s - time.time()))
+            try:
+                snap = await asyncio.to_thread(self.snapshot, "auto")
+                print(f"💾 Sauvegarde: {snap.name} ({snap.size / 1e6:.1f} Mo)")
+            except Exception as e:
+                print(f"⚠️ Sauvegarde: {type(e).__name__}: {e}")
+                await asyncio.sleep(min(interval_s, 600))
@@ -7,7 +7,7 @@ from discord import app_commands
 from discord.ext import commands
 
 from .. import config
-from ..db import Database
+from ..db import Database, Reason
 from ..utils import fmt
 
 # (Option) salon AFK à ignorer (mets l'ID sinon laisse None)
@@ -70,7 +70,7 @@ class ActivityRewardsCog(commands.Cog):
         target = int(getattr(config, "ACTIVITY_MSG_TARGET", 100))
         reward = int(getattr(config, "ACTIVITY_MSG_REWARD", 100))
         if target > 0 and total % target == 0:
-            self.db.add_balance(uid, reward)
+            self.db.add_balance(uid, reward, reason=Reason.ACTIVITY)
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
@@ -124,7 +124,7 @@ class ActivityRewardsCog(commands.Cog):
         earned_after = total // target
         diff = earned_after - earned_before
         if diff > 0:
-            self.db.add_balance(user_id, reward * diff)
+            self.db.add_balance(user_id, reward * diff, reason=Reason.ACTIVITY)
 
     @app_commands.command(name="activite", description="📊 Voir tes récompenses d'activité (messages + vocal)")
     async def activite(self, interaction: discord.Interaction):
@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from datetime import timedelta
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
 import asyncio
+import io
 
 import json
 
@@ -11,10 +13,15 @@ from discord import app_commands
 from discord.ext import commands
 
 from .. import config
-from ..db import Database
-from ..shop_data import get_item
+from ..backup import BackupManager
+from ..db import Database, Reason
+from ..embed_cache import EMBEDS
+from ..export import export_economy
+from ..level_recompute import LevelRecompute, RecomputeProgress
+from ..shop_data import catalog, get_item, items_from_json, items_to_json, load_catalog
 from ..utils import embed_info, embed_lose, embed_neutral, embed_win, fmt, human_time, now_utc, parse_dt
 from ..checks import is_bot_admin, is_owner
+from ..leveling import level_from_xp, title_and_icon_for_level, xp_for_level, xp_progress
 
 
 # ============================================
@@ -23,10 +30,118 @@ from ..checks import is_bot_admin, is_owner
 
 from ..odds import TUNABLE_PARAMS, CATEGORIES, get_param_value, set_param_value, reset_param
 
+# Libellés des codes motif du ledger (/ledger)
+REASON_LABELS: dict[int, str] = {
+    Reason.OTHER: "Autre",
+    Reason.START: "Solde de départ",
+    Reason.ADMIN: "Admin",
+    Reason.WIPE: "Wipe",
+    Reason.DAILY: "Daily",
+    Reason.WEEKLY: "Weekly",
+    Reason.WORK: "Work",
+    Reason.TRANSFER: "Virement",
+    Reason.GIFT: "Gift",
+    Reason.ACTIVITY: "Activité",
+    Reason.LEVEL_UP: "Level up",
+    Reason.CHEST: "Coffre",
+    Reason.GAME_BET: "Mise jeu",
+    Reason.GAME_PAYOUT: "Gain jeu",
+    Reason.GAME_REFUND: "Remboursement jeu",
+    Reason.STEAL: "Vol",
+    Reason.SABOTAGE: "Sabotage",
+    Reason.PVP_STAKE: "Mise PvP",
+    Reason.PVP_PAYOUT: "Gain PvP",
+    Reason.PVP_REFUND: "Remboursement PvP",
+    Reason.SHOP: "Boutique",
+    Reason.PREDICTION_STAKE: "Mise prediction",
+    Reason.PREDICTION_PAYOUT: "Gain prediction",
+    Reason.PREDICTION_REFUND: "Remboursement prediction",
+    Reason.LOAN_DISBURSE: "Prêt versé",
+    Reason.LOAN_REPAY: "Remboursement prêt",
+    Reason.LOAN_AUTO: "Prélèvement prêt",
+}
+
+
+def _odds_help_embed() -> discord.Embed:
+    e = discord.Embed(title="ℹ️ Aide — /odds", color=config.BRAND["info"])
+    e.description = (
+        "Avec `/odds`, tu règles les paramètres sans toucher au code.\n\n"
+        "**Commandes :**\n"
+        "• `/odds list` → affiche tous les paramètres\n"
+        "• `/odds set <param> <valeur>` → modifie un paramètre\n"
+        "• `/odds reset <param|all>` → remet par défaut\n\n"
+        "**Formats importants :**\n"
+        "• Probabilités / pourcentages : **0.25 = 25%** (valeur entre 0 et 1)\n"
+        "• Ex: `steal_success_rate 0.30` = 30%\n"
+        "• Ex: `steal_steal_pct 0.12` = vole 12%\n"
+    )
+    e.add_field(
+        name="Exemples rapides",
+        value=(
+            "`/odds set steal_success_rate 0.30`\n"
+            "`/odds set steal_steal_pct 0.12`\n"
+            "`/odds set sabotage_success_rate 0.10`\n"
+            "`/odds set bot_win_chance 0.60`\n"
+            "`/odds reset steal_success_rate`\n"
+            "`/odds reset all`"
+        ),
+        inline=False,
+    )
+    return e
+
+
 class AdminCog(commands.Cog):
     def __init__(self, bot: commands.Bot, db: Database):
         self.bot = bot
         self.db = db
+        self._snapshot_task: asyncio.Task | None = None
+        self.backups = BackupManager(
+            db, config.BACKUP_DIR, config.BACKUP_KEEP, config.BACKUP_PAGES_PER_STEP, config.BACKUP_STEP_PAUSE_S
+        )
+        self._backup_task: asyncio.Task | None = None
+        self.levels = LevelRecompute(
+            db,
+            int(getattr(config, "XP_LEVEL_CAP", 100)),
+            config.LEVEL_RECOMPUTE_CHUNK,
+            config.LEVEL_RECOMPUTE_PAUSE_S,
+            config.LEVEL_RECOMPUTE_MAX_LOCK_MS,
+        )
+        self._levels_task: asyncio.Task | None = None
+
+    async def cog_load(self):
+        if config.IS_PRIMARY:  # un seul process par base
+            self._snapshot_task = asyncio.create_task(self._nightly_snapshots())
+            if config.BACKUP_ENABLED:
+                self._backup_task = asyncio.create_task(self.backups.run(config.BACKUP_INTERVAL_H * 3600))
+            if config.LEVEL_RECOMPUTE_AUTO:
+                self._levels_task = asyncio.create_task(self._recompute_levels_if_needed())
+
+    async def cog_unload(self):
+        for task in (self._snapshot_task, self._backup_task, self._levels_task):
+            if task:
+                task.cancel()
+
+    async def _recompute_levels_if_needed(self):
+        """Courbe d'XP, cap ou grades modifiés depuis le dernier passage: niveaux stockés recalculés (ou reprise)."""
+        try:
+            if not await self.levels.needed():
+                return
+            p = await self.levels.run()
+            print(f"📈 Niveaux recalculés: {p.changed}/{p.scanned} joueurs modifiés en {p.elapsed:.1f}s")
+        except Exception as e:
+            print(f"⚠️ Recalcul des niveaux: {type(e).__name__}: {e}")
+
+    async def _nightly_snapshots(self):
+        """Snapshot des soldes chaque nuit (00:05 UTC) pour les audits /ledger."""
+        while True:
+            now = datetime.now(timezone.utc)
+            nxt = (now + timedelta(days=1)).replace(hour=0, minute=5, second=0, microsecond=0)
+            await asyncio.sleep((nxt - now).total_seconds())
+            try:
+                n = await asyncio.to_thread(self.db.snapshot_balances)
+                print(f"📸 Snapshot des soldes: {n} joueurs")
+            except Exception as e:
+                print(f"⚠️ Snapshot des soldes: {type(e).__name__}: {e}")
 
     def _is_admin(self, interaction: discord.Interaction) -> bool:
         return is_owner(interaction) or is_bot_admin(self.db, interaction)
@@ -49,7 +164,7 @@ class AdminCog(commands.Cog):
             return await interaction.response.send_message(embed=embed_lose("❌", "Accès refusé."), ephemeral=True)
 
         self.db.ensure_user(user.id, config.START_BALANCE)
-        new_bal = self.db.add_balance(user.id, int(amount))
+        new_bal = self.db.add_balance(user.id, int(amount), reason=Reason.ADMIN, ref_id=interaction.user.id)
 
         e = embed_win("🎁 Give", f"{user.mention} a reçu **{fmt(amount)}** KZ\nNouveau solde: **{fmt(new_bal)}** KZ")
         await interaction.response.send_message(embed=e)
@@ -64,10 +179,10 @@ class AdminCog(commands.Cog):
         current = int(row["balance"]) if row else 0
         
         if amount == 0:
-            self.db.set_balance(user.id, 0)
+            self.db.set_balance(user.id, 0, reason=Reason.ADMIN, ref_id=interaction.user.id)
             await interaction.response.send_message(embed=embed_win("💸 Take All", f"{user.mention} → **-{fmt(current)}** KZ confisqués\nNouveau solde: **0** KZ"))
         else:
-            new_bal = self.db.remove_balance(user.id, amount)
+            new_bal = self.db.remove_balance(user.id, amount, reason=Reason.ADMIN, ref_id=interaction.user.id)
             taken = min(amount, current)
             await interaction.response.send_message(embed=embed_win("💸 Take", f"{user.mention} → **-{fmt(taken)}** KZ\nNouveau solde: **{fmt(new_bal)}** KZ"))
 
@@ -79,7 +194,7 @@ class AdminCog(commands.Cog):
         self.db.ensure_user(user.id, config.START_BALANCE)
         row = self.db.get_user(user.id)
         old = int(row["balance"]) if row else 0
-        self.db.set_balance(user.id, amount)
+        self.db.set_balance(user.id, amount, reason=Reason.ADMIN, ref_id=interaction.user.id)
         await interaction.response.send_message(embed=embed_win("💰 SetBal", f"{user.mention}\n**{fmt(old)}** → **{fmt(amount)}** KZ"))
 
     @app_commands.command(name="giveitem", description="📦 Donner un item à un joueur")
@@ -163,7 +278,7 @@ class AdminCog(commands.Cog):
         self.db.ensure_user(user.id, config.START_BALANCE)
         row = self.db.get_user(user.id)
         old = int(row["balance"]) if row else 0
-        self.db.set_balance(user.id, 0)
+        self.db.set_balance(user.id, 0, reason=Reason.ADMIN, ref_id=interaction.user.id)
         await interaction.response.send_message(embed=embed_win("💸 Clear Coins", f"{user.mention} → **-{fmt(old)}** KZ\nNouveau solde: **0** KZ"))
 
     @app_commands.command(name="clearinv", description="📦 Vider l'inventaire d'un joueur")
@@ -210,8 +325,304 @@ class AdminCog(commands.Cog):
             return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
         if confirm.lower() != "oui":
             return await interaction.response.send_message(embed=embed_lose("⚠️ Attention", "Tape `/wipeall confirm:oui` pour confirmer"), ephemeral=True)
-        self.db.wipe_all_users()
-        await interaction.response.send_message(embed=embed_win("🔥 Wipe Global", "Tous les joueurs ont été reset"))
+        await interaction.response.defer(thinking=True)
+        try:
+            snap = await asyncio.to_thread(self.backups.snapshot, "pre-wipeall")
+        except Exception as e:
+            return await interaction.followup.send(
+                embed=embed_lose("❌ Wipe annulé", f"Sauvegarde préalable impossible: `{type(e).__name__}: {e}`")
+            )
+        await asyncio.to_thread(self.db.wipe_all_users)
+        await interaction.followup.send(
+            embed=embed_win("🔥 Wipe Global", f"Tous les joueurs ont été reset\n💾 Sauvegarde: `{snap.name}`")
+        )
+
+    @app_commands.command(name="ledger", description="🧾 Historique des mouvements de KZ d'un joueur (admin)")
+    @app_commands.describe(user="Joueur ciblé", limite="Nombre de mouvements (max 25)")
+    async def ledger(self, interaction: discord.Interaction, user: discord.Member, limite: app_commands.Range[int, 1, 25] = 15):
+        if not self._is_admin(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Accès refusé."), ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            rows = await self._db_call(self.db.ledger_for_user, user.id, int(limite))
+            audit = await self._db_call(self.db.ledger_audit, user.id)
+        except asyncio.TimeoutError:
+            return await interaction.followup.send(
+                embed=embed_lose("⏱️", "Timeout", "La base de données est occupée. Réessaie dans quelques secondes."),
+                ephemeral=True,
+            )
+
+        lines = []
+        for r in rows:
+            delta = int(r["delta"])
+            label = REASON_LABELS.get(int(r["reason_code"]), f"#{r['reason_code']}")
+            ref = f" (réf {r['ref_id']})" if r["ref_id"] is not None else ""
+            lines.append(f"<t:{int(r['ts'])}:f> **{'+' if delta > 0 else ''}{fmt(delta)}** — {label}{ref}")
+
+        e = embed_info(f"🧾 Ledger — {user.display_name}", "\n".join(lines) or "Aucun mouvement.")
+        snap = audit["snapshot_day"] or "aucun"
+        check = "✅" if audit["expected"] == audit["actual"] else "⚠️"
+        e.add_field(
+            name="🔎 Audit",
+            value=(
+                f"Snapshot ({snap}) : **{fmt(audit['snapshot_balance'])}**\n"
+                f"Mouvements depuis : **{fmt(audit['delta_since'])}**\n"
+                f"{check} Attendu **{fmt(audit['expected'])}** / actuel **{fmt(audit['actual'])}**"
+            ),
+            inline=False,
+        )
+        await interaction.followup.send(embed=e, ephemeral=True)
+
+    @app_commands.command(name="loop", description="🩺 Lag de la boucle et callbacks bloquants récents (admin)")
+    async def loop_status(self, interaction: discord.Interaction):
+        if not self._is_admin(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Accès refusé."), ephemeral=True)
+        monitor = getattr(self.bot, "loopmon", None)
+        if monitor is None:
+            return await interaction.response.send_message(
+                embed=embed_lose("🩺", "Surveillance désactivée (LOOPMON_ENABLED=0)."), ephemeral=True
+            )
+        st = monitor.stats()
+        ms = lambda s: f"{s * 1000:.0f} ms"
+        e = embed_info(
+            "🩺 Boucle asyncio",
+            f"Lag (fenêtre {st['window_s']:.0f}s) — p50 **{ms(st['lag_p50'])}** · p95 **{ms(st['lag_p95'])}** · "
+            f"p99 **{ms(st['lag_p99'])}** · max **{ms(st['lag_max'])}**\n"
+            f"Blocages ≥ {ms(monitor.stall_threshold)} sur la fenêtre : **{st['stalls_recent']}**",
+        )
+        if st["top_handlers"]:
+            e.add_field(
+                name="🔥 Pires handlers",
+                value="\n".join(f"`{h}` — {n}× / {ms(total)}" for h, (n, total) in st["top_handlers"]),
+                inline=False,
+            )
+        for s in list(monitor.stalls)[-3:][::-1]:
+            stack = s.stacks[0][-4:] if s.stacks else []
+            body = f"tâche `{s.task}` · <t:{int(s.ts)}:R>"
+            if stack:
+                body += "\n```\n" + "\n".join(stack) + "\n```"
+            e.add_field(name=f"⏱️ {ms(s.duration)} — {s.handler}"[:256], value=body[:1024], inline=False)
+        await interaction.response.send_message(embed=e, ephemeral=True)
+
+
+    # ============================================
+    # SAUVEGARDES (groupe /backup)
+    # ============================================
+    backup_group = app_commands.Group(name="backup", description="Sauvegardes à chaud de la base (Owner)")
+
+    @backup_group.command(name="now", description="💾 Prendre une sauvegarde maintenant")
+    async def backup_now(self, interaction: discord.Interaction):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        t = asyncio.get_running_loop().time()
+        try:
+            snap = await asyncio.to_thread(self.backups.snapshot, "manual")
+        except Exception as e:
+            return await interaction.followup.send(embed=embed_lose("❌ Sauvegarde", f"`{type(e).__name__}: {e}`"), ephemeral=True)
+        took = asyncio.get_running_loop().time() - t
+        await interaction.followup.send(
+            embed=embed_win("💾 Sauvegarde", f"`{snap.name}`\n{snap.size / 1e6:.2f} Mo en {took:.1f}s"), ephemeral=True
+        )
+
+    @backup_group.command(name="list", description="📋 Voir les sauvegardes disponibles")
+    async def backup_list(self, interaction: discord.Interaction):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        snaps = await asyncio.to_thread(self.backups.list_snapshots)
+        lines = [f"`{s.name}` — {s.size / 1e6:.2f} Mo · <t:{int(s.created)}:R>" for s in snaps[:20]]
+        e = embed_info("💾 Sauvegardes", "\n".join(lines) or "Aucune sauvegarde.")
+        e.set_footer(text=f"{len(snaps)} fichier(s) dans {config.BACKUP_DIR}")
+        await interaction.response.send_message(embed=e, ephemeral=True)
+
+    @backup_group.command(name="export", description="📤 Exporter l'économie en CSV (analyse hors ligne)")
+    @app_commands.describe(days="Ledger des N derniers jours seulement (vide = tout)")
+    async def backup_export(self, interaction: discord.Interaction, days: app_commands.Range[int, 1, 3650] | None = None):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        since = int(datetime.now(timezone.utc).timestamp()) - days * 86400 if days else None
+        try:
+            info = await asyncio.to_thread(
+                export_economy,
+                self.db,
+                config.EXPORT_DIR,
+                since_ts=since,
+                chunk=config.EXPORT_CHUNK_ROWS,
+                keep=config.EXPORT_KEEP,
+            )
+        except Exception as e:
+            return await interaction.followup.send(embed=embed_lose("❌ Export", f"`{type(e).__name__}: {e}`"), ephemeral=True)
+        lines = [f"`{table}` — **{fmt(n)}** lignes" for table, n in info.rows.items()]
+        e = embed_win("📤 Export", "\n".join(lines))
+        e.set_footer(text=f"{info.path} · {info.size / 1e6:.2f} Mo en {info.seconds:.1f}s")
+        await interaction.followup.send(embed=e, ephemeral=True)
+
+    @backup_group.command(name="inspect", description="🔎 Inspecter une sauvegarde (lecture seule)")
+    @app_commands.describe(name="Nom du fichier (voir /backup list)")
+    async def backup_inspect(self, interaction: discord.Interaction, name: str):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            info = await asyncio.to_thread(self.backups.inspect, name)
+        except FileNotFoundError:
+            return await interaction.followup.send(embed=embed_lose("❌", "Sauvegarde introuvable."), ephemeral=True)
+        check = "✅" if info["integrity"] == "ok" else f"⚠️ {info['integrity']}"
+        await interaction.followup.send(
+            embed=embed_info(
+                f"🔎 {info['name']}",
+                f"Créée <t:{int(info['created'])}:f> · {info['size'] / 1e6:.2f} Mo (brut {info['raw_size'] / 1e6:.2f} Mo)\n"
+                f"Intégrité : {check}\n"
+                f"Joueurs : **{fmt(info['users'])}** · KZ en circulation : **{fmt(info['total_balance'])}**\n"
+                f"Prêts actifs : **{info['active_loans']}** · Prédictions en attente : **{info['predictions']}**",
+            ),
+            ephemeral=True,
+        )
+
+    @backup_group.command(name="restore", description="⏪ Restaurer une sauvegarde (remplace TOUTE la base)")
+    @app_commands.describe(name="Nom du fichier (voir /backup list)", confirm="Écrire 'oui' pour confirmer")
+    async def backup_restore(self, interaction: discord.Interaction, name: str, confirm: str = ""):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        if confirm.lower() != "oui":
+            return await interaction.response.send_message(
+                embed=embed_lose("⚠️ Attention", "Tape `/backup restore confirm:oui` pour confirmer"), ephemeral=True
+            )
+        await interaction.response.defer(thinking=True)
+        try:
+            snap = await asyncio.to_thread(self.backups.restore, name)
+        except FileNotFoundError:
+            return await interaction.followup.send(embed=embed_lose("❌", "Sauvegarde introuvable."))
+        except Exception as e:
+            return await interaction.followup.send(embed=embed_lose("❌ Restauration", f"`{type(e).__name__}: {e}`"))
+        await interaction.followup.send(
+            embed=embed_win("⏪ Base restaurée", f"Depuis `{snap.name}`\n(état précédent sauvegardé en `pre-restore`)")
+        )
+
+    @backup_inspect.autocomplete("name")
+    @backup_restore.autocomplete("name")
+    async def backup_name_ac(self, interaction: discord.Interaction, current: str):
+        snaps = await asyncio.to_thread(self.backups.list_snapshots)
+        return [app_commands.Choice(name=s.name, value=s.name) for s in snaps if current.lower() in s.name][:25]
+
+
+    # ============================================
+    # CATALOGUE DU SHOP (groupe /catalog)
+    # ============================================
+    catalog_group = app_commands.Group(name="catalog", description="Catalogue du shop, versionné en base (Owner)")
+
+    async def _reload_catalog(self) -> int:
+        shop = self.bot.get_cog("ShopCog")
+        if shop is not None:
+            return await shop.reload_catalog()  # type: ignore[attr-defined]
+        return (await asyncio.to_thread(load_catalog, self.db)).version
+
+    async def _publish_catalog(self, interaction: discord.Interaction, items_json: str, note: str) -> None:
+        try:
+            items = items_from_json(items_json)
+        except ValueError as e:
+            return await interaction.followup.send(embed=embed_lose("❌ Catalogue refusé", f"`{e}`"), ephemeral=True)
+        version = await asyncio.to_thread(
+            self.db.catalog_publish, items_to_json(items), note[:200], interaction.user.id
+        )
+        live = await self._reload_catalog()
+        await interaction.followup.send(
+            embed=embed_win("🛒 Catalogue publié", f"Version **{version}** ({len(items)} items) — en service: **v{live}**\n{note}"),
+            ephemeral=True,
+        )
+
+    @catalog_group.command(name="versions", description="📋 Voir les versions du catalogue")
+    async def catalog_versions(self, interaction: discord.Interaction):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        rows = await asyncio.to_thread(self.db.catalog_versions, 15)
+        live = catalog().version
+        lines = [
+            f"{'▶️' if int(r['version']) == live else '▫️'} **v{r['version']}** — {r['note'] or '—'}"
+            f" · <t:{int(datetime.fromisoformat(r['created_at']).timestamp())}:R>"
+            + (f" · <@{r['created_by']}>" if r["created_by"] else "")
+            for r in rows
+        ]
+        e = embed_info("🛒 Catalogue du shop", "\n".join(lines) or "Aucune version.")
+        e.set_footer(text=f"En service: v{live} • {len(catalog().items)} items")
+        await interaction.response.send_message(embed=e, ephemeral=True)
+
+    @catalog_group.command(name="export", description="📤 Exporter une version en JSON")
+    @app_commands.describe(version="Version (défaut: celle en service)")
+    async def catalog_export(self, interaction: discord.Interaction, version: int | None = None):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        row = await asyncio.to_thread(self.db.catalog_get, version if version is not None else catalog().version)
+        if row is None:
+            return await interaction.response.send_message(embed=embed_lose("❌", "Version introuvable."), ephemeral=True)
+        data = io.BytesIO(str(row["items_json"]).encode("utf-8"))
+        await interaction.response.send_message(
+            f"Catalogue v{row['version']} — modifie-le puis `/catalog import`.",
+            file=discord.File(data, filename=f"catalog-v{row['version']}.json"),
+            ephemeral=True,
+        )
+
+    @catalog_group.command(name="import", description="📥 Publier un catalogue JSON (nouvelle version, active aussitôt)")
+    @app_commands.describe(file="Fichier JSON (format de /catalog export)", note="Description de la modification")
+    async def catalog_import(self, interaction: discord.Interaction, file: discord.Attachment, note: str = "import"):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        if file.size > 1_000_000:
+            return await interaction.response.send_message(embed=embed_lose("❌", "Fichier trop gros (1 Mo max)."), ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            text = (await file.read()).decode("utf-8")
+        except UnicodeDecodeError:
+            return await interaction.followup.send(embed=embed_lose("❌", "Le fichier doit être en UTF-8."), ephemeral=True)
+        await self._publish_catalog(interaction, text, note)
+
+    @catalog_group.command(name="setprice", description="💲 Changer le prix d'un item (nouvelle version)")
+    @app_commands.describe(item="ID de l'item", price="Nouveau prix unitaire")
+    async def catalog_setprice(self, interaction: discord.Interaction, item: str, price: app_commands.Range[int, 0, 1_000_000_000]):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        cat = catalog()
+        it = cat.get(item)
+        if it is None:
+            return await interaction.response.send_message(embed=embed_lose("❌", f"Item `{item}` introuvable."), ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        items = [replace(x, price=int(price)) if x.item_id == it.item_id else x for x in cat.items]
+        await self._publish_catalog(interaction, items_to_json(items), f"{it.item_id}: {fmt(it.price)} → {fmt(price)} KZ")
+
+    @catalog_group.command(name="activate", description="⏪ Remettre en service une version précédente")
+    @app_commands.describe(version="Version à réactiver (voir /catalog versions)")
+    async def catalog_activate(self, interaction: discord.Interaction, version: int):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        row = await asyncio.to_thread(self.db.catalog_get, version)
+        if row is None:
+            return await interaction.followup.send(embed=embed_lose("❌", "Version introuvable."), ephemeral=True)
+        try:
+            items_from_json(row["items_json"])  # un effet a pu disparaître du code depuis
+        except ValueError as e:
+            return await interaction.followup.send(embed=embed_lose("❌ Version invalide", f"`{e}`"), ephemeral=True)
+        await asyncio.to_thread(self.db.catalog_activate, version)
+        live = await self._reload_catalog()
+        await interaction.followup.send(embed=embed_win("⏪ Catalogue", f"Version en service: **v{live}**"), ephemeral=True)
+
+    @catalog_group.command(name="reload", description="🔄 Relire la version active depuis la base")
+    async def catalog_reload(self, interaction: discord.Interaction):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        live = await self._reload_catalog()
+        await interaction.followup.send(
+            embed=embed_info("🔄 Catalogue", f"Version en service: **v{live}** ({len(catalog().items)} items)"), ephemeral=True
+        )
+
+    @catalog_setprice.autocomplete("item")
+    async def catalog_item_ac(self, interaction: discord.Interaction, current: str):
+        return [
+            app_commands.Choice(name=f"{it.name} ({fmt(it.price)} KZ)"[:100], value=it.item_id)
+            for it in catalog().search(current, 25)
+        ]
 
     
     # ============================================
@@ -241,7 +652,6 @@ class AdminCog(commands.Cog):
 
             new_xp, new_level = await self._db_call(self.db.add_xp, user.id, int(amount))
 
-            from ..leveling import title_and_icon_for_level
             title, icon = title_and_icon_for_level(new_level, cap=int(getattr(config, "XP_LEVEL_CAP", 100)))
 
             e = embed_win(
@@ -280,20 +690,11 @@ class AdminCog(commands.Cog):
             cur_xp = int(row["xp"]) if row else 0
             new_xp = max(0, cur_xp - int(amount))
 
-            from ..leveling import level_from_xp, title_and_icon_for_level
             cap = int(getattr(config, "XP_LEVEL_CAP", 100))
             new_level = level_from_xp(new_xp, cap=cap)
             title, icon = title_and_icon_for_level(new_level, cap=cap)
 
-            def _do_update():
-                with self.db.connect() as con:
-                    con.execute(
-                        "UPDATE users SET xp=?, level=? WHERE user_id=?",
-                        (int(new_xp), int(new_level), int(user.id)),
-                    )
-                    con.commit()
-
-            await self._db_call(_do_update)
+            await self._db_call(self.db.set_xp_level, user.id, new_xp, new_level)
 
             e = embed_neutral(
                 "🧹",
@@ -329,15 +730,7 @@ class AdminCog(commands.Cog):
         try:
             await self._db_call(self.db.ensure_user, user.id, config.START_BALANCE)
 
-            def _do_reset():
-                with self.db.connect() as con:
-                    con.execute(
-                        "UPDATE users SET xp=0, level=1, profile_color=? WHERE user_id=?",
-                        ("gris", int(user.id)),
-                    )
-                    con.commit()
-
-            await self._db_call(_do_reset)
+            await self._db_call(self.db.set_xp_level, user.id, 0, 1, "gris")
 
             e = embed_win("✅", "Reset effectué", f"{user.mention}\nXP: **0**\nNiveau: **1**\nCouleur: **gris**")
             await interaction.followup.send(embed=e, ephemeral=True)
@@ -366,7 +759,6 @@ class AdminCog(commands.Cog):
             cap = int(getattr(config, "XP_LEVEL_CAP", 100))
             level = max(1, min(int(level), cap))
 
-            from ..leveling import xp_for_level, level_from_xp, title_and_icon_for_level
             target_xp = int(xp_for_level(level, cap=cap))
 
             row = await self._db_call(self.db.get_user, user.id)
@@ -378,14 +770,7 @@ class AdminCog(commands.Cog):
                 await self._db_call(self.db.add_xp, user.id, target_xp - cur_xp)
             else:
                 # Baisse de niveau: on met à jour directement (pas de retrait KZ)
-                def _do_update():
-                    with self.db.connect() as con:
-                        con.execute(
-                            "UPDATE users SET xp=?, level=? WHERE user_id=?",
-                            (int(target_xp), int(level), int(user.id)),
-                        )
-                        con.commit()
-                await self._db_call(_do_update)
+                await self._db_call(self.db.set_xp_level, user.id, target_xp, level)
 
             row2 = await self._db_call(self.db.get_user, user.id)
             new_xp = int(row2["xp"]) if row2 else target_xp
@@ -427,7 +812,6 @@ class AdminCog(commands.Cog):
             row = await self._db_call(self.db.get_user, user.id)
             xp = int(row["xp"]) if row else 0
 
-            from ..leveling import xp_progress, title_and_icon_for_level
             cap = int(getattr(config, "XP_LEVEL_CAP", 100))
             lvl_calc, in_lvl, need = xp_progress(xp, cap=cap)
             title, icon = title_and_icon_for_level(lvl_calc, cap=cap)
@@ -455,6 +839,37 @@ class AdminCog(commands.Cog):
                 ephemeral=True,
             )
 
+    @xp_group.command(name="recompute", description="🧮 Recalculer les niveaux de tous les joueurs (courbe modifiée)")
+    @app_commands.describe(restart="Repartir du début au lieu de reprendre le dernier passage interrompu")
+    async def xp_recompute(self, interaction: discord.Interaction, restart: bool = False):
+        if not is_owner(interaction):
+            return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
+        if self.levels.running:
+            p = self.levels.progress
+            done = f"{fmt(p.scanned)} / {fmt(p.total)} joueurs" if p else None
+            return await interaction.response.send_message(embed=embed_neutral("🧮 Recalcul déjà en cours", done), ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        msg = await interaction.followup.send(embed=embed_info("🧮 Recalcul des niveaux", "Démarrage…"), ephemeral=True, wait=True)
+
+        async def report(p: RecomputeProgress):
+            pct = 100 * p.scanned / p.total if p.total else 100.0
+            desc = (
+                f"{fmt(p.scanned)} / {fmt(p.total)} joueurs ({min(pct, 100.0):.0f}%)\n"
+                f"Niveau ou couleur corrigés : **{fmt(p.changed)}**\n"
+                f"Lots de {p.chunk} · {p.elapsed:.1f}s"
+            )
+            e = embed_win("✅ Niveaux recalculés", desc) if p.done else embed_info("🧮 Recalcul des niveaux", desc)
+            try:
+                await msg.edit(embed=e)
+            except discord.HTTPException:
+                pass  # message expiré: le job continue
+
+        try:
+            await self.levels.run(restart=restart, on_progress=report)
+        except Exception as ex:
+            await interaction.followup.send(embed=embed_lose("❌", "Erreur", f"{type(ex).__name__}: {ex}"), ephemeral=True)
+
 # ============================================
     # BLACKLIST (groupe /bl)
     # ============================================
@@ -656,30 +1071,7 @@ class AdminCog(commands.Cog):
         if not is_owner(interaction):
             return await interaction.response.send_message(embed=embed_lose("❌", "Owner uniquement."), ephemeral=True)
 
-        e = discord.Embed(title="ℹ️ Aide — /odds", color=config.BRAND["info"])
-        e.description = (
-            "Avec `/odds`, tu règles les paramètres sans toucher au code.\n\n"
-            "**Commandes :**\n"
-            "• `/odds list` → affiche tous les paramètres\n"
-            "• `/odds set <param> <valeur>` → modifie un paramètre\n"
-            "• `/odds reset <param|all>` → remet par défaut\n\n"
-            "**Formats importants :**\n"
-            "• Probabilités / pourcentages : **0.25 = 25%** (valeur entre 0 et 1)\n"
-            "• Ex: `steal_success_rate 0.30` = 30%\n"
-            "• Ex: `steal_steal_pct 0.12` = vole 12%\n"
-        )
-        e.add_field(
-            name="Exemples rapides",
-            value=(
-                "`/odds set steal_success_rate 0.30`\n"
-                "`/odds set steal_steal_pct 0.12`\n"
-                "`/odds set sabotage_success_rate 0.10`\n"
-                "`/odds set bot_win_chance 0.60`\n"
-                "`/odds reset steal_success_rate`\n"
-                "`/odds reset all`"
-            ),
-            inline=False,
-        )
+        e = EMBEDS.embed(("odds_help",), _odds_help_embed)
         await interaction.response.send_message(embed=e, ephemeral=True)
 
     @odds_group.command(name="reset", description="♻️ Remet un paramètre (ou tout) par défaut")
@@ -811,113 +1203,10 @@ class AdminCog(commands.Cog):
 
 
 
-
 # ==========================
 # UI PANEL (EPHEMERAL)
 # ==========================
 
-from .shop import ShopView, build_shop_embed  # noqa: E402
-
-
-def _panel_embed(title: str, description: str, gif_url: str | None = None) -> discord.Embed:
-    e = embed_neutral(title, description)
-    if gif_url:
-        e.set_image(url=gif_url)
-    return e
-
-
-
-class PanelView(discord.ui.View):
-    """
-    Panel PUBLIC (visible par tout le monde),
-    mais chaque bouton renvoie un menu EPHEMERAL pour l'utilisateur qui clique.
-    """
-    def __init__(self, db: Database, gif_url: str | None = None):
-        super().__init__(timeout=None)
-        self.db = db
-        self.gif_url = gif_url
-
-    @discord.ui.button(label="🚀 Débuter", style=discord.ButtonStyle.secondary)
-    async def start_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        txt = (
-            "**1) Crée ton compte** : `/register`\n"
-            "**2) Récupère des KZ** : `/daily`, `/weekly`, `/work` (+ récompenses messages/vocal)\n"
-            "**3) Achète des items** : `/shop` (boutons **Acheter x1/x5**)\n"
-            "**4) Joue** : `/slots`, `/roulette`, `/blackjack`, `/crash`, etc.\n"
-            "**5) PvP** : duels (`/pvp`, `/rps1v1`, `/blackjack1v1`) + actions (`/steal`, `/sabotage`)\n\n"
-            "➡️ Conseil : fais `/help` pour voir toutes les commandes."
-        )
-        e = embed_info("🚀 Bien démarrer", txt)
-        if self.gif_url:
-            e.set_image(url=self.gif_url)
-        await interaction.followup.send(embed=e, ephemeral=True)
-
-    @discord.ui.button(label="🛒 Shop", style=discord.ButtonStyle.success)
-    async def shop_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        # Ouvre le shop en ephemeral pour la personne qui clique
-        view = ShopView(self.db, interaction.user.id, start_category=config.SHOP_CATEGORIES[0])
-        await interaction.response.send_message(
-            embed=view.current_embed(interaction.user.id),
-            view=view,
-            ephemeral=True,
-        )
-
-    @discord.ui.button(label="🎮 Jeux", style=discord.ButtonStyle.primary)
-    async def games_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        txt = (
-            "**Miser** : tu peux mettre un nombre, ou `all` / `max` / `tout`.\n\n"
-            "🎰 **Jeux casino** :\n"
-            "• **/slots** — machine à sous\n"
-            "• **/roulette** — rouge/noir/vert/numéro\n"
-            "• **/coinflip** — pile/face\n"
-            "• **/blackjack** — interactif\n"
-            "• **/crash** — cash-out avant le crash\n"
-            "• **/guess** — devine 1-100\n"
-            "• **/chest** — coffre (cooldown)\n\n"
-            "📌 **Prediction** : `/prediction`, `/predictions`, `/prediction_cancel`\n\n"
-            "⚔️ **Duels** : `/pvp`, `/rps1v1`, `/blackjack1v1` (possible contre le bot si activé)\n\n"
-            "➡️ `/help` pour les détails et les cooldowns."
-        )
-        e = embed_info("🎮 Jeux", txt)
-        if self.gif_url:
-            e.set_image(url=self.gif_url)
-        await interaction.followup.send(embed=e, ephemeral=True)
-
-    @discord.ui.button(label="🧑‍🎤 Profil", style=discord.ButtonStyle.primary)
-    async def profile_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        txt = (
-            "Commandes profil :\n"
-            "• **/profile** — afficher ton profil\n"
-            "• **/profileset banner:<url>** — mettre une image\n"
-            "• **/profileset removebanner** — retirer l'image\n\n"
-            "⚠️ Pour définir une image, il faut l'item **setprofile** dans le shop."
-        )
-        e = embed_info("🧑‍🎤 Profil", txt)
-        if self.gif_url:
-            e.set_image(url=self.gif_url)
-        await interaction.followup.send(embed=e, ephemeral=True)
-
-    @discord.ui.button(label="📜 Règles", style=discord.ButtonStyle.secondary)
-    async def rules_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        txt = (
-            "• Respect & fair-play\n"
-            "• Pas de spam / exploit / abuse de bugs\n"
-            "• Pas de multi-comptes pour farmer les KZ\n"
-            "• Les gains/pertes sont automatiques (les décisions du bot font foi)\n"
-            "• En cas de bug : contacte un staff avec un screen\n\n"
-            "Astuce : **/help** pour toutes les commandes."
-        )
-        e = embed_info("📜 Règles", txt)
-        if self.gif_url:
-            e.set_image(url=self.gif_url)
-        await interaction.followup.send(embed=e, ephemeral=True)
-
-    @discord.ui.button(label="✖️ Fermer", style=discord.ButtonStyle.danger)
-    async def close_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.send_message("✅ Menu fermé pour toi.", ephemeral=True)
-
-
-
 class PanelCog(commands.Cog):
     def __init__(self, bot: commands.Bot, db: Database):
         self.bot = bot
@@ -937,8 +1226,11 @@ class PanelCog(commands.Cog):
                 ephemeral=True,
             )
 
+        # UI du panel chargée à la première utilisation (commande rare)
+        from ..panel import PanelView, panel_embed
+
         view = PanelView(self.db, gif_url=gif_url)
-        start = _panel_embed(
+        start = panel_embed(
             "📌 Menu",
             "Clique sur un bouton pour ouvrir le menu correspondant **en privé (ephemeral)**.\n\n"
             "✅ **À faire en premier :** `/register` pour créer ton compte.\n"
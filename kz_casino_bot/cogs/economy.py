@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
+import random
+
 import discord
 from discord import app_commands
 from discord.ext import commands
 
 from .. import config
-from ..db import Database
+from ..db import Database, Reason
 from ..shop_data import get_item
 from ..utils import (
     BetCheckResult,
@@ -18,6 +21,7 @@ from ..utils import (
     fmt,
     human_time,
     now_utc,
+    parse_dt,
     seconds_left,
 )
 from ..checks import enforce_blacklist
@@ -56,7 +60,7 @@ class EconomyCog(commands.Cog):
         if left > 0:
             e = embed_lose("⏳ Daily", f"Reviens dans **{human_time(left)}**.")
             return await interaction.response.send_message(embed=e)
-        self.db.add_balance(interaction.user.id, config.DAILY_AMOUNT)
+        self.db.add_balance(interaction.user.id, config.DAILY_AMOUNT, reason=Reason.DAILY)
         self.db.set_user_field(interaction.user.id, "last_daily", now_utc().isoformat())
         new_bal = int(self.db.get_user(interaction.user.id)["balance"])
         e = embed_win("🎁 Daily", f"Tu gagnes **{fmt(config.DAILY_AMOUNT)}** KZ !")
@@ -71,7 +75,7 @@ class EconomyCog(commands.Cog):
         if left > 0:
             e = embed_lose("⏳ Weekly", f"Reviens dans **{human_time(left)}**.")
             return await interaction.response.send_message(embed=e)
-        self.db.add_balance(interaction.user.id, config.WEEKLY_AMOUNT)
+        self.db.add_balance(interaction.user.id, config.WEEKLY_AMOUNT, reason=Reason.WEEKLY)
         self.db.set_user_field(interaction.user.id, "last_weekly", now_utc().isoformat())
         new_bal = int(self.db.get_user(interaction.user.id)["balance"])
         e = embed_win("🎁 Weekly", f"Tu gagnes **{fmt(config.WEEKLY_AMOUNT)}** KZ !")
@@ -80,8 +84,6 @@ class EconomyCog(commands.Cog):
 
     @app_commands.command(name="work", description="Gagner un petit montant")
     async def work(self, interaction: discord.Interaction):
-        import random
-
         self.db.ensure_user(interaction.user.id, config.START_BALANCE)
         row = self.db.get_user(interaction.user.id)
         left = seconds_left(row["last_work"], config.WORK_COOLDOWN_MIN * 60)
@@ -89,7 +91,7 @@ class EconomyCog(commands.Cog):
             e = embed_lose("⏳ Travail", f"Reviens dans **{human_time(left)}**.")
             return await interaction.response.send_message(embed=e)
         gain = random.randint(config.WORK_MIN, config.WORK_MAX)
-        self.db.add_balance(interaction.user.id, gain)
+        self.db.add_balance(interaction.user.id, gain, reason=Reason.WORK)
         self.db.set_user_field(interaction.user.id, "last_work", now_utc().isoformat())
         new_bal = int(self.db.get_user(interaction.user.id)["balance"])
         e = embed_win("🛠️ Travail", f"Tu as gagné **{fmt(gain)}** KZ.")
@@ -98,30 +100,23 @@ class EconomyCog(commands.Cog):
 
     @app_commands.command(name="transfer", description="Virer des coins à un joueur")
     async def transfer(self, interaction: discord.Interaction, user: discord.Member, amount: app_commands.Range[int, 1, 100000000]):
-        self.db.ensure_user(interaction.user.id, config.START_BALANCE)
-        self.db.ensure_user(user.id, config.START_BALANCE)
         if user.id == interaction.user.id:
             return await interaction.response.send_message(embed=embed_lose("❌ Virement", "Tu ne peux pas te virer à toi-même."))
 
-        sender = self.db.get_user(interaction.user.id)
-        bal = int(sender["balance"])
-        if amount > bal:
+        res = await asyncio.to_thread(
+            self.db.transfer, interaction.user.id, user.id, int(amount), config.TRANSFER_TAX_PCT, Reason.TRANSFER, config.START_BALANCE
+        )
+        if res["insufficient"]:
             return await interaction.response.send_message(embed=embed_lose("❌ Virement", "Solde insuffisant."))
 
-        tax = int(amount * (config.TRANSFER_TAX_PCT / 100.0))
-        send_net = max(0, amount - tax)
-
-        self.db.add_balance(interaction.user.id, -amount)
-        self.db.add_balance(user.id, send_net)
-
-        e = embed_info("💸 Virement", f"Tu as envoyé **{fmt(send_net)}** KZ à {user.mention}.")
-        e.add_field(name="Taxe", value=f"{fmt(tax)} KZ ({config.TRANSFER_TAX_PCT}%)", inline=True)
+        e = embed_info("💸 Virement", f"Tu as envoyé **{fmt(res['net'])}** KZ à {user.mention}.")
+        e.add_field(name="Taxe", value=f"{fmt(res['tax'])} KZ ({config.TRANSFER_TAX_PCT}%)", inline=True)
         e.add_field(name="Montant débité", value=f"{fmt(amount)} KZ", inline=True)
         await interaction.response.send_message(embed=e)
 
     @app_commands.command(name="leaderboard", description="Top des joueurs")
     async def leaderboard(self, interaction: discord.Interaction):
-        rows = self.db.fetchall("SELECT user_id, balance FROM users ORDER BY balance DESC LIMIT 10")
+        rows = self.db.top_balances(10)
         if not rows:
             return await interaction.response.send_message(embed=embed_info("🏆 Leaderboard", "Aucun joueur pour le moment."))
         lines = []
@@ -143,7 +138,6 @@ class EconomyCog(commands.Cog):
 
         # chest cooldown depends on VIP
         vip_until = row["vip_until"]
-        from ..utils import parse_dt
         vip_dt = parse_dt(vip_until)
         is_vip = bool(vip_dt and vip_dt > now_utc())
         chest_cd_h = config.CHEST_COOLDOWN_VIP_H if is_vip else config.CHEST_COOLDOWN_NORMAL_H
@@ -170,52 +164,31 @@ class EconomyCog(commands.Cog):
         user: discord.Member,
         amount: app_commands.Range[int, 1, 100000000],
     ):
-        self.db.ensure_user(interaction.user.id, config.START_BALANCE)
-        self.db.ensure_user(user.id, config.START_BALANCE)
         if user.id == interaction.user.id:
             return await interaction.response.send_message(embed=embed_lose("❌ Gift", "Tu ne peux pas t'offrir des coins à toi-même."))
 
-        sender = self.db.get_user(interaction.user.id)
-        bal = int(sender["balance"])
-        if amount > bal:
+        res = await asyncio.to_thread(
+            self.db.transfer, interaction.user.id, user.id, int(amount), getattr(config, "GIFT_TAX_PCT", 0.0), Reason.GIFT, config.START_BALANCE
+        )
+        if res["insufficient"]:
             return await interaction.response.send_message(embed=embed_lose("❌ Gift", "Solde insuffisant."))
 
-        tax = int(amount * (getattr(config, "GIFT_TAX_PCT", 0.0) / 100.0))
-        net = max(0, amount - tax)
-
-        self.db.add_balance(interaction.user.id, -amount)
-        self.db.add_balance(user.id, net)
-
-        e = embed_win("🎁 Gift (coins)", f"Tu offres **{fmt(net)}** KZ à {user.mention}.")
+        e = embed_win("🎁 Gift (coins)", f"Tu offres **{fmt(res['net'])}** KZ à {user.mention}.")
         e.add_field(name="💸 Montant", value=f"{fmt(amount)} KZ", inline=True)
-        if tax > 0:
-            e.add_field(name="🧾 Taxe", value=f"{fmt(tax)} KZ", inline=True)
-        new_bal = int(self.db.get_user(interaction.user.id)["balance"])
-        e.add_field(name="🏦 Ton solde", value=f"{fmt(new_bal)} KZ", inline=False)
+        if res["tax"] > 0:
+            e.add_field(name="🧾 Taxe", value=f"{fmt(res['tax'])} KZ", inline=True)
+        e.add_field(name="🏦 Ton solde", value=f"{fmt(res['from_balance'])} KZ", inline=False)
         await interaction.response.send_message(embed=e)
 
     @gift_group.command(name="item", description="Offrir un item de ton inventaire")
     async def gift_item(self, interaction: discord.Interaction, user: discord.Member, item_id: str):
-        self.db.ensure_user(interaction.user.id, config.START_BALANCE)
-        self.db.ensure_user(user.id, config.START_BALANCE)
         if user.id == interaction.user.id:
             return await interaction.response.send_message(embed=embed_lose("❌ Gift", "Tu ne peux pas t'offrir un item à toi-même."))
 
-        inv = self.db.get_inventory(interaction.user.id)
-        have = int(inv.get(item_id, 0))
-        if have <= 0:
+        moved = await asyncio.to_thread(self.db.transfer_item, interaction.user.id, user.id, item_id, 1, config.START_BALANCE)
+        if moved is None:
             return await interaction.response.send_message(embed=embed_lose("❌ Gift", "Tu n'as pas cet item dans ton inventaire."))
 
-        # move item
-        inv[item_id] = have - 1
-        if inv[item_id] <= 0:
-            inv.pop(item_id, None)
-        self.db.set_inventory(interaction.user.id, inv)
-
-        inv_to = self.db.get_inventory(user.id)
-        inv_to[item_id] = int(inv_to.get(item_id, 0)) + 1
-        self.db.set_inventory(user.id, inv_to)
-
         it = get_item(item_id)
         name = it.name if it else item_id
         e = embed_win("🎁 Gift (item)", f"Tu offres **{name}** à {user.mention}.")
@@ -11,7 +11,8 @@ from discord.ext import commands
 
 from .. import config
 from ..odds import get_param_value
-from ..db import Database
+from ..db import Database, Reason
+from ..metrics import METRICS
 from ..utils import (
     check_bet,
     maybe_flip_win_for_all_in,
@@ -126,6 +127,7 @@ class BlackjackView(discord.ui.View):
         self.game_over = False
         self.message: discord.Message | None = None
         self.bet_taken = False  # La mise a été retirée
+        METRICS.track_view("blackjack", self)
         
         # Distribution initiale
         self.player_cards.append(self.deck.pop())
@@ -134,7 +136,7 @@ class BlackjackView(discord.ui.View):
         self.dealer_cards.append(self.deck.pop())
         
         # Retirer la mise immédiatement
-        self.cog.db.add_balance(self.user_id, -self.mise)
+        self.cog.db.add_balance(self.user_id, -self.mise, reason=Reason.GAME_BET)
         self.bet_taken = True
 
     def draw_card(self) -> int:
@@ -193,7 +195,7 @@ class BlackjackView(discord.ui.View):
         # La mise a déjà été retirée au début du jeu
         if result == "win" or result == "blackjack":
             # Rembourser la mise + le gain
-            self.cog.db.add_balance(self.user_id, self.mise + gain)
+            self.cog.db.add_balance(self.user_id, self.mise + gain, reason=Reason.GAME_PAYOUT)
             self.cog.db.add_stat(self.user_id, wins_delta=1, games_delta=1)
             self.cog.db.add_game_stat(self.user_id, "blackjack", games_delta=1, wins_delta=1, profit_delta=gain)
         elif result == "lose":
@@ -202,7 +204,7 @@ class BlackjackView(discord.ui.View):
             self.cog.db.add_game_stat(self.user_id, "blackjack", games_delta=1, losses_delta=1, profit_delta=-self.mise)
         else:  # push (égalité)
             # Rembourser la mise
-            self.cog.db.add_balance(self.user_id, self.mise)
+            self.cog.db.add_balance(self.user_id, self.mise, reason=Reason.GAME_REFUND)
             self.cog.db.add_stat(self.user_id, games_delta=1)
             self.cog.db.add_game_stat(self.user_id, "blackjack", games_delta=1)
         
@@ -266,7 +268,7 @@ class BlackjackView(discord.ui.View):
             return
         
         # Retirer la mise additionnelle
-        self.cog.db.add_balance(self.user_id, -self.original_mise)
+        self.cog.db.add_balance(self.user_id, -self.original_mise, reason=Reason.GAME_BET)
         self.mise += self.original_mise  # La mise totale double
         
         self.player_cards.append(self.draw_card())
@@ -332,6 +334,7 @@ class CrashView(discord.ui.View):
         self.cashed_out = False
         self.message: discord.Message | None = None
         self.task: asyncio.Task | None = None
+        METRICS.track_view("crash", self)
         
         edge = config.CRASH_HOUSE_EDGE
         r = random.random()
@@ -339,7 +342,7 @@ class CrashView(discord.ui.View):
         self.crash_point = min(config.CRASH_MAX_MULT, self.crash_point)
         
         # Retirer la mise immédiatement
-        self.cog.db.add_balance(self.user_id, -self.mise)
+        self.cog.db.add_balance(self.user_id, -self.mise, reason=Reason.GAME_BET)
 
     def build_embed(self) -> discord.Embed:
         if self.cashed_out:
@@ -452,7 +455,7 @@ class CrashView(discord.ui.View):
             gain = int(self.mise * self.multiplier)
             profit = gain - self.mise
             # Rembourser la mise + le profit
-            self.cog.db.add_balance(self.user_id, gain)
+            self.cog.db.add_balance(self.user_id, gain, reason=Reason.GAME_PAYOUT)
             self.cog.db.add_stat(self.user_id, wins_delta=1, games_delta=1)
             self.cog.db.add_game_stat(self.user_id, "crash", games_delta=1, wins_delta=1, profit_delta=profit)
         else:
@@ -503,7 +506,7 @@ class GamesCog(commands.Cog):
             return await interaction.response.send_message(embed=embed_lose("❌ Mise invalide", ok.reason))
 
         # Retirer la mise AVANT le jeu
-        self.db.add_balance(interaction.user.id, -amount)
+        self.db.add_balance(interaction.user.id, -amount, reason=Reason.GAME_BET)
 
         symbols = ["🍒", "🍋", "🔔", "💎", "7️⃣"]
         
@@ -555,7 +558,7 @@ class GamesCog(commands.Cog):
         if win_mult > 0:
             # Victoire: rembourser mise + profit
             profit = int(amount * (win_mult - 1))  # Profit net
-            self.db.add_balance(interaction.user.id, amount + profit)  # Rembourser mise + profit
+            self.db.add_balance(interaction.user.id, amount + profit, reason=Reason.GAME_PAYOUT)  # Rembourser mise + profit
             self.db.add_stat(interaction.user.id, wins_delta=1, games_delta=1)
             self.db.add_game_stat(interaction.user.id, "slots", games_delta=1, wins_delta=1, profit_delta=profit)
             new_bal = int(self.db.get_user(interaction.user.id)["balance"])
@@ -616,7 +619,7 @@ class GamesCog(commands.Cog):
             )
 
         # Retirer la mise AVANT le jeu
-        self.db.add_balance(interaction.user.id, -amount)
+        self.db.add_balance(interaction.user.id, -amount, reason=Reason.GAME_BET)
 
         # Paramètres configurables via /odds
         green_mult = int(get_param_value(self.db, "roulette_green_mult"))
@@ -729,7 +732,7 @@ class GamesCog(commands.Cog):
         if win:
             # Victoire: rembourser mise + profit
             profit = int(amount * (mult - 1))  # Profit net (ex: 1000 * (2-1) = 1000)
-            self.db.add_balance(interaction.user.id, amount + profit)  # Rembourser mise + profit
+            self.db.add_balance(interaction.user.id, amount + profit, reason=Reason.GAME_PAYOUT)  # Rembourser mise + profit
             self.db.add_stat(interaction.user.id, wins_delta=1, games_delta=1)
             self.db.add_game_stat(interaction.user.id, "roulette", games_delta=1, wins_delta=1, profit_delta=profit)
             new_bal = int(self.db.get_user(interaction.user.id)["balance"])
@@ -773,7 +776,7 @@ class GamesCog(commands.Cog):
             return await interaction.response.send_message(embed=embed_lose("❌ Choix invalide", "Choix: pile ou face"))
         
         # Retirer la mise AVANT le jeu
-        self.db.add_balance(interaction.user.id, -amount)
+        self.db.add_balance(interaction.user.id, -amount, reason=Reason.GAME_BET)
         
         # Paramètres configurables via /odds
         payout = get_param_value(self.db, "coinflip_payout")
@@ -792,7 +795,7 @@ class GamesCog(commands.Cog):
         if win:
             # Victoire: rembourser mise + profit
             profit = int(amount * (payout - 1))  # Profit net
-            self.db.add_balance(interaction.user.id, amount + profit)  # Rembourser mise + profit
+            self.db.add_balance(interaction.user.id, amount + profit, reason=Reason.GAME_PAYOUT)  # Rembourser mise + profit
             self.db.add_stat(interaction.user.id, wins_delta=1, games_delta=1)
             self.db.add_game_stat(interaction.user.id, "coinflip", games_delta=1, wins_delta=1, profit_delta=profit)
             new_bal = int(self.db.get_user(interaction.user.id)["balance"])
@@ -829,7 +832,7 @@ class GamesCog(commands.Cog):
             return await interaction.response.send_message(embed=embed_lose("❌ Mise invalide", ok.reason))
         
         # Retirer la mise AVANT le jeu
-        self.db.add_balance(interaction.user.id, -amount)
+        self.db.add_balance(interaction.user.id, -amount, reason=Reason.GAME_BET)
         
         # Multiplicateurs configurables via /odds
         exact_mult = get_param_value(self.db, "guess_exact_mult")
@@ -847,7 +850,7 @@ class GamesCog(commands.Cog):
         if diff == 0:
             mult = exact_mult
             profit = int(amount * (mult - 1))  # Profit net
-            self.db.add_balance(interaction.user.id, amount + profit)  # Rembourser mise + profit
+            self.db.add_balance(interaction.user.id, amount + profit, reason=Reason.GAME_PAYOUT)  # Rembourser mise + profit
             self.db.add_stat(interaction.user.id, wins_delta=1, games_delta=1)
             self.db.add_game_stat(interaction.user.id, "guess", games_delta=1, wins_delta=1, profit_delta=profit)
             e = embed_win("🔢 Guess — JACKPOT ! 🎉")
@@ -856,7 +859,7 @@ class GamesCog(commands.Cog):
         elif diff == 1:
             mult = close1_mult
             profit = int(amount * (mult - 1))
-            self.db.add_balance(interaction.user.id, amount + profit)
+            self.db.add_balance(interaction.user.id, amount + profit, reason=Reason.GAME_PAYOUT)
             self.db.add_stat(interaction.user.id, wins_delta=1, games_delta=1)
             self.db.add_game_stat(interaction.user.id, "guess", games_delta=1, wins_delta=1, profit_delta=profit)
             e = embed_win("🔢 Guess — Très proche !")
@@ -865,7 +868,7 @@ class GamesCog(commands.Cog):
         elif diff == 2:
             mult = close2_mult
             profit = int(amount * (mult - 1))
-            self.db.add_balance(interaction.user.id, amount + profit)
+            self.db.add_balance(interaction.user.id, amount + profit, reason=Reason.GAME_PAYOUT)
             self.db.add_stat(interaction.user.id, wins_delta=1, games_delta=1)
             self.db.add_game_stat(interaction.user.id, "guess", games_delta=1, wins_delta=1, profit_delta=profit)
             e = embed_win("🔢 Guess — Proche !")
@@ -873,7 +876,7 @@ class GamesCog(commands.Cog):
             e.add_field(name="Gain", value=f"+{fmt(profit)} KZ (x{mult})", inline=True)
         elif diff <= 5:
             # Remboursement - rendre la mise
-            self.db.add_balance(interaction.user.id, amount)
+            self.db.add_balance(interaction.user.id, amount, reason=Reason.GAME_REFUND)
             self.db.add_stat(interaction.user.id, games_delta=1)
             e = embed_neutral("🔢 Guess — Remboursé")
             e.add_field(name="Résultat", value=f"Ton choix: **{nombre}** | Tiré: **{target}** (±{diff})", inline=False)
@@ -908,22 +911,22 @@ class GamesCog(commands.Cog):
         if roll < 0.01:
             gain = 5000
             e = embed_win("🧰 Coffre — Jackpot", f"Tu trouves **{fmt(gain)}** KZ !")
-            self.db.add_balance(interaction.user.id, gain)
+            self.db.add_balance(interaction.user.id, gain, reason=Reason.CHEST)
             self.db.add_stat(interaction.user.id, wins_delta=1, games_delta=1)
         elif roll < 0.10:
             gain = random.randint(800, 1500)
             e = embed_win("🧰 Coffre — Gros gain", f"Tu trouves **{fmt(gain)}** KZ !")
-            self.db.add_balance(interaction.user.id, gain)
+            self.db.add_balance(interaction.user.id, gain, reason=Reason.CHEST)
             self.db.add_stat(interaction.user.id, wins_delta=1, games_delta=1)
         elif roll < 0.75:
             gain = random.randint(150, 450)
             e = embed_win("🧰 Coffre", f"Tu trouves **{fmt(gain)}** KZ !")
-            self.db.add_balance(interaction.user.id, gain)
+            self.db.add_balance(interaction.user.id, gain, reason=Reason.CHEST)
             self.db.add_stat(interaction.user.id, wins_delta=1, games_delta=1)
         else:
             loss = random.randint(50, 200)
             e = embed_lose("🧰 Coffre — Piège", f"Tu perds **{fmt(loss)}** KZ...")
-            self.db.add_balance(interaction.user.id, -loss)
+            self.db.add_balance(interaction.user.id, -loss, reason=Reason.CHEST)
             self.db.add_stat(interaction.user.id, losses_delta=1, games_delta=1)
 
         self.db.set_user_field(interaction.user.id, "last_chest", now_utc().isoformat())
@@ -963,8 +966,8 @@ class GamesCog(commands.Cog):
             steal_pct = float(get_param_value(self.db, 'steal_steal_pct'))
             amount = max(1, int(target_bal * steal_pct))
             amount = min(amount, target_bal)
-            self.db.add_balance(cible.id, -amount)
-            self.db.add_balance(interaction.user.id, amount)
+            self.db.add_balance(cible.id, -amount, reason=Reason.STEAL, ref_id=interaction.user.id)
+            self.db.add_balance(interaction.user.id, amount, reason=Reason.STEAL, ref_id=cible.id)
             self.db.add_stat(interaction.user.id, wins_delta=1, games_delta=1)
             self.db.add_stat(cible.id, losses_delta=1)
             e = embed_win("🕵️ Vol — Réussi", f"Tu voles **{fmt(amount)}** KZ à {cible.mention}.")
@@ -973,7 +976,7 @@ class GamesCog(commands.Cog):
             pen_min = int(get_param_value(self.db, 'steal_fail_penalty_min'))
             pen_max = int(get_param_value(self.db, 'steal_fail_penalty_max'))
             penalty = min(pen_max, max(pen_min, int(thief["balance"]) * pen_pct))
-            self.db.add_balance(interaction.user.id, -penalty)
+            self.db.add_balance(interaction.user.id, -penalty, reason=Reason.STEAL)
             self.db.add_stat(interaction.user.id, losses_delta=1, games_delta=1)
             e = embed_lose("🕵️ Vol — Raté", f"Tu te fais attraper ! Tu perds **{fmt(penalty)}** KZ.")
 
@@ -1068,15 +1071,15 @@ class GamesCog(commands.Cog):
         win = random.random() < base_p
         win = maybe_flip_win_for_all_in(win, bal, cost)
 
-        self.db.add_balance(interaction.user.id, -cost)
+        self.db.add_balance(interaction.user.id, -cost, reason=Reason.SABOTAGE)
 
         if win:
             pct = float(get_param_value(self.db, 'sabotage_steal_pct'))
             cap = config.SABOTAGE_STEAL_CAP
             steal_amt = min(cap, max(0, int(int(victim["balance"]) * pct)))
             if steal_amt > 0:
-                self.db.add_balance(cible.id, -steal_amt)
-                self.db.add_balance(interaction.user.id, steal_amt)
+                self.db.add_balance(cible.id, -steal_amt, reason=Reason.SABOTAGE, ref_id=interaction.user.id)
+                self.db.add_balance(interaction.user.id, steal_amt, reason=Reason.SABOTAGE, ref_id=cible.id)
             until = now_utc() + timedelta(minutes=config.SABOTAGE_BLOCK_MIN)
             self.db.set_user_field(cible.id, "sabotaged_until", until.isoformat())
             self.db.add_stat(interaction.user.id, wins_delta=1, games_delta=1)
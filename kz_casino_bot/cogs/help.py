@@ -6,6 +6,7 @@ from discord import app_commands
 from discord.ext import commands
 
 from .. import config
+from ..embed_cache import EMBEDS
 from ..utils import embed_info
 
 
@@ -13,148 +14,11 @@ from ..utils import embed_info
 # Données des commandes par catégorie
 # ============================================
 
-HELP_CATEGORIES = {
-    "🏠 Accueil": {
-        "emoji": "🏠",
-        "description": "Vue d'ensemble du bot",
-        "commands": None,  # Spécial : page d'accueil
-    },
-    "💰 Économie": {
-        "emoji": "💰",
-        "description": "Commandes pour gérer tes coins",
-        "commands": [
-            ("/register", "Créer ton compte casino"),
-            ("/balance (ou /bal)", "Voir ton solde actuel"),
-            ("/daily", "Récupérer ton bonus quotidien"),
-            ("/weekly", "Récupérer ton bonus hebdomadaire"),
-            ("/work", "Travailler pour gagner des coins"),
-            ("/transfer (ou /pay) <user> <montant>", "Envoyer des coins (avec taxe)"),
-            ("/leaderboard (ou /lb, /top)", "Voir le classement des joueurs"),
-            ("/cooldowns (ou /cd)", "Voir tous tes temps d'attente"),
-        ],
-    },
-    "👤 Profil": {
-        "emoji": "👤",
-        "description": "Personnaliser ton profil",
-        "commands": [
-            ("/profile (ou /p) [user]", "Voir ton profil ou celui d'un autre"),
-            ("/profileset banner <url>", "Définir ta bannière (image/GIF)"),
-            ("/profileset bio <texte>", "Définir ta bio (max 200 car.)"),
-            ("/profileset color <couleur>", "Changer la couleur (nom ou #hex)"),
-            ("/cosmetic framelist", "Voir les cadres que tu possèdes"),
-            ("/cosmetic frameequip <cadre>", "Équiper un cadre de profil"),
-            ("/cosmetic frameremove", "Retirer ton cadre de profil"),
-            ("/profileset removebanner", "Retirer ta bannière"),
-            ("/profileset reset", "Réinitialiser ton profil"),
-        ],
-    },
-    "🎰 Jeux": {
-        "emoji": "🎰",
-        "description": "Jeux de casino (mise: nombre ou 'all'/'max'/'tout')",
-        "commands": [
-            ("/slots (ou /sl) <mise>", "Machine à sous (x2, x5, x10)"),
-            ("/coinflip (ou /cf) <mise> <pile/face>", "Pile ou face (x2)"),
-            ("/roulette (ou /rl) <mise> <choix>", "Roulette (rouge/noir/vert/numéro...)"),
-            ("/blackjack (ou /bj) <mise>", "🎮 Blackjack interactif"),
-            ("/crash (ou /cr) <mise>", "🎮 Crash interactif"),
-            ("/guess <mise> <nombre>", "Devine un nombre 1-100"),
-            ("/chest", "Ouvrir un coffre (cooldown)"),
-            ("/prediction <cible> <victoire/défaite> <mise>", "Parier sur le prochain résultat d'un joueur"),
-            ("/predictions", "Voir tes predictions + historique"),
-            ("/prediction_cancel <cible>", "Annuler une prediction (rembourse)"),
-        ],
-    },
-    "⚔️ PvP": {
-        "emoji": "⚔️",
-        "description": "Duels & actions contre d'autres joueurs",
-        "commands": [
-            ("/rps1v1 <adversaire> <mise>", "✋ Pierre/Feuille/Ciseaux en 1v1"),
-            ("/pvp <adversaire> <mise>", "⚔️ Duel rapide Attaque/Défense/All-in"),
-            ("/blackjack1v1 <adversaire> <mise>", "🎴 Blackjack en 1v1 (simultané)"),
-            ("/pvp_stats", "📊 Tes stats PvP"),
-            ("/botstats", "🤖 Tes stats contre le bot"),
-            ("/steal <cible>", "Tenter de voler un joueur (25% réussite)"),
-            ("/sabotage <cible>", "Saboter un joueur (bloque + vole)"),
-        ],
-    },
-    "🎁 Cadeaux": {
-        "emoji": "🎁",
-        "description": "Offrir des coins ou items",
-        "commands": [
-            ("/gift coins <user> <montant>", "Offrir des coins à un joueur"),
-            ("/gift item <user> <item_id>", "Offrir un item de ton inventaire"),
-        ],
-    },
-    "🛒 Boutique & Items": {
-        "emoji": "🛒",
-        "description": "Acheter, voir et utiliser des items",
-        "commands": [
-            ("/shop [catégorie]", "🛒 Ouvrir la boutique interactive"),
-            ("/buy <item> [quantité]", "🛒 Acheter un item directement"),
-            ("/inventory", "🎒 Voir ton inventaire"),
-            ("/inv", "🎒 Alias de /inventory"),
-            ("/use <item>", "✨ Utiliser un item (bouclier, boost, VIP...)"),
-            ("/boosts", "✨ Voir tes boosts actifs"),
-        ],
-    },
-    "🏦 Prêts": {
-        "emoji": "🏦",
-        "description": "Prêts banque et entre joueurs",
-        "commands": [
-            ("/pret demander <montant> [duree_jours] [note]", "Demander un prêt (banque du bot)"),
-            ("/pret proposer <joueur> <montant> <taux> <duree_jours>", "Proposer un prêt P2P"),
-            ("/pret annuler <loan_id>", "Annuler une proposition P2P"),
-            ("/pret rembourser <loan_id> [montant]", "Rembourser un prêt"),
-            ("/pret mes", "Voir tes prêts (banque + P2P)"),
-            ("/pret interet <pourcent>", "(Owner) Fixer l'intérêt banque"),
-        ],
-    },
-    "🛡️ Admin": {
-        "emoji": "🛡️",
-        "description": "Commandes administrateur",
-        "commands": [
-            ("/give <user> <montant>", "🎁 Donner des KZ"),
-            ("/take <user> [montant]", "💸 Retirer des KZ (0 = tout)"),
-            ("/setbal <user> <montant>", "💰 Définir le solde exact"),
-            ("/giveitem <user> <item> [qty]", "📦 Donner un item"),
-            ("/takeitem <user> <item> [qty]", "📦 Retirer un item (0 = tout)"),
-            ("/givevip <user> [jours]", "👑 Donner du VIP (défaut: 7j)"),
-            ("/giveimmunity <user> [heures]", "🛡️ Donner immunité (défaut: 24h)"),
-            ("/clearuser <user>", "🧹 Reset complet du joueur"),
-            ("/clearcoins <user>", "💸 Mettre le solde à 0"),
-            ("/clearinv <user>", "📦 Vider l'inventaire"),
-            ("/addadmin <user>", "➕ Ajouter un admin"),
-            ("/listadmin", "📋 Voir la liste des admins"),
-            ("/bl add <user> [raison]", "⛔ Blacklist permanent"),
-            ("/bl temp <user> <minutes>", "⏱️ Blacklist temporaire"),
-            ("/bl remove <user>", "✅ Retirer de la blacklist"),
-            ("/bl list", "📋 Voir la blacklist"),
-            ("/channels allow <salon>", "✅ Autoriser un salon"),
-            ("/channels remove <salon>", "🗑️ Retirer un salon"),
-            ("/channels list", "📃 Voir les salons autorisés"),
-            ("/channels clear", "🧹 Vider la whitelist salons"),
-            ("/category allow <salon>", "✅ Autoriser une catégorie"),
-            ("/category remove <salon>", "🗑️ Retirer une catégorie"),
-            ("/category list", "📃 Voir les catégories autorisées"),
-            ("/category clear", "🧹 Vider la whitelist catégories"),
-            ("/permit add <user>", "✅ Autoriser un user partout"),
-            ("/permit remove <user>", "🗑️ Retirer l'autorisation"),
-            ("/permit list", "📃 Voir les users autorisés"),
-        ],
-    },
-    "👑 Owner": {
-        "emoji": "👑",
-        "description": "Commandes réservées au propriétaire",
-        "commands": [
-            ("/deladmin <user>", "➖ Retirer un admin"),
-            ("/wipeall", "🔥 Reset TOUS les joueurs"),
-            ("/odds list", "📊 Voir les paramètres"),
-            ("/odds help", "ℹ️ Aide et exemples"),
-            ("/odds set <param> <valeur>", "✏️ Modifier un paramètre"),
-            ("/odds reset <param|all>", "♻️ Remet un paramètre (ou tout)"),
-        ],
-    },
-}
+def _help_categories() -> dict:
+    """Textes d'aide, importés au premier /help (pas au démarrage)."""
+    from ..help_text import HELP_CATEGORIES
+
+    return HELP_CATEGORIES
 
 
 # ============================================
@@ -163,15 +27,15 @@ HELP_CATEGORIES = {
 
 class HelpSelect(discord.ui.Select):
     def __init__(self):
-        options = [
+        options = EMBEDS.options(("help",), lambda: [
             discord.SelectOption(
                 label=name.split(" ", 1)[1] if " " in name else name,
                 value=name,
                 emoji=data["emoji"],
                 description=data["description"][:50],
             )
-            for name, data in HELP_CATEGORIES.items()
-        ]
+            for name, data in _help_categories().items()
+        ])
         super().__init__(
             placeholder="📚 Choisis une catégorie...",
             min_values=1,
@@ -210,7 +74,11 @@ class HelpView(discord.ui.View):
 # ============================================
 
 def build_help_embed(category: str) -> discord.Embed:
-    data = HELP_CATEGORIES.get(category)
+    return EMBEDS.embed(("help", category), lambda: _build_help_embed(category))
+
+
+def _build_help_embed(category: str) -> discord.Embed:
+    data = _help_categories().get(category)
     if not data:
         return embed_info("❌ Erreur", "Catégorie introuvable.")
 
@@ -229,7 +97,7 @@ def build_help_embed(category: str) -> discord.Embed:
         
         # Résumé des catégories
         categories_list = []
-        for name, cat_data in HELP_CATEGORIES.items():
+        for name, cat_data in _help_categories().items():
             if cat_data["commands"] is not None:
                 count = len(cat_data["commands"])
                 categories_list.append(f"{cat_data['emoji']} **{name.split(' ', 1)[1]}** — {count} commandes")
@@ -1,15 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
 import datetime as dt
+import heapq
+import time
 from dataclasses import dataclass
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
-from ..db import Database
+from ..db import Database, Reason
 from .. import config
+from ..metrics import METRICS
 from ..utils import embed_info
 
 
@@ -21,6 +25,18 @@ def _due_iso(term_days: int) -> str:
     return (dt.datetime.utcnow().replace(microsecond=0) + dt.timedelta(days=int(term_days))).isoformat() + "Z"
 
 
+def _parse_iso(s: str) -> dt.datetime | None:
+    """Parse un horodatage `_now_iso()`/`_due_iso()` (UTC naïf)."""
+    try:
+        return dt.datetime.strptime(str(s)[:19], "%Y-%m-%dT%H:%M:%S")
+    except Exception:
+        return None
+
+
+# Durée de vie du cache des listes /pret mes|actifs|historique (invalidé à chaque changement)
+LIST_CACHE_TTL_S = 60.0
+
+
 async def _safe_reply(interaction: discord.Interaction, content: str | None = None, *, embed=None, ephemeral: bool = True):
     """Reply safely whether the interaction was deferred or not."""
     try:
@@ -48,28 +64,16 @@ def _calc_total_due(principal: int, interest_pct: float) -> int:
 
 def _get_next_slot(db: Database, borrower_id: int) -> int | None:
     """Trouve le prochain slot disponible (1, 2 ou 3) pour un emprunteur."""
-    used_slots = db.fetchall(
-        "SELECT slot FROM loans WHERE borrower_id=? AND status IN ('PENDING','ACTIVE') AND slot IS NOT NULL",
-        (borrower_id,)
-    )
-    used = {int(r["slot"]) for r in used_slots}
-    for s in range(1, config.LOANS_MAX_ACTIVE_PER_USER + 1):
-        if s not in used:
-            return s
-    return None
+    return db.loans_next_slot(borrower_id, config.LOANS_MAX_ACTIVE_PER_USER)
 
 
 def _get_loan_by_slot(db: Database, borrower_id: int, slot: int):
     """Récupère un prêt actif par son slot."""
-    return db.fetchone(
-        "SELECT * FROM loans WHERE borrower_id=? AND slot=? AND status IN ('PENDING','ACTIVE')",
-        (borrower_id, slot)
-    )
+    return db.loans_get_open_by_slot(borrower_id, slot)
 
 
-def _release_slot(db: Database, loan_id: int):
-    """Libère le slot d'un prêt (le met à NULL)."""
-    db.execute("UPDATE loans SET slot=NULL WHERE loan_id=?", (loan_id,))
+def _loans_cog(bot: commands.Bot) -> "LoansCog | None":
+    return bot.get_cog("LoansCog")  # type: ignore
 
 
 @dataclass
@@ -95,7 +99,7 @@ class LoanDecisionView(discord.ui.View):
 
     async def _decide(self, interaction: discord.Interaction, accept: bool):
         db: Database = self.bot.db  # type: ignore
-        loan = db.fetchone("SELECT * FROM loans WHERE loan_id=?", (self.payload.loan_id,))
+        loan = db.loans_get(self.payload.loan_id)
         if loan is None:
             await _safe_reply(interaction, "❌ Prêt introuvable.", ephemeral=True)
             self.stop()
@@ -113,10 +117,10 @@ class LoanDecisionView(discord.ui.View):
         term_days = int(loan["term_days"])
 
         if not accept:
-            db.execute(
-                "UPDATE loans SET status='REJECTED', approved_at=?, decided_by=?, slot=NULL WHERE loan_id=?",
-                (_now_iso(), interaction.user.id, self.payload.loan_id),
-            )
+            db.loans_close(self.payload.loan_id, "REJECTED", decided_by=interaction.user.id)
+            cog = _loans_cog(self.bot)
+            if cog:
+                cog.invalidate(borrower_id, lender_id)
             await _safe_reply(interaction, "❌ Prêt refusé.", ephemeral=True)
             try:
                 borrower = self.bot.get_user(borrower_id) or await self.bot.fetch_user(borrower_id)
@@ -133,13 +137,13 @@ class LoanDecisionView(discord.ui.View):
                 self.stop()
                 return
             lender_id = int(lender_id)
-            lender_row = db.fetchone("SELECT balance FROM users WHERE user_id=?", (lender_id,))
+            lender_row = db.get_user(lender_id)
             lender_balance = int(lender_row["balance"]) if lender_row else 0
             if lender_balance < principal:
-                db.execute(
-                    "UPDATE loans SET status='CANCELLED', approved_at=?, decided_by=?, slot=NULL WHERE loan_id=?",
-                    (_now_iso(), interaction.user.id, self.payload.loan_id),
-                )
+                db.loans_close(self.payload.loan_id, "CANCELLED", decided_by=interaction.user.id)
+                cog = _loans_cog(self.bot)
+                if cog:
+                    cog.invalidate(borrower_id, lender_id)
                 await _safe_reply(interaction, "❌ Acceptation impossible: le prêteur n'a plus assez de KZ.", ephemeral=True)
                 try:
                     lender = self.bot.get_user(lender_id) or await self.bot.fetch_user(lender_id)
@@ -150,26 +154,19 @@ class LoanDecisionView(discord.ui.View):
                 return
             db.ensure_user(lender_id, config.START_BALANCE)
             db.ensure_user(borrower_id, config.START_BALANCE)
-            db.remove_balance(lender_id, principal)
-            db.add_balance(borrower_id, principal)
+            db.remove_balance(lender_id, principal, reason=Reason.LOAN_DISBURSE, ref_id=self.payload.loan_id)
+            db.add_balance(borrower_id, principal, reason=Reason.LOAN_DISBURSE, ref_id=self.payload.loan_id)
         else:
             db.ensure_user(borrower_id, config.START_BALANCE)
-            db.add_balance(borrower_id, principal)
+            db.add_balance(borrower_id, principal, reason=Reason.LOAN_DISBURSE, ref_id=self.payload.loan_id)
 
         total_due = _calc_total_due(principal, interest_pct)
-        db.execute(
-            """
-            UPDATE loans
-            SET status='ACTIVE',
-                total_due=?,
-                remaining_due=?,
-                approved_at=?,
-                due_at=?,
-                decided_by=?
-            WHERE loan_id=?
-            """,
-            (total_due, total_due, _now_iso(), _due_iso(term_days), interaction.user.id, self.payload.loan_id),
-        )
+        due_at = _due_iso(term_days)
+        db.loans_activate(self.payload.loan_id, total_due, due_at, interaction.user.id)
+        cog = _loans_cog(self.bot)
+        if cog:
+            cog.schedule(self.payload.loan_id, due_at)
+            cog.invalidate(borrower_id, lender_id)
 
         await _safe_reply(interaction, f"✅ Prêt #{self.slot} accepté.", ephemeral=True)
 
@@ -206,6 +203,133 @@ class LoansCog(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.db: Database = bot.db  # type: ignore
+        # Échéancier: tas (due_at, loan_id) des prêts actifs. Entrées périmées
+        # (prêt remboursé entre-temps) ignorées: la DB reste la source de vérité.
+        self._due_heap: list[tuple[str, int]] = []
+        self._servicer: asyncio.Task | None = None  # process principal seulement
+        self._due_stale = False  # prêt modifié (peut-être par un autre process): échéancier à relire
+        # (liste, user_id) -> (expire_at, description rendue)
+        self._list_cache: dict[tuple[str, int], tuple[float, str]] = {}
+
+    async def cog_load(self):
+        if config.IS_PRIMARY:  # un seul échéancier par base
+            await self._load_due()
+            self._servicer = asyncio.create_task(self._servicing_loop())
+        self.db.subscribe("loan", self._on_loan_change)
+
+    async def cog_unload(self):
+        self.db.unsubscribe("loan", self._on_loan_change)
+        if self._servicer:
+            self._servicer.cancel()
+
+    def _on_loan_change(self, key: str | None) -> None:
+        # Appelé depuis un thread DB (écriture ou relecture de la table `changes`)
+        if self._servicer is not None:
+            self._due_stale = True
+        if key is None:
+            self.bot.loop.call_soon_threadsafe(self._list_cache.clear)
+        else:
+            self.bot.loop.call_soon_threadsafe(self.invalidate, int(key))
+
+    # ---------------- ÉCHÉANCIER ----------------
+    async def _load_due(self) -> None:
+        self._due_stale = False
+        rows = await asyncio.to_thread(self.db.loans_list_due)
+        self._due_heap = [(str(r["due_at"]), int(r["loan_id"])) for r in rows]
+        heapq.heapify(self._due_heap)
+
+    def schedule(self, loan_id: int, due_at: str) -> None:
+        if self._servicer is None:  # process secondaire: le principal relira l'échéancier
+            return
+        heapq.heappush(self._due_heap, (str(due_at), int(loan_id)))
+
+    def invalidate(self, *user_ids) -> None:
+        """Invalide les listes en cache des utilisateurs concernés."""
+        ids = {int(u) for u in user_ids if u is not None}
+        for key in [k for k in self._list_cache if k[1] in ids]:
+            self._list_cache.pop(key, None)
+
+    def _cache_get(self, name: str, user_id: int) -> str | None:
+        hit = self._list_cache.get((name, int(user_id)))
+        if hit and hit[0] > time.monotonic():
+            METRICS.inc("kz_cache_requests_total", cache="loans_list", result="hit")
+            return hit[1]
+        METRICS.inc("kz_cache_requests_total", cache="loans_list", result="miss")
+        return None
+
+    def _cache_set(self, name: str, user_id: int, desc: str) -> None:
+        self._list_cache[(name, int(user_id))] = (time.monotonic() + LIST_CACHE_TTL_S, desc)
+
+    def _next_wakeup(self) -> float:
+        interval = float(max(10, int(config.LOANS_SERVICING_INTERVAL_S)))
+        if not self._due_heap:
+            return interval
+        due = _parse_iso(self._due_heap[0][0])
+        if due is None:
+            return 1.0
+        return max(1.0, min(interval, (due - dt.datetime.utcnow()).total_seconds()))
+
+    async def _servicing_loop(self):
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            try:
+                if self._due_stale:  # prêts créés/remboursés ailleurs: relus au réveil suivant
+                    await self._load_due()
+                await self._service_due()
+            except Exception as e:
+                print(f"⚠️ Échéancier prêts: {type(e).__name__}: {e}")
+            await asyncio.sleep(self._next_wakeup())
+
+    async def _service_due(self):
+        """Traite en lot tous les prêts arrivés à échéance (pénalité + prélèvement)."""
+        now = _now_iso()
+        if not self._due_heap or self._due_heap[0][0] > now:
+            return
+        while self._due_heap and self._due_heap[0][0] <= now:
+            heapq.heappop(self._due_heap)
+
+        batch = 200
+        while True:
+            processed = await asyncio.to_thread(
+                self.db.loans_service_overdue,
+                dt.datetime.now(dt.timezone.utc),
+                float(config.LOANS_OVERDUE_PENALTY_PCT),
+                int(config.LOANS_OVERDUE_PERIOD_H),
+                batch,
+            )
+            for n in processed:
+                if n["next_due"]:
+                    self.schedule(n["loan_id"], n["next_due"])
+                self.invalidate(n["borrower_id"], n["lender_id"])
+            await self._send_servicing_notices(processed)
+            if len(processed) < batch:
+                break
+
+    async def _send_servicing_notices(self, processed: list[dict]):
+        """Un seul MP par utilisateur, qui regroupe tous ses prêts traités."""
+        notices: dict[int, list[str]] = {}
+        for n in processed:
+            slot = f"#{n['slot']}" if n["slot"] is not None else f"(id {n['loan_id']})"
+            if n["status"] == "REPAID":
+                line = f"✅ Prêt {slot} [{n['kind']}] en retard: pénalité +{n['penalty']} KZ, prélevé {n['paid']} KZ — **remboursé**."
+            else:
+                due = n["next_due"][:16].replace("T", " ")
+                line = (
+                    f"⚠️ Prêt {slot} [{n['kind']}] en retard: pénalité +{n['penalty']} KZ, prélevé {n['paid']} KZ — "
+                    f"reste **{n['remaining']}** KZ (prochain prélèvement: {due} UTC)."
+                )
+            notices.setdefault(n["borrower_id"], []).append(line)
+            if n["lender_id"] is not None and n["paid"]:
+                notices.setdefault(n["lender_id"], []).append(
+                    f"💰 Prêt P2P {slot}: {n['paid']} KZ prélevés automatiquement pour toi."
+                )
+
+        for user_id, lines in notices.items():
+            try:
+                user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+                await user.send("📅 **Échéances de prêts**\n" + "\n".join(lines[:20]))
+            except Exception:
+                pass
 
     pret = app_commands.Group(name="pret", description="Système de prêts (banque + entre joueurs)")
 
@@ -248,13 +372,10 @@ class LoansCog(commands.Cog):
                 )
 
             interest = _get_fixed_interest(self.db)
-            loan_id = self.db.insert_returning_id(
-                """
-                INSERT INTO loans(kind, lender_id, borrower_id, principal, interest_pct, total_due, remaining_due, term_days, status, note, created_at, slot)
-                VALUES('BANK', NULL, ?, ?, ?, 0, 0, ?, 'PENDING', ?, ?, ?)
-                """,
-                (interaction.user.id, montant, float(interest), duree_jours, note[:300], _now_iso(), slot),
+            loan_id = self.db.loans_create_request(
+                interaction.user.id, montant, float(interest), duree_jours, note[:300], kind="BANK", slot=slot
             )
+            self.invalidate(interaction.user.id)
 
             # DM owner with decision buttons
             try:
@@ -326,7 +447,7 @@ class LoansCog(commands.Cog):
                 return await _safe_reply(interaction, f"❌ Taux invalide. 0 à {config.LOANS_P2P_MAX_INTEREST_PCT}%.", ephemeral=True)
 
             self.db.ensure_user(interaction.user.id, config.START_BALANCE)
-            lender_bal_row = self.db.fetchone("SELECT balance FROM users WHERE user_id=?", (interaction.user.id,))
+            lender_bal_row = self.db.get_user(interaction.user.id)
             lender_bal = int(lender_bal_row["balance"]) if lender_bal_row else 0
             if lender_bal < montant:
                 return await _safe_reply(interaction, "❌ Tu n'as pas assez de KZ pour proposer ce prêt.", ephemeral=True)
@@ -336,13 +457,10 @@ class LoansCog(commands.Cog):
             if slot is None:
                 return await _safe_reply(interaction, f"❌ {joueur.mention} a déjà {config.LOANS_MAX_ACTIVE_PER_USER} prêts en cours.", ephemeral=True)
 
-            loan_id = self.db.insert_returning_id(
-                """
-                INSERT INTO loans(kind, lender_id, borrower_id, principal, interest_pct, total_due, remaining_due, term_days, status, note, created_at, slot)
-                VALUES('P2P', ?, ?, ?, ?, 0, 0, ?, 'PENDING', ?, ?, ?)
-                """,
-                (interaction.user.id, joueur.id, montant, float(taux), duree_jours, note[:300], _now_iso(), slot),
+            loan_id = self.db.loans_create_request(
+                joueur.id, montant, float(taux), duree_jours, note[:300], kind="P2P", lender_id=interaction.user.id, slot=slot
             )
+            self.invalidate(interaction.user.id, joueur.id)
 
             # DM borrower
             try:
@@ -375,13 +493,8 @@ class LoansCog(commands.Cog):
                 return await _safe_reply(interaction, f"❌ Numéro invalide (1 à {config.LOANS_MAX_ACTIVE_PER_USER}).", ephemeral=True)
 
             # Chercher le prêt par slot (emprunteur ou prêteur P2P)
-            loan = self.db.fetchone(
-                """SELECT * FROM loans 
-                   WHERE slot=? AND status='PENDING' 
-                   AND (borrower_id=? OR (kind='P2P' AND lender_id=?))""",
-                (numero, interaction.user.id, interaction.user.id)
-            )
-            
+            loan = self.db.loans_get_pending_by_slot(interaction.user.id, numero)
+
             if loan is None:
                 return await _safe_reply(interaction, f"❌ Aucun prêt en attente trouvé avec le numéro #{numero}.", ephemeral=True)
 
@@ -405,7 +518,8 @@ class LoansCog(commands.Cog):
             if not can_cancel:
                 return await _safe_reply(interaction, "❌ Tu n'es pas autorisé à annuler ce prêt.", ephemeral=True)
 
-            self.db.execute("UPDATE loans SET status='CANCELLED', approved_at=?, slot=NULL WHERE loan_id=?", (_now_iso(), loan_id))
+            self.db.loans_close(loan_id, "CANCELLED")
+            self.invalidate(borrower_id, lender_id)
 
             # Notifier l'autre partie
             try:
@@ -442,26 +556,19 @@ class LoansCog(commands.Cog):
             pay = min(pay, remaining)
 
             self.db.ensure_user(interaction.user.id, config.START_BALANCE)
-            bal_row = self.db.fetchone("SELECT balance FROM users WHERE user_id=?", (interaction.user.id,))
-            bal = int(bal_row["balance"]) if bal_row else 0
-            if bal < pay:
+
+            # débit + crédit prêteur + mise à jour du prêt + journal, en une transaction
+            res = self.db.loans_repay(int(loan["loan_id"]), pay)
+            if res is None:
+                return await _safe_reply(interaction, f"❌ Aucun prêt actif trouvé avec le numéro #{numero}.", ephemeral=True)
+            if res["insufficient"]:
                 return await _safe_reply(interaction, "❌ Solde insuffisant pour ce remboursement.", ephemeral=True)
 
-            loan_id = int(loan["loan_id"])
-            
-            # money moves
-            self.db.remove_balance(interaction.user.id, pay)
-            if loan["kind"] == "P2P" and loan["lender_id"] is not None:
-                self.db.ensure_user(int(loan["lender_id"]), config.START_BALANCE)
-                self.db.add_balance(int(loan["lender_id"]), pay)
-
-            new_remaining = remaining - pay
-            if new_remaining <= 0:
-                self.db.execute("UPDATE loans SET remaining_due=0, status='REPAID', slot=NULL WHERE loan_id=?", (loan_id,))
+            self.invalidate(interaction.user.id, loan["lender_id"])
+            if res["status"] == "REPAID":
                 await _safe_reply(interaction, f"✅ Prêt #{numero} remboursé en totalité ! 🎉", ephemeral=True)
             else:
-                self.db.execute("UPDATE loans SET remaining_due=? WHERE loan_id=?", (new_remaining, loan_id))
-                await _safe_reply(interaction, f"✅ Remboursé {pay} KZ. Reste {new_remaining} KZ sur le prêt #{numero}.", ephemeral=True)
+                await _safe_reply(interaction, f"✅ Remboursé {res['paid']} KZ. Reste {res['remaining']} KZ sur le prêt #{numero}.", ephemeral=True)
         except Exception as e:
             return await _safe_reply(interaction, f"❌ Erreur: `{type(e).__name__}`", ephemeral=True)
 
@@ -470,36 +577,33 @@ class LoansCog(commands.Cog):
     async def pret_mes(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         try:
-            rows = self.db.fetchall(
-                """
-                SELECT slot, kind, lender_id, borrower_id, principal, interest_pct, remaining_due, total_due, status, due_at
-                FROM loans
-                WHERE (borrower_id=? OR lender_id=?) AND status IN ('PENDING','ACTIVE') AND slot IS NOT NULL
-                ORDER BY slot ASC
-                """,
-                (interaction.user.id, interaction.user.id),
-            )
-            if not rows:
-                return await _safe_reply(interaction, "ℹ️ Tu n'as aucun prêt en cours.", ephemeral=True)
-
-            lines = []
-            for r in rows:
-                slot = int(r["slot"])
-                kind = r["kind"]
-                status = "⏳ En attente" if r["status"] == "PENDING" else "✅ Actif"
-                rem = int(r["remaining_due"])
-                total = int(r["total_due"])
-                principal = int(r["principal"])
-                pct = float(r["interest_pct"])
-                due = r["due_at"][:10] if r["due_at"] else "—"
-                role = "Emprunteur" if int(r["borrower_id"]) == interaction.user.id else "Prêteur"
+            desc = self._cache_get("mes", interaction.user.id)
+            if desc is None:
+                rows = self.db.loans_open_for_user(interaction.user.id)
+
+                lines = []
+                for r in rows:
+                    slot = int(r["slot"])
+                    kind = r["kind"]
+                    status = "⏳ En attente" if r["status"] == "PENDING" else "✅ Actif"
+                    rem = int(r["remaining_due"])
+                    total = int(r["total_due"])
+                    principal = int(r["principal"])
+                    pct = float(r["interest_pct"])
+                    due = r["due_at"][:10] if r["due_at"] else "—"
+                    role = "Emprunteur" if int(r["borrower_id"]) == interaction.user.id else "Prêteur"
                 
-                if r["status"] == "ACTIVE":
-                    lines.append(f"**#{slot}** [{kind}] ({role}) — {status}\n└ Reste **{rem}** / {total} KZ — Échéance: {due}")
-                else:
-                    lines.append(f"**#{slot}** [{kind}] ({role}) — {status}\n└ Montant: **{principal}** KZ — Intérêt: {pct}%")
+                    if r["status"] == "ACTIVE":
+                        lines.append(f"**#{slot}** [{kind}] ({role}) — {status}\n└ Reste **{rem}** / {total} KZ — Échéance: {due}")
+                    else:
+                        lines.append(f"**#{slot}** [{kind}] ({role}) — {status}\n└ Montant: **{principal}** KZ — Intérêt: {pct}%")
+
+                desc = "\n\n".join(lines)
+                self._cache_set("mes", interaction.user.id, desc)
+            if not desc:
+                return await _safe_reply(interaction, "ℹ️ Tu n'as aucun prêt en cours.", ephemeral=True)
 
-            embed = embed_info("💳 Tes prêts en cours", "\n\n".join(lines))
+            embed = embed_info("💳 Tes prêts en cours", desc)
             embed.set_footer(text=f"Utilise /pret rembourser <numéro> pour rembourser")
             return await _safe_reply(interaction, embed=embed, ephemeral=True)
         except Exception as e:
@@ -509,15 +613,7 @@ class LoansCog(commands.Cog):
     async def pret_attente(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         try:
-            rows = self.db.fetchall(
-                """
-                SELECT slot, kind, lender_id, borrower_id, principal, interest_pct, note, created_at
-                FROM loans
-                WHERE (borrower_id=? OR lender_id=?) AND status='PENDING' AND slot IS NOT NULL
-                ORDER BY slot ASC
-                """,
-                (interaction.user.id, interaction.user.id),
-            )
+            rows = self.db.loans_open_for_user(interaction.user.id, ("PENDING",))
             if not rows:
                 return await _safe_reply(interaction, "ℹ️ Tu n'as aucun prêt en attente.", ephemeral=True)
 
@@ -541,32 +637,29 @@ class LoansCog(commands.Cog):
     async def pret_actifs(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         try:
-            rows = self.db.fetchall(
-                """
-                SELECT slot, kind, lender_id, borrower_id, principal, interest_pct, remaining_due, total_due, due_at
-                FROM loans
-                WHERE (borrower_id=? OR lender_id=?) AND status='ACTIVE' AND slot IS NOT NULL
-                ORDER BY slot ASC
-                """,
-                (interaction.user.id, interaction.user.id),
-            )
-            if not rows:
+            desc = self._cache_get("actifs", interaction.user.id)
+            if desc is None:
+                rows = self.db.loans_open_for_user(interaction.user.id, ("ACTIVE",))
+
+                lines = []
+                for r in rows:
+                    slot = int(r["slot"])
+                    kind = r["kind"]
+                    rem = int(r["remaining_due"])
+                    total = int(r["total_due"])
+                    principal = int(r["principal"])
+                    pct = float(r["interest_pct"])
+                    due = r["due_at"][:10] if r["due_at"] else "—"
+                    role = "Emprunteur" if int(r["borrower_id"]) == interaction.user.id else "Prêteur"
+                    progress = int((1 - rem/total) * 100) if total > 0 else 0
+                    lines.append(f"**#{slot}** [{kind}] ({role})\n└ Reste **{rem}** / {total} KZ ({progress}% remboursé) — Échéance: {due}")
+
+                desc = "\n\n".join(lines)
+                self._cache_set("actifs", interaction.user.id, desc)
+            if not desc:
                 return await _safe_reply(interaction, "ℹ️ Tu n'as aucun prêt actif.", ephemeral=True)
 
-            lines = []
-            for r in rows:
-                slot = int(r["slot"])
-                kind = r["kind"]
-                rem = int(r["remaining_due"])
-                total = int(r["total_due"])
-                principal = int(r["principal"])
-                pct = float(r["interest_pct"])
-                due = r["due_at"][:10] if r["due_at"] else "—"
-                role = "Emprunteur" if int(r["borrower_id"]) == interaction.user.id else "Prêteur"
-                progress = int((1 - rem/total) * 100) if total > 0 else 0
-                lines.append(f"**#{slot}** [{kind}] ({role})\n└ Reste **{rem}** / {total} KZ ({progress}% remboursé) — Échéance: {due}")
-
-            embed = embed_info("✅ Prêts actifs", "\n\n".join(lines))
+            embed = embed_info("✅ Prêts actifs", desc)
             embed.set_footer(text="Utilise /pret rembourser <numéro> pour rembourser")
             return await _safe_reply(interaction, embed=embed, ephemeral=True)
         except Exception as e:
@@ -576,35 +669,31 @@ class LoansCog(commands.Cog):
     async def pret_historique(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         try:
-            rows = self.db.fetchall(
-                """
-                SELECT loan_id, kind, lender_id, borrower_id, principal, interest_pct, total_due, status, created_at, approved_at
-                FROM loans
-                WHERE (borrower_id=? OR lender_id=?) AND status IN ('REPAID','REJECTED','CANCELLED')
-                ORDER BY loan_id DESC
-                LIMIT 15
-                """,
-                (interaction.user.id, interaction.user.id),
-            )
-            if not rows:
-                return await _safe_reply(interaction, "ℹ️ Aucun prêt dans l'historique.", ephemeral=True)
+            desc = self._cache_get("historique", interaction.user.id)
+            if desc is None:
+                rows = self.db.loans_history_for_user(interaction.user.id, 15)
 
-            lines = []
-            status_emoji = {"REPAID": "✅", "REJECTED": "❌", "CANCELLED": "🚫"}
-            status_text = {"REPAID": "Remboursé", "REJECTED": "Refusé", "CANCELLED": "Annulé"}
+                lines = []
+                status_emoji = {"REPAID": "✅", "REJECTED": "❌", "CANCELLED": "🚫"}
+                status_text = {"REPAID": "Remboursé", "REJECTED": "Refusé", "CANCELLED": "Annulé"}
             
-            for r in rows:
-                kind = r["kind"]
-                status = r["status"]
-                emoji = status_emoji.get(status, "❓")
-                text = status_text.get(status, status)
-                principal = int(r["principal"])
-                total = int(r["total_due"]) if r["total_due"] else principal
-                role = "Emprunteur" if int(r["borrower_id"]) == interaction.user.id else "Prêteur"
-                date = r["approved_at"][:10] if r["approved_at"] else r["created_at"][:10] if r["created_at"] else "—"
-                lines.append(f"{emoji} [{kind}] ({role}) — **{text}**\n└ {principal} KZ → {total} KZ — {date}")
+                for r in rows:
+                    kind = r["kind"]
+                    status = r["status"]
+                    emoji = status_emoji.get(status, "❓")
+                    text = status_text.get(status, status)
+                    principal = int(r["principal"])
+                    total = int(r["total_due"]) if r["total_due"] else principal
+                    role = "Emprunteur" if int(r["borrower_id"]) == interaction.user.id else "Prêteur"
+                    date = r["approved_at"][:10] if r["approved_at"] else r["created_at"][:10] if r["created_at"] else "—"
+                    lines.append(f"{emoji} [{kind}] ({role}) — **{text}**\n└ {principal} KZ → {total} KZ — {date}")
+
+                desc = "\n\n".join(lines)
+                self._cache_set("historique", interaction.user.id, desc)
+            if not desc:
+                return await _safe_reply(interaction, "ℹ️ Aucun prêt dans l'historique.", ephemeral=True)
 
-            embed = embed_info("📜 Historique des prêts", "\n\n".join(lines))
+            embed = embed_info("📜 Historique des prêts", desc)
             embed.set_footer(text="15 derniers prêts terminés")
             return await _safe_reply(interaction, embed=embed, ephemeral=True)
         except Exception as e:
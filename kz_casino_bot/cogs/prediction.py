@@ -6,7 +6,7 @@ from discord import app_commands
 from discord.ext import commands
 
 from .. import config
-from ..db import Database
+from ..db import Database, Reason
 from ..utils import embed_info, embed_lose, embed_neutral, embed_win, fmt
 from ..checks import enforce_blacklist
 
@@ -17,8 +17,21 @@ PRED_CHOICES = [
 ]
 
 
+def pool_odds(pool_for: int, pool_against: int) -> float:
+    """Cote pari mutuel d'un côté du pool (1.0 si personne en face)."""
+    if pool_for <= 0:
+        return 0.0
+    return (pool_for + pool_against) / float(pool_for)
+
+
+def _split_pool(pool: tuple[int, int], choice: str) -> tuple[int, int]:
+    """(pool du côté choisi, pool adverse)."""
+    win_pool, lose_pool = pool
+    return (win_pool, lose_pool) if choice == "win" else (lose_pool, win_pool)
+
+
 class PredictionCog(commands.Cog):
-    """Parier sur la prochaine victoire/défaite d'un autre joueur."""
+    """Parier sur la prochaine victoire/défaite d'un autre joueur (pari mutuel par cible)."""
 
     def __init__(self, bot: commands.Bot, db: Database):
         self.bot = bot
@@ -72,13 +85,16 @@ class PredictionCog(commands.Cog):
         # Si une prédiction existe déjà sur ce target, on la rembourse avant d'écraser.
         old = self.db.delete_prediction(interaction.user.id, target.id)
         if old:
-            self.db.add_balance(interaction.user.id, int(old["bet"]))
+            self.db.add_balance(interaction.user.id, int(old["bet"]), reason=Reason.PREDICTION_REFUND, ref_id=target.id)
 
         # Escrow: on retire la mise maintenant.
-        self.db.add_balance(interaction.user.id, -bet)
+        self.db.add_balance(interaction.user.id, -bet, reason=Reason.PREDICTION_STAKE, ref_id=target.id)
         self.db.upsert_prediction(interaction.user.id, target.id, bet, choice.value)
 
         new_bal = int(self.db.get_user(interaction.user.id)["balance"])
+        pool = self.db.prediction_pool(target.id)
+        mine, other = _split_pool(pool, choice.value)
+        odds = pool_odds(mine, other)
         e = embed_win(
             "🔮 Prediction enregistrée",
             (
@@ -87,7 +103,17 @@ class PredictionCog(commands.Cog):
             ),
         )
         e.add_field(name="🏦 Ton solde", value=f"{fmt(new_bal)} KZ", inline=True)
-        e.set_footer(text="Si tu te trompes, ta mise va au joueur. Si tu as raison, tu récupères ta mise + tu prends la mise au joueur (si possible).")
+        e.add_field(
+            name="📊 Pool",
+            value=f"Victoire **{fmt(pool[0])}** | Défaite **{fmt(pool[1])}**",
+            inline=True,
+        )
+        e.add_field(
+            name="🎯 Cote actuelle",
+            value=f"x{odds:.2f} (gain estimé {fmt(int(bet * odds))} KZ)",
+            inline=True,
+        )
+        e.set_footer(text="Pari mutuel: les gagnants se partagent tout le pool au prorata de leur mise. La cote bouge avec les mises. Personne de gagnant = remboursement.")
         await interaction.response.send_message(embed=e)
 
     @app_commands.command(name="prediction_cancel", description="Annuler une prediction (rembourse ta mise)")
@@ -101,7 +127,7 @@ class PredictionCog(commands.Cog):
                 ephemeral=True,
             )
         bet = int(row["bet"])
-        self.db.add_balance(interaction.user.id, bet)
+        self.db.add_balance(interaction.user.id, bet, reason=Reason.PREDICTION_REFUND, ref_id=target.id)
         new_bal = int(self.db.get_user(interaction.user.id)["balance"])
         e = embed_win("✅ Prediction annulée", f"Mise remboursée : **{fmt(bet)} KZ**")
         e.add_field(name="🏦 Ton solde", value=f"{fmt(new_bal)} KZ", inline=True)
@@ -124,7 +150,8 @@ class PredictionCog(commands.Cog):
                 choice = str(p["choice"])
                 who = "toi" if predictor_id == interaction.user.id else f"<@{predictor_id}>"
                 other = "toi" if target_id == interaction.user.id else f"<@{target_id}>"
-                lines.append(f"• {who} → {other} : **{choice}** | mise **{fmt(bet)}**")
+                odds = pool_odds(*_split_pool(self.db.prediction_pool(target_id), choice))
+                lines.append(f"• {who} → {other} : **{choice}** | mise **{fmt(bet)}** | cote x{odds:.2f}")
             e.add_field(name="⏳ En cours", value="\n".join(lines), inline=False)
         else:
             e.add_field(name="⏳ En cours", value="Aucune prediction en cours.", inline=False)
@@ -137,10 +164,10 @@ class PredictionCog(commands.Cog):
                 bet = int(r["bet"])
                 choice = str(r["choice"])
                 result = str(r["result"])
-                paid = int(r["paid_from_target"])
+                payout = int(r["payout"])
                 outcome = "✅" if choice == result and predictor_id == interaction.user.id else ("❌" if predictor_id == interaction.user.id else "ℹ️")
                 lines.append(
-                    f"• {outcome} <@{predictor_id}> sur <@{target_id}> : {choice} → **{result}** | mise {fmt(bet)} | pris au target {fmt(paid)}"
+                    f"• {outcome} <@{predictor_id}> sur <@{target_id}> : {choice} → **{result}** | mise {fmt(bet)} | versé {fmt(payout)}"
                 )
             e.add_field(name="📜 Historique (8 derniers)", value="\n".join(lines), inline=False)
         else:
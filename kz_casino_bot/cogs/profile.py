@@ -1,15 +1,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
+import io
 import re
-from datetime import datetime
 
 import discord
 from discord import app_commands
 from discord.ext import commands
 
 from .. import config
-from ..db import Database
+from ..db import Database, ProfileSnapshot
+from ..profile_card import CardData, CardRenderer
 from ..shop_data import get_item
 from ..leveling import level_from_xp, xp_for_level, xp_progress, title_for_level, title_and_icon_for_level
 from ..leveling import unlocked_profile_colors, grade_for_level
@@ -19,7 +21,6 @@ from ..utils import (
     embed_win,
     fmt,
     now_utc,
-    parse_dt,
     human_time,
 )
 from ..checks import enforce_blacklist
@@ -167,10 +168,49 @@ def safe_row_get(row, key, default=None):
         return default
 
 
+def equipped_frame_id(snap: ProfileSnapshot) -> str | None:
+    """Cadre affiché (si possédé). Compat: si le joueur possède frame_gold et n'a jamais choisi de cadre,
+    on continue à l'afficher par défaut."""
+    equipped_frame = snap.profile_frame
+
+    # IMPORTANT:
+    # - Compat historique: si profile_frame est NULL et que le joueur possède frame_gold, on l'affiche par défaut.
+    # - MAIS si l'utilisateur a explicitement retiré son cadre via /cosmetic frameremove,
+    #   on stocke la valeur "none" pour désactiver ce fallback (sinon le cadre or revient tout seul).
+    if isinstance(equipped_frame, str) and equipped_frame.lower() == "none":
+        return None
+    if equipped_frame:
+        # cadre équipé mais plus possédé => on déséquipe silencieusement
+        return str(equipped_frame) if str(equipped_frame) in snap.frames else None
+    # ancien comportement: cadre or auto si possédé
+    return "frame_gold" if "frame_gold" in snap.frames else None
+
+
+def profile_color(snap: ProfileSnapshot, frame_style: dict | None) -> int:
+    """Couleur personnalisée ou par défaut (un cadre force une couleur "thème")."""
+    color_str = snap.profile_color
+    if frame_style:
+        return int(frame_style["embed_color"])
+    if color_str and color_str in PROFILE_COLORS:
+        return PROFILE_COLORS[color_str]
+    if color_str and str(color_str).startswith("#"):
+        try:
+            return int(color_str[1:], 16)
+        except Exception:
+            return config.BRAND["info"]
+    return config.BRAND["info"]
+
+
 class ProfileCog(commands.Cog):
     def __init__(self, bot: commands.Bot, db: Database):
         self.bot = bot
         self.db = db
+        self.cards = CardRenderer(
+            config.CARD_CACHE_DIR, config.CARD_WORKERS, config.CARD_CACHE_MEM, config.CARD_CACHE_MAX_FILES, config.CARD_FONT
+        )
+
+    async def cog_unload(self):
+        self.cards.close()
 
 
     def _consume_setprofile_token(self, user_id: int) -> bool:
@@ -189,57 +229,11 @@ class ProfileCog(commands.Cog):
         if not allowed:
             raise app_commands.CheckFailure("Blacklisted")
 
-    def _get_user_rank(self, user_id: int) -> int:
-        """Récupère le rang d'un utilisateur par balance."""
-        rows = self.db.fetchall("SELECT user_id FROM users ORDER BY balance DESC")
-        for i, row in enumerate(rows, start=1):
-            if int(row["user_id"]) == user_id:
-                return i
-        return 0
-
-    def _build_profile_embed(self, user: discord.User | discord.Member, row) -> discord.Embed:
-        """Construit l'embed de profil."""
-        user_id = user.id
-
-        inv = self.db.get_inventory(user_id)
-
-        # Cadre équipé (si possédé). Compat: si le joueur possède frame_gold et n'a jamais choisi de cadre,
-        # on continue à l'afficher par défaut.
-        equipped_frame = safe_row_get(row, "profile_frame")
-        frame_id: str | None = None
-
-        # IMPORTANT:
-        # - Compat historique: si profile_frame est NULL et que le joueur possède frame_gold, on l'affiche par défaut.
-        # - MAIS si l'utilisateur a explicitement retiré son cadre via /cosmetic frameremove,
-        #   on stocke la valeur "none" pour désactiver ce fallback (sinon le cadre or revient tout seul).
-        if isinstance(equipped_frame, str) and equipped_frame.lower() == "none":
-            frame_id = None
-        elif equipped_frame and int(inv.get(str(equipped_frame), 0)) > 0:
-            frame_id = str(equipped_frame)
-        elif equipped_frame:
-            # cadre équipé mais plus possédé => on déséquipe silencieusement
-            frame_id = None
-        else:
-            # ancien comportement: cadre or auto si possédé
-            if int(inv.get("frame_gold", 0)) > 0:
-                frame_id = "frame_gold"
-
+    def _build_profile_embed(self, user: discord.User | discord.Member, snap: ProfileSnapshot) -> discord.Embed:
+        """Construit l'embed de profil (aucun accès DB: tout est dans le snapshot)."""
+        frame_id = equipped_frame_id(snap)
         frame_style = FRAME_STYLES.get(frame_id) if frame_id else None
-        
-        # Couleur personnalisée ou par défaut
-        color_str = safe_row_get(row, "profile_color")
-        if frame_style:
-            # Un cadre force une couleur "thème" pour l'embed
-            color = int(frame_style["embed_color"])
-        elif color_str and color_str in PROFILE_COLORS:
-            color = PROFILE_COLORS[color_str]
-        elif color_str and str(color_str).startswith("#"):
-            try:
-                color = int(color_str[1:], 16)
-            except Exception:
-                color = config.BRAND["info"]
-        else:
-            color = config.BRAND["info"]
+        color = profile_color(snap, frame_style)
 
         # Titre avec cadre
         if frame_style:
@@ -253,7 +247,7 @@ class ProfileCog(commands.Cog):
         )
 
         # Bannière (image en haut)
-        banner_url = safe_row_get(row, "profile_banner")
+        banner_url = snap.profile_banner
         if banner_url:
             e.set_image(url=banner_url)
 
@@ -261,7 +255,7 @@ class ProfileCog(commands.Cog):
         e.set_thumbnail(url=user.display_avatar.url)
 
         # Bio
-        bio = safe_row_get(row, "profile_bio") or "*Aucune bio définie*"
+        bio = snap.profile_bio or "*Aucune bio définie*"
         e.description = f"📝 {bio}"
         
         # Afficher le cadre dans la description
@@ -269,11 +263,11 @@ class ProfileCog(commands.Cog):
             e.description = f"{frame_style['badge']}\n\n{e.description}"
 
         # Stats principales
-        balance = int(safe_row_get(row, "balance", 0))
-        rank = self._get_user_rank(user.id)
+        balance = snap.balance
+        rank = snap.rank
         rank_emoji = get_rank_emoji(rank)
         
-        xp = int(safe_row_get(row, "xp", 0))
+        xp = snap.xp
         cap = int(getattr(config, "XP_LEVEL_CAP", 100))
         level, xp_in_level, xp_needed = xp_progress(xp, cap=cap)
         
@@ -317,9 +311,9 @@ class ProfileCog(commands.Cog):
         )
 
         # Stats de jeu
-        games = int(safe_row_get(row, "games_played", 0))
-        wins = int(safe_row_get(row, "wins", 0))
-        losses = int(safe_row_get(row, "losses", 0))
+        games = snap.games_played
+        wins = snap.wins
+        losses = snap.losses
         winrate = calculate_winrate(wins, losses)
 
         e.add_field(
@@ -344,8 +338,8 @@ class ProfileCog(commands.Cog):
         )
 
         # Statuts VIP/Immunité
-        vip_until = parse_dt(safe_row_get(row, "vip_until"))
-        imm_until = parse_dt(safe_row_get(row, "immunity_until"))
+        vip_until = snap.vip_until
+        imm_until = snap.immunity_until
         now = now_utc()
 
         status_parts = []
@@ -364,17 +358,12 @@ class ProfileCog(commands.Cog):
             )
 
         # Date d'inscription
-        created = safe_row_get(row, "created_at")
-        if created:
-            try:
-                created_dt = datetime.fromisoformat(created)
-                e.add_field(
-                    name="📅 Inscrit le",
-                    value=f"<t:{int(created_dt.timestamp())}:D>",
-                    inline=True
-                )
-            except:
-                pass
+        if snap.created_at:
+            e.add_field(
+                name="📅 Inscrit le",
+                value=f"<t:{int(snap.created_at.timestamp())}:D>",
+                inline=True
+            )
 
         # Footer avec indication du cadre
         if frame_style:
@@ -391,18 +380,66 @@ class ProfileCog(commands.Cog):
     @app_commands.command(name="profile", description="Voir ton profil ou celui d'un autre joueur")
     async def profile(self, interaction: discord.Interaction, user: discord.Member | None = None):
         target = user or interaction.user
-        self.db.ensure_user(target.id, config.START_BALANCE)
-        row = self.db.get_user(target.id)
-        
-        if not row:
+        snap = await asyncio.to_thread(self.db.profile_snapshot, target.id, config.START_BALANCE)
+
+        if snap is None:
             return await interaction.response.send_message(
                 embed=embed_lose("❌ Profil", "Utilisateur non trouvé."),
                 ephemeral=True
             )
 
-        embed = self._build_profile_embed(target, row)
+        embed = self._build_profile_embed(target, snap)
         await interaction.response.send_message(embed=embed)
 
+    def _card_data(self, user: discord.User | discord.Member, snap: ProfileSnapshot) -> CardData:
+        frame_id = equipped_frame_id(snap)
+        frame_style = FRAME_STYLES.get(frame_id) if frame_id else None
+        frame_item = get_item(frame_id) if frame_id else None
+        cap = int(getattr(config, "XP_LEVEL_CAP", 100))
+        level, xp_in_level, xp_needed = xp_progress(snap.xp, cap=cap)
+        now = now_utc()
+        statuses = tuple(
+            label
+            for label, until in (("VIP", snap.vip_until), ("Immunité", snap.immunity_until))
+            if until and until > now
+        )
+        return CardData(
+            name=user.display_name,
+            title=title_for_level(level, cap=cap),
+            level=level,
+            cap=cap,
+            xp_in_level=xp_in_level,
+            xp_needed=xp_needed,
+            balance=snap.balance,
+            rank=snap.rank,
+            games=snap.games_played,
+            wins=snap.wins,
+            losses=snap.losses,
+            accent=profile_color(snap, frame_style),
+            frame_label=(frame_item.name if frame_item else frame_id) if frame_style else None,
+            frame_color=int(frame_style["embed_color"]) if frame_style else None,
+            statuses=statuses,
+            avatar_key=user.display_avatar.key,
+        )
+
+    @app_commands.command(name="profilecard", description="🖼️ Carte de profil en image")
+    @app_commands.describe(user="Utilisateur (optionnel)")
+    async def profilecard(self, interaction: discord.Interaction, user: discord.Member | None = None):
+        target = user or interaction.user
+        snap = await asyncio.to_thread(self.db.profile_snapshot, target.id, config.START_BALANCE)
+        if snap is None:
+            return await interaction.response.send_message(
+                embed=embed_lose("❌ Profil", "Utilisateur non trouvé."), ephemeral=True
+            )
+
+        await interaction.response.defer(thinking=True)
+        avatar = target.display_avatar.replace(size=256, format="png")
+        try:
+            png = await self.cards.render(self._card_data(target, snap), avatar.read)
+        except Exception as e:
+            return await interaction.followup.send(embed=embed_lose("❌ Carte", f"Rendu impossible: `{type(e).__name__}`"))
+        await interaction.followup.send(file=discord.File(io.BytesIO(png), filename="profile.png"))
+
     # ============================================
     # GROUPE DE COMMANDES SET
     # ============================================
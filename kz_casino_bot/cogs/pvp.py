@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
 import json
 import random
 import time
@@ -11,7 +12,8 @@ from discord import app_commands
 from discord.ext import commands
 
 from .. import config
-from ..db import Database
+from ..db import Database, Reason
+from ..metrics import METRICS
 from ..utils import embed_info, embed_lose, embed_neutral, embed_win, fmt
 from ..checks import enforce_blacklist
 
@@ -147,7 +149,7 @@ def _bj_format_hand(hand: list[str]) -> str:
     return " ".join(hand)
 
 
-@dataclass
+@dataclass(slots=True)
 class DuelSession:
     duel_type: str  # 'rps' | 'pvp' | 'bj'
     channel_id: int
@@ -156,7 +158,8 @@ class DuelSession:
     b_id: int
     bet: int
     created_ts: float
-    escrowed: bool = False
+    escrow_id: int | None = None  # ligne `escrows` (mises bloquées en base)
+    last_ts: float = 0.0  # dernière action d'un joueur (expiration sur inactivité)
 
     # RPS / PVP
     a_choice: str | None = None
@@ -202,15 +205,15 @@ class DuelRequestView(discord.ui.View):
         if self.session.duel_type == "rps":
             view = RPSDuelView(self.cog, self.session)
             e = embed_info("✋ RPS 1v1", f"{interaction.guild.get_member(self.session.a_id).mention if interaction.guild else '<@'+str(self.session.a_id)+'>'} vs <@{self.session.b_id}>\nMise: **{fmt(self.session.bet)} KZ**\n\nClique sur un bouton pour choisir (choix privés en éphémère).")
-            await channel.send(embed=e, view=view)
+            view.message = await channel.send(embed=e, view=view)
         elif self.session.duel_type == "pvp":
             view = QuickPVPView(self.cog, self.session)
             e = embed_info("⚔️ PvP", f"<@{self.session.a_id}> vs <@{self.session.b_id}>\nMise: **{fmt(self.session.bet)} KZ**\n\nChoisissez votre action (choix privés).")
-            await channel.send(embed=e, view=view)
+            view.message = await channel.send(embed=e, view=view)
         else:
             view = Blackjack1v1LobbyView(self.cog, self.session)
             e = embed_info("🎴 Blackjack 1v1", f"<@{self.session.a_id}> vs <@{self.session.b_id}>\nMise: **{fmt(self.session.bet)} KZ**\n\nChaque joueur joue en privé (éphémère). Cliquez sur **Jouer**.")
-            await channel.send(embed=e, view=view)
+            view.message = await channel.send(embed=e, view=view)
 
         # Ack privately
         await interaction.followup.send("✅ Duel lancé !", ephemeral=True)
@@ -228,7 +231,6 @@ class DuelRequestView(discord.ui.View):
         if not self._is_target(interaction):
             return await interaction.response.send_message("❌ Seul le joueur défié peut refuser.", ephemeral=True)
         await interaction.response.send_message("✅ Duel refusé.", ephemeral=True)
-        self.cog._cancel_session(self.session, refund=False)
         for child in self.children:
             child.disabled = True
         try:
@@ -242,13 +244,20 @@ class RPSDuelView(discord.ui.View):
         super().__init__(timeout=_tunable_int(cog.db, "pvp_timeout", 60))
         self.cog = cog
         self.session = session
+        self.message: discord.Message | None = None
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if interaction.user.id not in (self.session.a_id, self.session.b_id):
             await interaction.response.send_message("❌ Ce duel ne te concerne pas.", ephemeral=True)
             return False
+        self.session.last_ts = time.time()
         return True
 
+    async def on_timeout(self):
+        for child in self.children:
+            child.disabled = True
+        await self.cog._expire_session(self.session, self.message, self.timeout or 0, self)
+
     async def _pick(self, interaction: discord.Interaction, choice: str):
         await interaction.response.defer(ephemeral=True)
         if interaction.user.id == self.session.a_id:
@@ -270,8 +279,8 @@ class RPSDuelView(discord.ui.View):
 
         if res == 0:
             # tie => refund
-            self.cog.db.add_balance(sess.a_id, sess.bet)
-            self.cog.db.add_balance(sess.b_id, sess.bet)
+            if not await self.cog._close_session(sess, [(sess.a_id, sess.bet), (sess.b_id, sess.bet)], refund=True):
+                return
             self.cog.db.add_pvp_stats(sess.a_id, games_delta=1)
             self.cog.db.add_pvp_stats(sess.b_id, games_delta=1)
             e = embed_neutral("✋ RPS 1v1 — Égalité", f"<@{sess.a_id}> a joué **{sess.a_choice}**\n<@{sess.b_id}> a joué **{sess.b_choice}**\n\nÉgalité → remboursement.")
@@ -279,7 +288,8 @@ class RPSDuelView(discord.ui.View):
             winner = sess.a_id if res == 1 else sess.b_id
             loser = sess.b_id if res == 1 else sess.a_id
             gain, tax_amount = _apply_tax(pot, tax)
-            self.cog.db.add_balance(winner, gain)
+            if not await self.cog._close_session(sess, [(winner, gain)]):
+                return
             # stats
             self.cog.db.add_pvp_stats(winner, games_delta=1, wins_delta=1, profit_delta=gain - sess.bet)
             self.cog.db.add_pvp_stats(loser, games_delta=1, losses_delta=1, profit_delta=-sess.bet)
@@ -295,7 +305,6 @@ class RPSDuelView(discord.ui.View):
             await interaction.message.edit(view=self)
         except Exception:
             pass
-        self.cog._forget_session(sess)
         await interaction.channel.send(embed=e)
 
     @discord.ui.button(label="🪨 Pierre", style=discord.ButtonStyle.secondary)
@@ -318,13 +327,20 @@ class QuickPVPView(discord.ui.View):
         super().__init__(timeout=_tunable_int(cog.db, "pvp_timeout", 60))
         self.cog = cog
         self.session = session
+        self.message: discord.Message | None = None
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if interaction.user.id not in (self.session.a_id, self.session.b_id):
             await interaction.response.send_message("❌ Ce duel ne te concerne pas.", ephemeral=True)
             return False
+        self.session.last_ts = time.time()
         return True
 
+    async def on_timeout(self):
+        for child in self.children:
+            child.disabled = True
+        await self.cog._expire_session(self.session, self.message, self.timeout or 0, self)
+
     async def _pick(self, interaction: discord.Interaction, choice: str):
         await interaction.response.defer(ephemeral=True)
         if interaction.user.id == self.session.a_id:
@@ -352,8 +368,8 @@ class QuickPVPView(discord.ui.View):
         pot = sess.bet * 2
 
         if res == 0:
-            self.cog.db.add_balance(sess.a_id, sess.bet)
-            self.cog.db.add_balance(sess.b_id, sess.bet)
+            if not await self.cog._close_session(sess, [(sess.a_id, sess.bet), (sess.b_id, sess.bet)], refund=True):
+                return
             self.cog.db.add_pvp_stats(sess.a_id, games_delta=1)
             self.cog.db.add_pvp_stats(sess.b_id, games_delta=1)
             e = embed_neutral("⚔️ PvP — Égalité", f"<@{sess.a_id}>: **{a}**\n<@{sess.b_id}>: **{b}**\n\nÉgalité → remboursement.")
@@ -361,7 +377,8 @@ class QuickPVPView(discord.ui.View):
             winner = sess.a_id if res == 1 else sess.b_id
             loser = sess.b_id if res == 1 else sess.a_id
             gain, tax_amount = _apply_tax(pot, tax)
-            self.cog.db.add_balance(winner, gain)
+            if not await self.cog._close_session(sess, [(winner, gain)]):
+                return
             self.cog.db.add_pvp_stats(winner, games_delta=1, wins_delta=1, profit_delta=gain - sess.bet)
             self.cog.db.add_pvp_stats(loser, games_delta=1, losses_delta=1, profit_delta=-sess.bet)
             e = embed_win("⚔️ PvP", f"<@{sess.a_id}>: **{a}**\n<@{sess.b_id}>: **{b}**\n\n🏆 Gagnant: <@{winner}>\nGain: **{fmt(gain)} KZ** (taxe {tax}% = {fmt(tax_amount)} KZ)")
@@ -375,7 +392,6 @@ class QuickPVPView(discord.ui.View):
             await interaction.message.edit(view=self)
         except Exception:
             pass
-        self.cog._forget_session(sess)
         await interaction.channel.send(embed=e)
 
     @discord.ui.button(label="⚔️ Attaque", style=discord.ButtonStyle.secondary)
@@ -396,13 +412,20 @@ class Blackjack1v1LobbyView(discord.ui.View):
         super().__init__(timeout=_tunable_int(cog.db, "pvp_timeout", 60))
         self.cog = cog
         self.session = session
+        self.message: discord.Message | None = None
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if interaction.user.id not in (self.session.a_id, self.session.b_id):
             await interaction.response.send_message("❌ Ce duel ne te concerne pas.", ephemeral=True)
             return False
+        self.session.last_ts = time.time()
         return True
 
+    async def on_timeout(self):
+        for child in self.children:
+            child.disabled = True
+        await self.cog._expire_session(self.session, self.message, self.timeout or 0, self)
+
     @discord.ui.button(label="🎴 Jouer", style=discord.ButtonStyle.primary)
     async def play(self, interaction: discord.Interaction, _: discord.ui.Button):
         await interaction.response.defer(ephemeral=True)
@@ -418,6 +441,13 @@ class BlackjackPrivateView(discord.ui.View):
         self.session = session
         self.player_id = player_id
 
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        self.session.last_ts = time.time()
+        return True
+
+    async def on_timeout(self):
+        await self.cog._expire_session(self.session, None, self.timeout or 0)
+
     def _get_hand(self) -> list[str]:
         if self.player_id == self.session.a_id:
             return self.session.a_hand or []
@@ -483,8 +513,27 @@ class PVPCog(commands.Cog):
     def __init__(self, bot: commands.Bot, db: Database):
         self.bot = bot
         self.db = db
-        # active sessions in memory: key = (type, a_id, b_id, created_ts)
-        self.sessions: dict[str, DuelSession] = {}
+        # Sessions actives (mises en escrow): par escrow_id, et index joueur -> session
+        self.sessions: dict[int, DuelSession] = {}
+        self._by_user: dict[int, DuelSession] = {}
+
+    def _active_duels(self) -> dict:
+        counts: dict = {}
+        for s in self.sessions.values():
+            key = (("game", f"duel_{s.duel_type}"),)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    async def cog_load(self):
+        METRICS.gauge("kz_active_games", self._active_duels)
+        # Aucune session ne survit à un redémarrage: les escrows encore HELD de nos shards
+        # sont orphelins (ceux des autres process correspondent à des duels en cours)
+        refunded = await asyncio.to_thread(self.db.escrow_recover, config.SHARD_IDS)
+        if refunded:
+            print(f"↩️ PvP: {len(refunded)} duel(s) interrompu(s) remboursé(s)")
+
+    async def cog_unload(self):
+        METRICS.remove_gauge("kz_active_games", self._active_duels)
 
     async def cog_app_command_invoke(self, interaction: discord.Interaction):
         allowed = await enforce_blacklist(self.db, interaction)
@@ -492,31 +541,58 @@ class PVPCog(commands.Cog):
             raise app_commands.CheckFailure("Blacklisted")
 
     # ---------- internal helpers ----------
-    def _session_key(self, s: DuelSession) -> str:
-        return f"{s.duel_type}:{s.a_id}:{s.b_id}:{int(s.created_ts)}"
+    def in_duel(self, user_id: int) -> bool:
+        return user_id in self._by_user
 
     def _forget_session(self, s: DuelSession) -> None:
-        self.sessions.pop(self._session_key(s), None)
-
-    def _cancel_session(self, s: DuelSession, refund: bool = True) -> None:
-        if refund and s.escrowed:
-            self.db.add_balance(s.a_id, s.bet)
-            self.db.add_balance(s.b_id, s.bet)
+        if s.escrow_id is not None:
+            self.sessions.pop(s.escrow_id, None)
+        for uid in (s.a_id, s.b_id):
+            if self._by_user.get(uid) is s:
+                del self._by_user[uid]
+
+    async def _close_session(self, s: DuelSession, payouts: list[tuple[int, int]], refund: bool = False) -> bool:
+        """Verse les gains/remboursements et clôt l'escrow. False si déjà clos (ex: expiré)."""
+        if s.escrow_id is None:
+            return False
         self._forget_session(s)
+        return await asyncio.to_thread(self.db.escrow_close, s.escrow_id, payouts, refund)
+
+    async def _expire_session(
+        self, s: DuelSession, message: discord.Message | None, timeout: float, view: discord.ui.View | None = None
+    ) -> None:
+        """Rembourse une session inactive depuis `timeout` secondes (appelé par les on_timeout)."""
+        if self.sessions.get(s.escrow_id or 0) is not s:
+            return
+        if time.time() - s.last_ts < timeout - 1:
+            # un joueur est encore actif (ex: main de blackjack en cours)
+            return
+        if not await self._close_session(s, [(s.a_id, s.bet), (s.b_id, s.bet)], refund=True):
+            return
+        if message is not None:
+            try:
+                await message.edit(
+                    embed=embed_neutral("⏱️ Duel expiré", f"<@{s.a_id}> vs <@{s.b_id}>\nMises remboursées (**{fmt(s.bet)} KZ** chacun)."),
+                    view=view,
+                )
+            except Exception:
+                pass
 
     def _start_session(self, s: DuelSession) -> tuple[bool, str]:
         # Ensure users and take escrow
+        if s.escrow_id is not None:
+            return False, "❌ Duel déjà lancé."
+        if self.in_duel(s.a_id) or self.in_duel(s.b_id):
+            return False, "❌ Un des joueurs est déjà en duel."
         self.db.ensure_user(s.a_id, config.START_BALANCE)
         self.db.ensure_user(s.b_id, config.START_BALANCE)
-        a_bal = int(self.db.get_user(s.a_id)["balance"])
-        b_bal = int(self.db.get_user(s.b_id)["balance"])
-        if a_bal < s.bet:
-            return False, "❌ Le challenger n'a pas assez de KZ."
-        if b_bal < s.bet:
+        escrow_id, short = self.db.escrow_open(s.duel_type, s.guild_id, s.channel_id, s.a_id, s.b_id, s.bet)
+        if escrow_id is None:
+            if short == s.a_id:
+                return False, "❌ Le challenger n'a pas assez de KZ."
             return False, "❌ Le joueur défié n'a pas assez de KZ."
-        self.db.add_balance(s.a_id, -s.bet)
-        self.db.add_balance(s.b_id, -s.bet)
-        s.escrowed = True
+        s.escrow_id = escrow_id
+        s.last_ts = time.time()
 
         if s.duel_type == "bj":
             s.rng_seed = int(time.time())
@@ -524,7 +600,9 @@ class PVPCog(commands.Cog):
             s.a_hand = [_bj_draw(rng), _bj_draw(rng)]
             s.b_hand = [_bj_draw(rng), _bj_draw(rng)]
 
-        self.sessions[self._session_key(s)] = s
+        self.sessions[escrow_id] = s
+        self._by_user[s.a_id] = s
+        self._by_user[s.b_id] = s
         return True, "ok"
 
     async def _resolve_blackjack(self, interaction: discord.Interaction, s: DuelSession):
@@ -538,8 +616,8 @@ class PVPCog(commands.Cog):
 
         if (a_bust and b_bust) or (a_v == b_v):
             # tie
-            self.db.add_balance(s.a_id, s.bet)
-            self.db.add_balance(s.b_id, s.bet)
+            if not await self._close_session(s, [(s.a_id, s.bet), (s.b_id, s.bet)], refund=True):
+                return
             self.db.add_pvp_stats(s.a_id, games_delta=1)
             self.db.add_pvp_stats(s.b_id, games_delta=1)
             e = embed_neutral(
@@ -556,7 +634,8 @@ class PVPCog(commands.Cog):
             winner = s.a_id if score(a_v) > score(b_v) else s.b_id
             loser = s.b_id if winner == s.a_id else s.a_id
             gain, tax_amount = _apply_tax(pot, tax)
-            self.db.add_balance(winner, gain)
+            if not await self._close_session(s, [(winner, gain)]):
+                return
             self.db.add_pvp_stats(winner, games_delta=1, wins_delta=1, profit_delta=gain - s.bet)
             self.db.add_pvp_stats(loser, games_delta=1, losses_delta=1, profit_delta=-s.bet)
             e = embed_win(
@@ -566,7 +645,6 @@ class PVPCog(commands.Cog):
                 f"🏆 Gagnant: <@{winner}>\nGain: **{fmt(gain)} KZ** (taxe {tax}% = {fmt(tax_amount)} KZ)",
             )
 
-        self._forget_session(s)
         try:
             await interaction.channel.send(embed=e)
         except Exception:
@@ -594,7 +672,7 @@ class PVPCog(commands.Cog):
             if bet > bal:
                 return await interaction.followup.send("❌ Solde insuffisant.", ephemeral=True)
             # escrow: on retire la mise
-            self.db.add_balance(interaction.user.id, -bet)
+            self.db.add_balance(interaction.user.id, -bet, reason=Reason.PVP_STAKE)
 
             chance = _tunable_int(self.db, "bot_win_chance", 99)
             bot_won = (random.randint(1, 100) <= int(chance))
@@ -609,7 +687,7 @@ class PVPCog(commands.Cog):
                 kept = int(bet * int(penalty_pct) / 100)
                 refund = max(0, bet - kept)
                 if refund:
-                    self.db.add_balance(interaction.user.id, refund)
+                    self.db.add_balance(interaction.user.id, refund, reason=Reason.PVP_REFUND)
                 self.db.add_bot_stats(interaction.user.id, bot_win=True)
                 # on compte ça comme une win PvP (mais profit négatif car le joueur perd quand même)
                 self.db.add_pvp_stats(interaction.user.id, games_delta=1, wins_delta=1, profit_delta=-kept)
@@ -621,6 +699,8 @@ class PVPCog(commands.Cog):
                 pass
             return
 
+        if self.in_duel(interaction.user.id) or self.in_duel(adversaire.id):
+            return await interaction.response.send_message(embed=embed_lose("❌ Duel", "Un des joueurs est déjà en duel."), ephemeral=True)
         s = DuelSession("rps", interaction.channel_id, interaction.guild_id or 0, interaction.user.id, adversaire.id, int(mise), time.time())
         view = DuelRequestView(self, s)
         e = embed_info("✋ RPS 1v1", f"<@{s.a_id}> défie {adversaire.mention}\nMise: **{fmt(s.bet)} KZ**\n\n{adversaire.mention} : clique sur **Accepter** ou **Refuser**.")
@@ -646,7 +726,7 @@ class PVPCog(commands.Cog):
             if bet > bal:
                 return await interaction.followup.send("❌ Solde insuffisant.", ephemeral=True)
             # escrow: on retire la mise
-            self.db.add_balance(interaction.user.id, -bet)
+            self.db.add_balance(interaction.user.id, -bet, reason=Reason.PVP_STAKE)
 
             chance = _tunable_int(self.db, "bot_win_chance", 99)
             bot_won = (random.randint(1, 100) <= int(chance))
@@ -661,7 +741,7 @@ class PVPCog(commands.Cog):
                 kept = int(bet * int(penalty_pct) / 100)
                 refund = max(0, bet - kept)
                 if refund:
-                    self.db.add_balance(interaction.user.id, refund)
+                    self.db.add_balance(interaction.user.id, refund, reason=Reason.PVP_REFUND)
                 self.db.add_bot_stats(interaction.user.id, bot_win=True)
                 # on compte ça comme une win PvP (mais profit négatif car le joueur perd quand même)
                 self.db.add_pvp_stats(interaction.user.id, games_delta=1, wins_delta=1, profit_delta=-kept)
@@ -672,6 +752,8 @@ class PVPCog(commands.Cog):
             except Exception:
                 pass
             return
+        if self.in_duel(interaction.user.id) or self.in_duel(adversaire.id):
+            return await interaction.response.send_message(embed=embed_lose("❌ Duel", "Un des joueurs est déjà en duel."), ephemeral=True)
         s = DuelSession("pvp", interaction.channel_id, interaction.guild_id or 0, interaction.user.id, adversaire.id, int(mise), time.time())
         view = DuelRequestView(self, s)
         e = embed_info("⚔️ PvP", f"<@{s.a_id}> défie {adversaire.mention}\nMise: **{fmt(s.bet)} KZ**\n\n{adversaire.mention} : clique sur **Accepter** ou **Refuser**.")
@@ -697,7 +779,7 @@ class PVPCog(commands.Cog):
             if bet > bal:
                 return await interaction.followup.send("❌ Solde insuffisant.", ephemeral=True)
             # escrow: on retire la mise
-            self.db.add_balance(interaction.user.id, -bet)
+            self.db.add_balance(interaction.user.id, -bet, reason=Reason.PVP_STAKE)
 
             chance = _tunable_int(self.db, "bot_win_chance", 99)
             bot_won = (random.randint(1, 100) <= int(chance))
@@ -712,7 +794,7 @@ class PVPCog(commands.Cog):
                 kept = int(bet * int(penalty_pct) / 100)
                 refund = max(0, bet - kept)
                 if refund:
-                    self.db.add_balance(interaction.user.id, refund)
+                    self.db.add_balance(interaction.user.id, refund, reason=Reason.PVP_REFUND)
                 self.db.add_bot_stats(interaction.user.id, bot_win=True)
                 # on compte ça comme une win PvP (mais profit négatif car le joueur perd quand même)
                 self.db.add_pvp_stats(interaction.user.id, games_delta=1, wins_delta=1, profit_delta=-kept)
@@ -723,6 +805,8 @@ class PVPCog(commands.Cog):
             except Exception:
                 pass
             return
+        if self.in_duel(interaction.user.id) or self.in_duel(adversaire.id):
+            return await interaction.response.send_message(embed=embed_lose("❌ Duel", "Un des joueurs est déjà en duel."), ephemeral=True)
         s = DuelSession("bj", interaction.channel_id, interaction.guild_id or 0, interaction.user.id, adversaire.id, int(mise), time.time())
         view = DuelRequestView(self, s)
         e = embed_info("🎴 Blackjack 1v1", f"<@{s.a_id}> défie {adversaire.mention}\nMise: **{fmt(s.bet)} KZ**\n\n{adversaire.mention} : clique sur **Accepter** ou **Refuser**.")
@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from datetime import datetime, timedelta, timezone
+import asyncio
+from datetime import datetime, timezone
 
 import discord
 from discord import app_commands
@@ -9,7 +10,9 @@ from discord.ext import commands
 
 from .. import config
 from ..db import Database
-from ..shop_data import ShopItem, get_item, items_by_category, DEFAULT_ITEMS
+from ..embed_cache import EMBEDS
+from ..effects import get_effect
+from ..shop_data import ShopItem, catalog, get_item, items_by_category, load_catalog
 from ..utils import embed_info, embed_lose, embed_neutral, embed_win, fmt
 from ..checks import enforce_blacklist
 
@@ -20,6 +23,11 @@ def _rarity_tag(it: ShopItem) -> str:
 
 
 def _category_embed(category: str, selected: ShopItem | None, page: int, pages: int) -> discord.Embed:
+    key = ("shop", catalog().version, category, selected.item_id if selected else None, page, pages)
+    return EMBEDS.embed(key, lambda: _build_category_embed(category, selected, page, pages))
+
+
+def _build_category_embed(category: str, selected: ShopItem | None, page: int, pages: int) -> discord.Embed:
     if selected:
         r = config.RARITY_INFO.get(selected.rarity, {"emoji": "⚪", "color": config.BRAND["info"]})
         e = discord.Embed(
@@ -39,7 +47,7 @@ def _category_embed(category: str, selected: ShopItem | None, page: int, pages:
             preview = "\n".join([f"• **{it.name}** — {fmt(it.price)} KZ" for it in items[:8]])
             e.add_field(name="📦 Aperçu", value=preview, inline=False)
 
-    e.set_footer(text=f"{config.BRAND['name']} • Page {page+1}/{max(1,pages)} • Acheter x1/x5")
+    e.set_footer(text=f"{config.BRAND['name']} • Page {page+1}/{max(1,pages)} • Acheter x1/x5/x25")
     return e
 
 
@@ -55,7 +63,7 @@ class CategorySelect(discord.ui.Select):
             placeholder="📂 Choisir une catégorie…",
             min_values=1,
             max_values=1,
-            options=[discord.SelectOption(label=c, value=c) for c in config.SHOP_CATEGORIES],
+            options=EMBEDS.options(("shop_categories",), lambda: [discord.SelectOption(label=c, value=c) for c in config.SHOP_CATEGORIES]),
             row=0,
         )
 
@@ -74,20 +82,8 @@ class CategorySelect(discord.ui.Select):
 class ItemSelect(discord.ui.Select):
     def __init__(self, view: "ShopView"):
         self.shop_view = view
-        items = self.shop_view.page_items()
-
-        options: list[discord.SelectOption] = []
-        for it in items[:25]:
-            options.append(
-                discord.SelectOption(
-                    label=it.name[:100],
-                    value=it.item_id,
-                    description=f"{fmt(it.price)} KZ • {_rarity_tag(it)}"[:100],
-                )
-            )
-
-        if not options:
-            options = [discord.SelectOption(label="Aucun item", value="none")]
+        key = ("shop_items", catalog().version, view.category, view.page, view.per_page)
+        options = EMBEDS.options(key, self._build_options)
 
         super().__init__(
             placeholder="🧾 Choisir un item…",
@@ -98,6 +94,17 @@ class ItemSelect(discord.ui.Select):
             row=1,
         )
 
+    def _build_options(self) -> list[discord.SelectOption]:
+        options = [
+            discord.SelectOption(
+                label=it.name[:100],
+                value=it.item_id,
+                description=f"{fmt(it.price)} KZ • {_rarity_tag(it)}"[:100],
+            )
+            for it in self.shop_view.page_items()[:25]
+        ]
+        return options or [discord.SelectOption(label="Aucun item", value="none")]
+
     async def callback(self, interaction: discord.Interaction):
         val = self.values[0]
         if val == "none":
@@ -184,28 +191,20 @@ class ShopView(discord.ui.View):
         if not self.item_id:
             return await interaction.response.send_message("Choisis d'abord un item.", ephemeral=True)
 
-        self.db.ensure_user(interaction.user.id, config.START_BALANCE)
         it = get_item(self.item_id)
         if not it:
             return await interaction.response.send_message("Item introuvable.", ephemeral=True)
 
-        row = self.db.get_user(interaction.user.id)
-        bal = int(row["balance"])
-        total = int(it.price) * int(qty)
-
-        if total > bal:
+        res = await asyncio.to_thread(
+            self.db.buy_item, interaction.user.id, it.item_id, qty, it.price, config.START_BALANCE
+        )
+        if res["insufficient"]:
             return await interaction.response.send_message("❌ Solde insuffisant.", ephemeral=True)
 
-        inv = self.db.get_inventory(interaction.user.id)
-        inv[it.item_id] = int(inv.get(it.item_id, 0)) + int(qty)
-        self.db.set_inventory(interaction.user.id, inv)
-        self.db.add_balance(interaction.user.id, -total)
-        new_bal = int(self.db.get_user(interaction.user.id)["balance"])
-
         e = embed_win("✅ Achat", f"Tu as acheté **{it.name}** (`{it.item_id}`) × **{qty}**.")
         e.add_field(name="Prix unitaire", value=f"{fmt(it.price)} KZ", inline=True)
-        e.add_field(name="💰 Total", value=f"{fmt(total)} KZ", inline=True)
-        e.add_field(name="🏦 Solde", value=f"{fmt(new_bal)} KZ", inline=True)
+        e.add_field(name="💰 Total", value=f"{fmt(res['total'])} KZ", inline=True)
+        e.add_field(name="🏦 Solde", value=f"{fmt(res['balance'])} KZ", inline=True)
         await interaction.response.send_message(embed=e, ephemeral=True)
 
     @discord.ui.button(label="🛒 Acheter x1", style=discord.ButtonStyle.success, row=2)
@@ -216,6 +215,10 @@ class ShopView(discord.ui.View):
     async def buy_x5(self, interaction: discord.Interaction, button: discord.ui.Button):
         await self._buy(interaction, 5)
 
+    @discord.ui.button(label="🛒 x25", style=discord.ButtonStyle.success, row=2)
+    async def buy_x25(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._buy(interaction, 25)
+
     @discord.ui.button(label="🎒 Inventaire", style=discord.ButtonStyle.primary, row=2)
     async def inv_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
         self.db.ensure_user(interaction.user.id, config.START_BALANCE)
@@ -244,37 +247,41 @@ class ShopView(discord.ui.View):
 # ============================================
 
 async def item_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
-    """Autocomplete pour les IDs d'items du shop."""
-    choices = []
-    current_lower = current.lower()
-    for it in DEFAULT_ITEMS:
-        if current_lower in it.item_id.lower() or current_lower in it.name.lower():
-            choices.append(app_commands.Choice(name=f"{it.name} ({it.item_id})", value=it.item_id))
-        if len(choices) >= 25:
-            break
-    return choices
+    """Autocomplete pour les IDs d'items du shop (index du catalogue, sans DB)."""
+    return [app_commands.Choice(name=f"{it.name} ({it.item_id})", value=it.item_id) for it in catalog().search(current, 25)]
+
+
+# Délai max de lecture de l'inventaire (Discord coupe l'autocomplete à 3 s)
+INVENTORY_AC_TIMEOUT_S = 1.5
 
 
 async def inventory_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
     """Autocomplete pour les items de l'inventaire de l'utilisateur."""
-    choices = []
-    try:
-        bot: commands.Bot = interaction.client  # type: ignore
-        db: Database = bot.db  # type: ignore
-        inv = db.get_inventory(interaction.user.id)
-        current_lower = current.lower()
-        for item_id, qty in inv.items():
-            if int(qty) <= 0:
-                continue
-            it = get_item(item_id)
-            name = it.name if it else item_id
-            if current_lower in item_id.lower() or current_lower in name.lower():
-                choices.append(app_commands.Choice(name=f"{name} x{qty}", value=item_id))
-            if len(choices) >= 25:
-                break
-    except Exception:
-        pass
-    return choices
+    bot: commands.Bot = interaction.client  # type: ignore
+    db: Database = bot.db  # type: ignore
+    inv = db.inventory_cached(interaction.user.id)
+    if inv is None:
+        try:
+            inv = await asyncio.wait_for(
+                asyncio.to_thread(db.get_inventory, interaction.user.id), INVENTORY_AC_TIMEOUT_S
+            )
+        except Exception:
+            return []
+    owned = {item_id: int(qty) for item_id, qty in inv.items() if int(qty) > 0}
+    cat = catalog()
+    known = [i for i, it in enumerate(cat.items) if it.item_id in owned]
+    choices = [
+        app_commands.Choice(name=f"{cat.items[i].name} x{owned[cat.items[i].item_id]}", value=cat.items[i].item_id)
+        for i in cat.rank(current, known)
+    ]
+    # items retirés du catalogue: recherche simple sur l'id
+    q = current.lower()
+    choices += [
+        app_commands.Choice(name=f"{item_id} x{qty}", value=item_id)
+        for item_id, qty in owned.items()
+        if item_id not in cat.by_id and q in item_id.lower()
+    ]
+    return choices[:25]
 
 
 # ============================================
@@ -285,6 +292,36 @@ class ShopCog(commands.Cog):
     def __init__(self, bot: commands.Bot, db: Database):
         self.bot = bot
         self.db = db
+        self._reload_lock = asyncio.Lock()
+        self._reload_task: asyncio.Task | None = None
+
+    async def cog_load(self):
+        await self.reload_catalog()
+        self.db.subscribe("catalog", self._on_catalog_change)
+
+    async def cog_unload(self):
+        self.db.unsubscribe("catalog", self._on_catalog_change)
+
+    def _on_catalog_change(self, key: str | None) -> None:
+        # Appelé depuis un thread DB, parfois avant le commit: /catalog recharge aussi après coup
+        self.bot.loop.call_soon_threadsafe(self._schedule_reload)
+
+    def _schedule_reload(self) -> None:
+        self._reload_task = asyncio.create_task(self.reload_catalog())
+
+    async def reload_catalog(self) -> int:
+        """Recharge la version active (sérialisé: le dernier chargement lancé gagne). Retourne la version en service."""
+        async with self._reload_lock:
+            before = catalog().version
+            try:
+                cat = await asyncio.to_thread(load_catalog, self.db)
+            except Exception as e:
+                print(f"⚠️ Catalogue du shop: {type(e).__name__}: {e} (version {before} conservée)")
+                return before
+            if cat.version != before:
+                EMBEDS.invalidate()
+                print(f"🛒 Catalogue du shop: version {cat.version} ({len(cat.items)} items)")
+            return cat.version
 
     async def cog_app_command_invoke(self, interaction: discord.Interaction):
         allowed = await enforce_blacklist(self.db, interaction)
@@ -352,42 +389,30 @@ class ShopCog(commands.Cog):
     @app_commands.command(name="buy", description="🛒 Acheter un item directement")
     @app_commands.describe(item="ID de l'item à acheter", quantity="Quantité (défaut: 1)")
     @app_commands.autocomplete(item=item_autocomplete)
-    async def buy(self, interaction: discord.Interaction, item: str, quantity: app_commands.Range[int, 1, 100] = 1):
-        self.db.ensure_user(interaction.user.id, config.START_BALANCE)
-        
-        it = get_item(item)
-        if not it:
-            # Chercher par nom partiel
-            item_lower = item.lower()
-            for shop_item in DEFAULT_ITEMS:
-                if item_lower in shop_item.item_id.lower() or item_lower in shop_item.name.lower():
-                    it = shop_item
-                    break
-        
+    async def buy(
+        self, interaction: discord.Interaction, item: str, quantity: app_commands.Range[int, 1, config.SHOP_MAX_QTY] = 1
+    ):
+        # id exact, sinon nom partiel / sans accents
+        it = catalog().find(item)
+
         if not it:
             e = embed_lose("❌ Item introuvable", f"L'item `{item}` n'existe pas.\n\nUtilise `/shop` pour voir les items disponibles.")
             return await interaction.response.send_message(embed=e, ephemeral=True)
 
-        row = self.db.get_user(interaction.user.id)
-        bal = int(row["balance"])
-        total = it.price * quantity
-
-        if total > bal:
-            e = embed_lose("❌ Solde insuffisant", f"Tu as besoin de **{fmt(total)}** KZ mais tu n'as que **{fmt(bal)}** KZ.")
+        # débit, inventaire et ledger en une transaction, quelle que soit la quantité
+        res = await asyncio.to_thread(
+            self.db.buy_item, interaction.user.id, it.item_id, quantity, it.price, config.START_BALANCE
+        )
+        if res["insufficient"]:
+            total = it.price * quantity
+            e = embed_lose("❌ Solde insuffisant", f"Tu as besoin de **{fmt(total)}** KZ mais tu n'as que **{fmt(res['balance'])}** KZ.")
             return await interaction.response.send_message(embed=e, ephemeral=True)
 
-        # Effectuer l'achat
-        inv = self.db.get_inventory(interaction.user.id)
-        inv[it.item_id] = int(inv.get(it.item_id, 0)) + quantity
-        self.db.set_inventory(interaction.user.id, inv)
-        self.db.add_balance(interaction.user.id, -total)
-        new_bal = int(self.db.get_user(interaction.user.id)["balance"])
-
         e = embed_win("✅ Achat réussi", f"Tu as acheté **{it.name}** × **{quantity}**")
         e.add_field(name="💳 Prix unitaire", value=f"{fmt(it.price)} KZ", inline=True)
-        e.add_field(name="💰 Total payé", value=f"{fmt(total)} KZ", inline=True)
-        e.add_field(name="🏦 Nouveau solde", value=f"{fmt(new_bal)} KZ", inline=True)
-        e.add_field(name="📦 En inventaire", value=f"{inv[it.item_id]}× {it.name}", inline=False)
+        e.add_field(name="💰 Total payé", value=f"{fmt(res['total'])} KZ", inline=True)
+        e.add_field(name="🏦 Nouveau solde", value=f"{fmt(res['balance'])} KZ", inline=True)
+        e.add_field(name="📦 En inventaire", value=f"{res['owned']}× {it.name}", inline=False)
         e.set_footer(text=f"Utilise /use {it.item_id} pour l'utiliser")
         await interaction.response.send_message(embed=e, ephemeral=True)
 
@@ -395,9 +420,11 @@ class ShopCog(commands.Cog):
     # /use - Utiliser un item
     # ============================================
     @app_commands.command(name="use", description="✨ Utiliser un item de ton inventaire")
-    @app_commands.describe(item="ID de l'item à utiliser")
+    @app_commands.describe(item="ID de l'item à utiliser", quantity="Nombre d'exemplaires (les durées s'additionnent)")
     @app_commands.autocomplete(item=inventory_autocomplete)
-    async def use(self, interaction: discord.Interaction, item: str):
+    async def use(
+        self, interaction: discord.Interaction, item: str, quantity: app_commands.Range[int, 1, config.SHOP_MAX_QTY] = 1
+    ):
         self.db.ensure_user(interaction.user.id, config.START_BALANCE)
         
         inv = self.db.get_inventory(interaction.user.id)
@@ -406,6 +433,9 @@ class ShopCog(commands.Cog):
         if qty <= 0:
             e = embed_lose("❌ Item non possédé", f"Tu ne possèdes pas l'item `{item}`.\n\nUtilise `/inventory` pour voir tes items.")
             return await interaction.response.send_message(embed=e, ephemeral=True)
+        if qty < quantity:
+            e = embed_lose("❌ Pas assez d'exemplaires", f"Tu n'as que **{qty}× `{item}`**.")
+            return await interaction.response.send_message(embed=e, ephemeral=True)
 
         it = get_item(item)
         if not it:
@@ -427,102 +457,23 @@ class ShopCog(commands.Cog):
             e = embed_neutral("ℹ️ Item cosmétique", f"**{it.name}** est un item cosmétique et ne peut pas être \"utilisé\".\n\nIl s'affiche automatiquement sur ton profil.")
             return await interaction.response.send_message(embed=e, ephemeral=True)
 
-        # Appliquer l'effet selon le type
-        now = datetime.now(timezone.utc)
-        effect_key = it.effect_key
-        duration = it.duration_minutes or 0
-
-        # ==== IMMUNITY (Boucliers) ====
-        if effect_key == "immunity":
-            row = self.db.get_user(interaction.user.id)
-            current_imm = None
-            if row and row["immunity_until"]:
-                try:
-                    current_imm = datetime.fromisoformat(row["immunity_until"])
-                except:
-                    pass
-            
-            base = current_imm if (current_imm and current_imm > now) else now
-            new_until = base + timedelta(minutes=duration)
-            self.db.set_user_field(interaction.user.id, "immunity_until", new_until.isoformat())
-            
-            # Retirer l'item
-            self.db.remove_item(interaction.user.id, item, 1)
-            
-            e = embed_win("🛡️ Bouclier activé !", f"Tu es protégé contre le vol pendant **{duration} minutes**.")
-            e.add_field(name="⏰ Expire", value=f"<t:{int(new_until.timestamp())}:R>", inline=True)
-            e.add_field(name="📦 Restant", value=f"{qty - 1}× {it.name}", inline=True)
+        handler = get_effect(it.effect_key)
+        if handler is None:
+            e = embed_neutral("❓ Effet inconnu", f"L'item `{it.name}` a un effet non reconnu: `{it.effect_key}`")
             return await interaction.response.send_message(embed=e, ephemeral=True)
 
-        # ==== VIP ====
-        if effect_key == "vip":
-            row = self.db.get_user(interaction.user.id)
-            current_vip = None
-            if row and row["vip_until"]:
-                try:
-                    current_vip = datetime.fromisoformat(row["vip_until"])
-                except:
-                    pass
-            
-            base = current_vip if (current_vip and current_vip > now) else now
-            new_until = base + timedelta(minutes=duration)
-            self.db.set_user_field(interaction.user.id, "vip_until", new_until.isoformat())
-            
-            # Retirer l'item
-            self.db.remove_item(interaction.user.id, item, 1)
-            
-            days = duration // (24 * 60)
-            e = embed_win("👑 VIP activé !", f"Tu es maintenant VIP pendant **{days} jours** !")
-            e.add_field(name="⏰ Expire", value=f"<t:{int(new_until.timestamp())}:R>", inline=True)
-            e.add_field(name="📦 Restant", value=f"{qty - 1}× {it.name}", inline=True)
-            return await interaction.response.send_message(embed=e, ephemeral=True)
-
-        # ==== BOOSTS ====
-        if effect_key.startswith("boost_"):
-            boosts = self.db.get_boosts(interaction.user.id)
-            
-            # Vérifier si un boost du même type est déjà actif
-            existing_until = boosts.get(effect_key)
-            if existing_until:
-                try:
-                    existing_dt = datetime.fromisoformat(existing_until)
-                    if existing_dt > now:
-                        # Étendre le boost existant
-                        new_until = existing_dt + timedelta(minutes=duration)
-                    else:
-                        new_until = now + timedelta(minutes=duration)
-                except:
-                    new_until = now + timedelta(minutes=duration)
-            else:
-                new_until = now + timedelta(minutes=duration)
-            
-            boosts[effect_key] = new_until.isoformat()
-            self.db.set_boosts(interaction.user.id, boosts)
-            
-            # Retirer l'item
-            self.db.remove_item(interaction.user.id, item, 1)
-            
-            boost_names = {
-                "boost_all": "🎯 Chance Globale",
-                "boost_roulette": "🎡 Boost Roulette",
-                "boost_blackjack": "🃏 Boost Blackjack",
-                "boost_crash": "📈 Boost Crash",
-                "boost_steal": "🥷 Boost Vol",
-            }
-            boost_name = boost_names.get(effect_key, effect_key)
-            
-            e = embed_win(f"{boost_name} activé !", f"**{it.name}** est maintenant actif pendant **{duration} minutes** !")
-            e.add_field(name="⏰ Expire", value=f"<t:{int(new_until.timestamp())}:R>", inline=True)
-            e.add_field(name="📦 Restant", value=f"{qty - 1}× {it.name}", inline=True)
+        # consommation + effet en une transaction (cf. Database.use_timed_item)
+        res = await asyncio.to_thread(handler, self.db, interaction.user.id, it, quantity, datetime.now(timezone.utc))
+        if res is None:
+            e = embed_lose("❌ Pas assez d'exemplaires", f"Tu ne possèdes plus assez de `{item}`.")
             return await interaction.response.send_message(embed=e, ephemeral=True)
-
-        # ==== SETPROFILE (ticket consommable) ====
-        if effect_key == "setprofile":
-            e = embed_win("🎫 Ticket SetProfile", f"Tu possèdes **{qty}× {it.name}**.\n\nCe ticket te permet de définir une bannière sur ton profil.\nUtilise `/profileset banner <url>` pour l'utiliser (le ticket sera consommé automatiquement).")
-            return await interaction.response.send_message(embed=e, ephemeral=True)
-
-        # ==== EFFET INCONNU ====
-        e = embed_neutral("❓ Effet inconnu", f"L'item `{it.name}` a un effet non reconnu: `{effect_key}`")
+        if res.consumed:
+            e = embed_win(res.title, res.description)
+            if res.until:
+                e.add_field(name="⏰ Expire", value=f"<t:{int(res.until.timestamp())}:R>", inline=True)
+            e.add_field(name="📦 Restant", value=f"{res.remaining}× {it.name}", inline=True)
+        else:
+            e = embed_win(res.title, f"Tu possèdes **{qty}× {it.name}**.\n\n{res.description}")
         await interaction.response.send_message(embed=e, ephemeral=True)
 
     # ============================================
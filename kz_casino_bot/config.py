@@ -8,6 +8,68 @@ TOKEN = os.getenv("DISCORD_TOKEN") or os.getenv("TOKEN") or ""
 OWNER_ID = int(os.getenv("OWNER_ID") or "0")
 DB_PATH = os.getenv("DB_PATH") or "casino.db"
 
+
+def _parse_ids(raw: str) -> list[int] | None:
+    """ "0-3" ou "0,2,5" -> liste d'entiers (None si vide)."""
+    ids: list[int] = []
+    for part in filter(None, (p.strip() for p in raw.split(","))):
+        lo, _, hi = part.partition("-")
+        ids.extend(range(int(lo), int(hi or lo) + 1))
+    return ids or None
+
+
+# Sharding: SHARD_COUNT vide = nombre recommandé par Discord. Pour répartir les shards
+# sur plusieurs process (même casino.db), donner à chacun SHARD_COUNT et sa plage SHARD_IDS.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT") or "0") or None
+SHARD_IDS = _parse_ids(os.getenv("SHARD_IDS") or "")
+# Le process qui porte le shard 0 exécute les tâches uniques (sync des commandes, snapshots, échéancier des prêts)
+IS_PRIMARY = SHARD_IDS is None or 0 in SHARD_IDS
+CACHE_POLL_INTERVAL_S = float(os.getenv("CACHE_POLL_INTERVAL_S") or "0.25")  # relecture de la table `changes`
+
+# Serveur HTTP de santé (/healthz, /metrics) dans la boucle du bot
+HEALTH_ENABLED = (os.getenv("HEALTH_ENABLED") or "1") == "1"
+HEALTH_HOST = os.getenv("HEALTH_HOST") or "0.0.0.0"
+HEALTH_PORT = int(os.getenv("HEALTH_PORT") or os.getenv("PORT") or "8080")
+HEALTH_MAX_LOOP_LAG_S = float(os.getenv("HEALTH_MAX_LOOP_LAG_S") or "1.0")  # au-delà: /healthz en 503
+
+# Surveillance de la boucle (lag + callbacks bloquants, cf. /loop)
+LOOPMON_ENABLED = (os.getenv("LOOPMON_ENABLED") or "1") == "1"
+LOOPMON_INTERVAL_S = float(os.getenv("LOOPMON_INTERVAL_S") or "0.1")  # période du battement
+LOOPMON_STALL_S = float(os.getenv("LOOPMON_STALL_S") or "0.25")  # blocage à partir duquel on échantillonne la pile
+LOOPMON_ASYNCIO_DEBUG = (os.getenv("LOOPMON_ASYNCIO_DEBUG") or "0") == "1"  # mode debug asyncio (plus coûteux)
+
+# Sauvegardes à chaud (API backup de SQLite, cf. backup.py et /backup)
+BACKUP_ENABLED = (os.getenv("BACKUP_ENABLED") or "1") == "1"
+BACKUP_DIR = os.getenv("BACKUP_DIR") or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "backups")
+BACKUP_INTERVAL_H = float(os.getenv("BACKUP_INTERVAL_H") or "6")
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP") or "14")  # snapshots conservés par type (auto, pre-wipeall...)
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP") or "256")
+BACKUP_STEP_PAUSE_S = float(os.getenv("BACKUP_STEP_PAUSE_S") or "0.01")  # pause entre deux étapes de copie
+# Exports CSV de l'économie pour analyse hors ligne (/backup export, python -m kz_casino_bot.export)
+EXPORT_DIR = os.getenv("EXPORT_DIR") or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "exports")
+EXPORT_KEEP = int(os.getenv("EXPORT_KEEP") or "5")
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS") or "5000")  # lignes lues par paquet (mémoire constante)
+
+# Maintenance du fichier SQLite (checkpoint du WAL, statistiques, vacuum incrémental), process principal
+MAINT_ENABLED = (os.getenv("MAINT_ENABLED") or "1") == "1"
+MAINT_INTERVAL_S = float(os.getenv("MAINT_INTERVAL_S") or "30")
+MAINT_WAL_LIMIT_MB = float(os.getenv("MAINT_WAL_LIMIT_MB") or "16")  # checkpoint(TRUNCATE) au-delà, en période calme
+MAINT_QUIET_S = float(os.getenv("MAINT_QUIET_S") or "5")  # calme = aucune écriture depuis X secondes
+MAINT_OPTIMIZE_H = float(os.getenv("MAINT_OPTIMIZE_H") or "6")  # PRAGMA optimize
+MAINT_VACUUM_FREE_PCT = float(os.getenv("MAINT_VACUUM_FREE_PCT") or "10")  # % de pages libres avant vacuum
+MAINT_VACUUM_PAGES = int(os.getenv("MAINT_VACUUM_PAGES") or "512")  # pages rendues par passage
+# Conversion d'une base ancienne en auto_vacuum=INCREMENTAL: VACUUM complet, qui bloque les écritures
+# pendant toute sa durée. Automatique seulement sous MAINT_VACUUM_CONVERT_MAX_MB, sinon MAINT_VACUUM_CONVERT=1.
+MAINT_VACUUM_CONVERT = (os.getenv("MAINT_VACUUM_CONVERT") or "0") == "1"
+MAINT_VACUUM_CONVERT_MAX_MB = float(os.getenv("MAINT_VACUUM_CONVERT_MAX_MB") or "32")
+
+# Cartes de profil PNG (/profilecard, Pillow): rendu dans un pool de process, cache mémoire + disque
+CARD_WORKERS = int(os.getenv("CARD_WORKERS") or "2")
+CARD_CACHE_DIR = os.getenv("CARD_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "cards")
+CARD_CACHE_MEM = int(os.getenv("CARD_CACHE_MEM") or "256")  # cartes gardées en mémoire
+CARD_CACHE_MAX_FILES = int(os.getenv("CARD_CACHE_MAX_FILES") or "5000")  # au-delà, les plus anciennes sont supprimées
+CARD_FONT = os.getenv("CARD_FONT") or None  # police TTF (défaut: police intégrée à Pillow)
+
 # ============================================
 # 🔒 RESTRICTIONS DE SALONS / CATÉGORIES
 # ============================================
@@ -78,6 +140,11 @@ ACTIVITY_VOICE_REWARD = int(os.getenv("ACTIVITY_VOICE_REWARD") or "1000")
 # ===== XP / Niveaux =====
 # Progression volontairement difficile (voir kz_casino_bot/leveling.py)
 XP_LEVEL_CAP = int(os.getenv("XP_LEVEL_CAP") or "100")
+# Recalcul des niveaux stockés quand la courbe/le cap change (cf. kz_casino_bot/level_recompute.py)
+LEVEL_RECOMPUTE_AUTO = (os.getenv("LEVEL_RECOMPUTE_AUTO") or "1") == "1"  # au démarrage, process principal
+LEVEL_RECOMPUTE_CHUNK = int(os.getenv("LEVEL_RECOMPUTE_CHUNK") or "500")  # joueurs par lot (maximum)
+LEVEL_RECOMPUTE_PAUSE_S = float(os.getenv("LEVEL_RECOMPUTE_PAUSE_S") or "0.02")  # pause entre deux lots
+LEVEL_RECOMPUTE_MAX_LOCK_MS = float(os.getenv("LEVEL_RECOMPUTE_MAX_LOCK_MS") or "5")  # durée visée d'une écriture
 
 # Gains d'XP (tu peux ajuster dans .env si besoin)
 XP_PER_ACTIVITY_MESSAGE = int(os.getenv("XP_PER_ACTIVITY_MESSAGE") or "10")
@@ -111,6 +178,7 @@ RARITY_INFO = {
 }
 
 SHOP_CATEGORIES = ["Protection", "VIP", "Boost", "Cosmetics"]
+SHOP_MAX_QTY = int(os.getenv("SHOP_MAX_QTY") or "1000")  # quantité max par /buy et /use (une seule transaction)
 
 # Games tuning (Option 2 - Objectif: 1M en 2-4 semaines)
 COINFLIP_PAYOUT = float(os.getenv("COINFLIP_PAYOUT") or "1.98")  # Avant: 1.95
@@ -192,4 +260,8 @@ LOANS_SEND_REQUESTS_TO_OWNER_DM = (os.getenv("LOANS_SEND_REQUESTS_TO_OWNER_DM")
 # --- P2P loans (entre joueurs) ---
 LOANS_P2P_ENABLED = (os.getenv("LOANS_P2P_ENABLED") or "1") == "1"
 LOANS_P2P_MAX_INTEREST_PCT = float(os.getenv("LOANS_P2P_MAX_INTEREST_PCT") or "30")
-LOANS_P2P_MAX_TERM_DAYS = int(os.getenv("LOANS_P2P_MAX_TERM_DAYS") or str(LOANS_MAX_TERM_DAYS))
\ No newline at end of file
+LOANS_P2P_MAX_TERM_DAYS = int(os.getenv("LOANS_P2P_MAX_TERM_DAYS") or str(LOANS_MAX_TERM_DAYS))
+# --- Échéances / recouvrement automatique ---
+LOANS_OVERDUE_PENALTY_PCT = float(os.getenv("LOANS_OVERDUE_PENALTY_PCT") or "5")  # % du restant dû, par période de retard
+LOANS_OVERDUE_PERIOD_H = int(os.getenv("LOANS_OVERDUE_PERIOD_H") or "24")  # prochaine pénalité/prélèvement après X heures
+LOANS_SERVICING_INTERVAL_S = int(os.getenv("LOANS_SERVICING_INTERVAL_S") or "300")  # réveil max de l'échéancier
@@ -2,19 +2,149 @@
 from __future__ import annotations
 
 import json
+import os
 import sqlite3
-from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import Any, Iterable
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from enum import IntEnum
+from typing import Any, Callable, Iterable, Iterator
+
+from . import config
+from .leveling import curve, grade_for_level, level_up_rewards, regraded_color
 
 
 def utcnow_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+class Reason(IntEnum):
+    """Codes motif du ledger (stockés en INTEGER, ne jamais renuméroter)."""
+    OTHER = 0
+    START = 1             # solde de départ
+    ADMIN = 2             # /give /take /setbal /clearcoins
+    WIPE = 3              # /clearuser /wipeall
+    DAILY = 10
+    WEEKLY = 11
+    WORK = 12
+    TRANSFER = 13
+    GIFT = 14
+    ACTIVITY = 15
+    LEVEL_UP = 16
+    CHEST = 17
+    GAME_BET = 20
+    GAME_PAYOUT = 21
+    GAME_REFUND = 22
+    STEAL = 30
+    SABOTAGE = 31
+    PVP_STAKE = 40
+    PVP_PAYOUT = 41
+    PVP_REFUND = 42
+    SHOP = 50
+    PREDICTION_STAKE = 60
+    PREDICTION_PAYOUT = 61
+    PREDICTION_REFUND = 62
+    LOAN_DISBURSE = 70
+    LOAN_REPAY = 71
+    LOAN_AUTO = 72
+
+
+def _ledger_table(ts: int) -> str:
+    """Partition mensuelle du ledger: ledger_YYYYMM."""
+    return "ledger_" + time.strftime("%Y%m", time.gmtime(int(ts)))
+
+
+def shard_of(guild_id: int, shard_count: int) -> int:
+    """Shard qui reçoit les événements d'un serveur (même formule que discord.py)."""
+    return (int(guild_id) >> 22) % max(1, int(shard_count))
+
+
+# Notifications conservées dans `changes` (un process en retard au-delà recharge tout)
+CHANGES_RETENTION_S = 3600
+# Inventaires gardés en cache (les plus anciens sont évincés au-delà)
+INVENTORY_CACHE_MAX = 4096
+# Reprises tolérées d'une sauvegarde incrémentale (base modifiée pendant la copie)
+BACKUP_MAX_RESTARTS = 3
+# Setting qui désigne la version active du catalogue du shop (table shop_catalog)
+CATALOG_VERSION_KEY = "shop_catalog_version"
+# Profils (/profile) gardés en cache: durée max (borne le retard vis-à-vis des
+# autres process et du rang, qui bouge avec les soldes des autres) et nombre d'entrées
+PROFILE_CACHE_TTL_S = 5.0
+PROFILE_CACHE_MAX = 2048
+# Recalcul des niveaux (cf. level_recompute.py): signature de la courbe avec laquelle
+# users.level est à jour, et point de reprise "<signature>:<dernier user_id traité>"
+LEVEL_CURVE_KEY = "level_curve"
+LEVEL_RECOMPUTE_KEY = "level_recompute_cursor"
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class ProfileSnapshot:
+    """Ce qu'affiche /profile, lu en une requête (Database.profile_snapshot)."""
+
+    user_id: int
+    balance: int
+    rank: int
+    xp: int
+    games_played: int
+    wins: int
+    losses: int
+    profile_color: str | None
+    profile_banner: str | None
+    profile_bio: str | None
+    profile_frame: str | None
+    frames: frozenset[str]  # cadres (frame_*) possédés
+    vip_until: datetime | None
+    immunity_until: datetime | None
+    created_at: datetime | None
+
+
+def _parse_iso(raw: str | None) -> datetime | None:
+    try:
+        return datetime.fromisoformat(raw) if raw else None
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class GuildGate:
+    """Restrictions d'un serveur: salons / catégories autorisés et utilisateurs exemptés."""
+
+    channels: frozenset[int]
+    categories: frozenset[int]
+    bypass: frozenset[int]
+
+
 @dataclass
 class Database:
     path: str
+    # Pools de prédiction en mémoire: target_id -> [pool_win, pool_lose] (None = pas encore chargé).
+    # Sert aux cotes en direct et permet à add_stat d'éviter la requête pour
+    # l'immense majorité des parties (cibles sans pool).
+    _pred_pools: dict[int, list[int]] | None = field(default=None, init=False, repr=False)
+    # Partitions du ledger déjà créées (évite un CREATE TABLE IF NOT EXISTS par écriture)
+    _ledger_tables: set[str] = field(default_factory=set, init=False, repr=False)
+    # Caches locaux (restrictions par serveur, settings, blacklist). Plusieurs process
+    # peuvent partager la base: chaque écriture ajoute une ligne dans `changes`, que
+    # poll_changes() relit pour invalider les caches des autres process.
+    shard_count: int = field(default=1, init=False, repr=False)
+    _gates: dict[int, dict[int, GuildGate]] = field(default_factory=dict, init=False, repr=False)  # shard -> guild -> gate
+    _settings: dict[str, str | None] = field(default_factory=dict, init=False, repr=False)
+    _blacklist: dict[int, sqlite3.Row] | None = field(default=None, init=False, repr=False)
+    _bot_admins: frozenset[int] | None = field(default=None, init=False, repr=False)
+    # Inventaires récents (autocomplete /use, /gift item...): user_id -> {item_id: qty}
+    _inventories: dict[int, dict[str, int]] = field(default_factory=dict, init=False, repr=False)
+    # Profils récents: user_id -> (expiration monotonic, snapshot); vidé à chaque écriture du joueur dans ce process
+    _profiles: dict[int, tuple[float, ProfileSnapshot]] = field(default_factory=dict, init=False, repr=False)
+    # Caches tenus hors de Database (cogs): topic -> callbacks(key), appelés depuis le thread de l'écriture ou du poll
+    _subscribers: dict[str, list[Callable[[str | None], None]]] = field(default_factory=dict, init=False, repr=False)
+    _cache_gen: int = field(default=0, init=False, repr=False)  # incrémenté à chaque invalidation
+    _change_seq: int | None = field(default=None, init=False, repr=False)
+    _changes_pruned_at: float = field(default=0.0, init=False, repr=False)
 
     def connect(self) -> sqlite3.Connection:
         con = sqlite3.connect(self.path, timeout=30)
@@ -27,6 +157,15 @@ class Database:
         return con
 
     def init(self) -> None:
+        # base neuve: auto_vacuum doit être fixé avant le passage en WAL (connect()), qui
+        # initialise le fichier. Sans effet sur une base existante (cf. enable_incremental_vacuum).
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            if int(con.execute("PRAGMA page_count").fetchone()[0]) == 0:
+                con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                con.execute("PRAGMA journal_mode=WAL")
+        finally:
+            con.close()
         with self.connect() as con:
             con.execute(
                 """
@@ -92,6 +231,9 @@ class Database:
             add_col("bot_wins", "bot_wins INTEGER NOT NULL DEFAULT 0")
             add_col("bot_losses", "bot_losses INTEGER NOT NULL DEFAULT 0")
 
+            # rang par solde (/profile, classement): COUNT(*) WHERE balance > ? sur l'index
+            con.execute("CREATE INDEX IF NOT EXISTS idx_users_balance ON users(balance)")
+
             con.execute(
                 """
                 CREATE TABLE IF NOT EXISTS settings (
@@ -191,6 +333,7 @@ class Database:
                 )
                 '''
             )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_predictions_target ON predictions(target_id)")
 
             con.execute(
                 '''
@@ -201,12 +344,18 @@ class Database:
                     bet INTEGER NOT NULL,
                     choice TEXT NOT NULL,
                     result TEXT NOT NULL,          -- 'win' ou 'lose' (résultat réel du target)
-                    paid_from_target INTEGER NOT NULL DEFAULT 0, -- montant effectivement prélevé au target
+                    paid_from_target INTEGER NOT NULL DEFAULT 0, -- ancien mode 1:1 (montant prélevé au target)
+                    payout INTEGER NOT NULL DEFAULT 0,           -- montant versé au predictor (pari mutuel)
                     created_at TEXT NOT NULL,
                     resolved_at TEXT NOT NULL
                 )
                 '''
             )
+            cols = {r[1] for r in con.execute("PRAGMA table_info(prediction_logs)").fetchall()}
+            if "payout" not in cols:
+                con.execute("ALTER TABLE prediction_logs ADD COLUMN payout INTEGER NOT NULL DEFAULT 0")
+                # historique 1:1: escrow remboursé + montant pris au target
+                con.execute("UPDATE prediction_logs SET payout = bet + paid_from_target WHERE choice = result")
 
 
             # ===== Loans / Prêts (banque du bot + prêts entre joueurs) =====
@@ -241,11 +390,152 @@ class Database:
             add_loan_col("lender_id", "lender_id INTEGER")
             add_loan_col("slot", "slot INTEGER")  # 1-3 pour prêts actifs, NULL pour historique
 
+            add_loan_col("penalties", "penalties INTEGER NOT NULL DEFAULT 0")  # nb de pénalités de retard appliquées
+
             # remplir la valeur kind si DB ancienne
             con.execute("UPDATE loans SET kind='BANK' WHERE kind IS NULL OR kind='' ")
+            # échéancier: scans indexés des prêts ACTIVE arrivés à échéance
+            con.execute("CREATE INDEX IF NOT EXISTS idx_loans_status_due ON loans(status, due_at)")
+
+            # Journal des remboursements (manuels + prélèvements automatiques)
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS loan_payments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    loan_id INTEGER NOT NULL,
+                    payer_id INTEGER NOT NULL,
+                    payee_id INTEGER,                  -- NULL pour BANK
+                    amount INTEGER NOT NULL,
+                    remaining_after INTEGER NOT NULL,
+                    source TEXT NOT NULL,              -- manual | auto | adjust
+                    created_at TEXT NOT NULL
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_loan_payments_loan ON loan_payments(loan_id)")
+
+            # Compteurs dénormalisés par joueur, tenus à jour par triggers:
+            #   active_borrowed = prêts PENDING/ACTIVE en tant qu'emprunteur
+            #   pending_lent    = prêts P2P PENDING en tant que prêteur
+            #   slots_mask      = bit (slot-1) à 1 si le slot est occupé
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS loan_counters (
+                    user_id INTEGER PRIMARY KEY,
+                    active_borrowed INTEGER NOT NULL DEFAULT 0,
+                    pending_lent INTEGER NOT NULL DEFAULT 0,
+                    slots_mask INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            open_st = "status IN ('PENDING','ACTIVE')"
+            slot_bit = f"(CASE WHEN {{r}}.slot IS NOT NULL AND {{r}}.{open_st} THEN 1 << ({{r}}.slot - 1) ELSE 0 END)"
+
+            def counters_sql(r: str, sign: str) -> str:
+                bit = slot_bit.format(r=r)
+                slots = f"slots_mask | {bit}" if sign == "+" else f"slots_mask & ~{bit}"
+                return (
+                    f"INSERT OR IGNORE INTO loan_counters (user_id) VALUES ({r}.borrower_id);\n"
+                    f"UPDATE loan_counters SET active_borrowed = active_borrowed {sign} ({r}.{open_st}), "
+                    f"slots_mask = {slots} WHERE user_id = {r}.borrower_id;\n"
+                    f"INSERT OR IGNORE INTO loan_counters (user_id) SELECT {r}.lender_id WHERE {r}.lender_id IS NOT NULL;\n"
+                    f"UPDATE loan_counters SET pending_lent = pending_lent {sign} ({r}.status='PENDING' AND {r}.kind='P2P') "
+                    f"WHERE user_id = {r}.lender_id;\n"
+                )
+
+            con.execute(f"CREATE TRIGGER IF NOT EXISTS trg_loans_counters_ins AFTER INSERT ON loans BEGIN\n{counters_sql('NEW', '+')}END")
+            con.execute(f"CREATE TRIGGER IF NOT EXISTS trg_loans_counters_del AFTER DELETE ON loans BEGIN\n{counters_sql('OLD', '-')}END")
+            con.execute(
+                "CREATE TRIGGER IF NOT EXISTS trg_loans_counters_upd "
+                "AFTER UPDATE OF status, slot, kind, borrower_id, lender_id ON loans BEGIN\n"
+                f"{counters_sql('OLD', '-')}{counters_sql('NEW', '+')}END"
+            )
+            # Reconstruction complète à chaque démarrage (répare toute dérive)
+            con.execute("DELETE FROM loan_counters")
+            con.execute(
+                f"""
+                INSERT INTO loan_counters (user_id, active_borrowed, pending_lent, slots_mask)
+                SELECT user_id, SUM(a), SUM(p), SUM(m) FROM (
+                    SELECT borrower_id AS user_id, ({open_st}) AS a, 0 AS p, {slot_bit.format(r='loans')} AS m
+                    FROM loans
+                    UNION ALL
+                    SELECT lender_id, 0, (status='PENDING' AND kind='P2P'), 0 FROM loans WHERE lender_id IS NOT NULL
+                ) GROUP BY user_id
+                """
+            )
+
+            con.commit()
+
+            # ===== Ledger (append-only, partitionné par mois: ledger_YYYYMM) + snapshots =====
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS balance_snapshots (
+                    day TEXT NOT NULL,           -- YYYY-MM-DD (UTC)
+                    ts INTEGER NOT NULL,         -- epoch du snapshot (désigne la partition ledger_YYYYMM)
+                    seq INTEGER NOT NULL,        -- dernier rowid de cette partition inclus dans le snapshot
+                    user_id INTEGER NOT NULL,
+                    balance INTEGER NOT NULL,
+                    PRIMARY KEY (day, user_id)
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_balance_snapshots_user ON balance_snapshots(user_id, day)")
+            self._ledger_partition(con, int(time.time()))
+            con.commit()
+
+            # ===== Escrows PvP (mises bloquées, survivent à un redémarrage) =====
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS escrows (
+                    escrow_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    duel_type TEXT NOT NULL,
+                    guild_id INTEGER NOT NULL,
+                    channel_id INTEGER NOT NULL,
+                    a_id INTEGER NOT NULL,
+                    b_id INTEGER NOT NULL,
+                    bet INTEGER NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'HELD', -- HELD | SETTLED | REFUNDED
+                    created_at TEXT NOT NULL,
+                    closed_at TEXT
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_escrows_held ON escrows(status) WHERE status='HELD'")
+
+            # Catalogue du shop: une ligne par version publiée (JSON complet), jamais modifiée
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS shop_catalog (
+                    version INTEGER PRIMARY KEY AUTOINCREMENT,
+                    items_json TEXT NOT NULL,
+                    note TEXT,
+                    created_by INTEGER,
+                    created_at TEXT NOT NULL
+                )
+                """
+            )
 
+            # Journal des modifications (invalidation des caches entre process)
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    topic TEXT NOT NULL,
+                    key TEXT,
+                    ts INTEGER NOT NULL
+                )
+                """
+            )
             con.commit()
 
+            pools: dict[int, list[int]] = {}
+            for r in con.execute(
+                "SELECT target_id, choice, SUM(bet) FROM predictions GROUP BY target_id, choice"
+            ).fetchall():
+                pool = pools.setdefault(int(r[0]), [0, 0])
+                pool[0 if str(r[1]).lower() == "win" else 1] += int(r[2] or 0)
+            self._pred_pools = pools
+
     # ---- low-level helpers ----
     def fetchone(self, sql: str, params: Iterable[Any] = ()) -> sqlite3.Row | None:
         with self.connect() as con:
@@ -278,18 +568,102 @@ class Database:
                     "INSERT INTO users (user_id, balance, created_at) VALUES (?, ?, ?)",
                     (user_id, start_balance, utcnow_iso()),
                 )
+                self._ledger_in_con(con, [(user_id, int(start_balance), Reason.START, None)])
             con.commit()
 
     def get_user(self, user_id: int) -> sqlite3.Row | None:
         return self.fetchone("SELECT * FROM users WHERE user_id=?", (user_id,))
 
-    def set_balance(self, user_id: int, new_balance: int) -> None:
+    _PROFILE_SQL = (
+        "SELECT u.balance, u.xp, u.games_played, u.wins, u.losses, u.profile_color, u.profile_banner,"
+        " u.profile_bio, u.profile_frame, u.inventory_json, u.vip_until, u.immunity_until, u.created_at,"
+        " (SELECT COUNT(*) FROM users o WHERE o.balance > u.balance) AS better"
+        " FROM users u WHERE u.user_id=?"
+    )
+
+    def profile_snapshot(self, user_id: int, start_balance: int | None = None) -> ProfileSnapshot | None:
+        """Données de /profile en une lecture (rang compté sur idx_users_balance), en cache quelques secondes.
+
+        start_balance: crée le joueur s'il n'existe pas (sinon None est retourné).
+        """
+        uid = int(user_id)
+        hit = self._profiles.get(uid)
+        if hit is not None and hit[0] > time.monotonic():
+            return hit[1]
+        gen = self._cache_gen
+        row = self.fetchone(self._PROFILE_SQL, (uid,))
+        if row is None:
+            if start_balance is None:
+                return None
+            self.ensure_user(uid, start_balance)
+            gen = self._cache_gen
+            row = self.fetchone(self._PROFILE_SQL, (uid,))
+            if row is None:
+                return None
+        inv = self._load_json(row["inventory_json"])
+        snap = ProfileSnapshot(
+            user_id=uid,
+            balance=int(row["balance"] or 0),
+            rank=1 + int(row["better"]),
+            xp=int(row["xp"] or 0),
+            games_played=int(row["games_played"] or 0),
+            wins=int(row["wins"] or 0),
+            losses=int(row["losses"] or 0),
+            profile_color=row["profile_color"],
+            profile_banner=row["profile_banner"],
+            profile_bio=row["profile_bio"],
+            profile_frame=row["profile_frame"],
+            frames=frozenset(k for k, v in inv.items() if k.startswith("frame_") and int(v) > 0),
+            vip_until=_parse_iso(row["vip_until"]),
+            immunity_until=_parse_iso(row["immunity_until"]),
+            created_at=_parse_iso(row["created_at"]),
+        )
+        if gen == self._cache_gen:
+            if len(self._profiles) >= PROFILE_CACHE_MAX:
+                self._profiles.pop(next(iter(self._profiles)), None)
+            self._profiles[uid] = (time.monotonic() + PROFILE_CACHE_TTL_S, snap)
+        return snap
+
+    def _drop_profiles(self, *user_ids: int) -> None:
+        for uid in user_ids:
+            self._profiles.pop(int(uid), None)
+
+    def top_balances(self, limit: int = 10) -> list[sqlite3.Row]:
+        return self.fetchall("SELECT user_id, balance FROM users ORDER BY balance DESC LIMIT ?", (int(limit),))
+
+    def balance_rank(self, user_id: int) -> int:
+        """Rang (1 = plus riche) d'un joueur, 0 s'il n'existe pas."""
+        row = self.fetchone(
+            "SELECT 1 + (SELECT COUNT(*) FROM users o WHERE o.balance > u.balance) AS r FROM users u WHERE u.user_id=?",
+            (int(user_id),),
+        )
+        return int(row["r"]) if row else 0
+
+    def set_xp_level(self, user_id: int, xp: int, level: int, profile_color: str | None = None) -> None:
+        """Fixe XP et niveau sans récompenses (corrections admin). profile_color=None: inchangée."""
+        self._drop_profiles(user_id)
+        with self.connect() as con:
+            con.execute(
+                "UPDATE users SET xp=?, level=?, profile_color=COALESCE(?, profile_color) WHERE user_id=?",
+                (int(xp), int(level), profile_color, int(user_id)),
+            )
+            con.commit()
+
+    def set_balance(self, user_id: int, new_balance: int, reason: int = Reason.ADMIN, ref_id: int | None = None) -> None:
         # Empêcher les soldes négatifs
         new_balance = max(0, int(new_balance))
-        self.execute("UPDATE users SET balance=? WHERE user_id=?", (new_balance, user_id))
+        with self.connect() as con:
+            row = con.execute("SELECT balance FROM users WHERE user_id=?", (user_id,)).fetchone()
+            con.execute("UPDATE users SET balance=? WHERE user_id=?", (new_balance, user_id))
+            if row:
+                self._ledger_in_con(con, [(user_id, new_balance - int(row["balance"]), reason, ref_id)])
+            con.commit()
 
-    def add_balance(self, user_id: int, delta: int) -> int:
-        """Ajoute ou retire des coins. Le solde ne peut jamais être négatif."""
+    def add_balance(self, user_id: int, delta: int, reason: int = Reason.OTHER, ref_id: int | None = None) -> int:
+        """Ajoute ou retire des coins. Le solde ne peut jamais être négatif.
+
+        Le mouvement effectif (après plancher à 0) est écrit au ledger dans la même transaction.
+        """
         delta = int(delta)
         with self.connect() as con:
             # Récupérer le solde actuel
@@ -301,30 +675,363 @@ class Database:
             
             # Mettre à jour
             con.execute("UPDATE users SET balance=? WHERE user_id=?", (new_balance, user_id))
+            if row:
+                self._ledger_in_con(con, [(user_id, new_balance - current, reason, ref_id)])
             con.commit()
             return new_balance
 
+    def _ensure_users_in_con(self, con: sqlite3.Connection, user_ids: Iterable[int], start_balance: int) -> None:
+        """ensure_user dans une transaction existante (solde de départ au ledger)."""
+        ledger = []
+        for uid in user_ids:
+            cur = con.execute(
+                "INSERT OR IGNORE INTO users (user_id, balance, created_at) VALUES (?, ?, ?)",
+                (int(uid), int(start_balance), utcnow_iso()),
+            )
+            if cur.rowcount:
+                ledger.append((int(uid), int(start_balance), Reason.START, None))
+        self._ledger_in_con(con, ledger)
+
+    def transfer(
+        self,
+        from_id: int,
+        to_id: int,
+        amount: int,
+        tax_pct: float = 0.0,
+        reason: int = Reason.TRANSFER,
+        start_balance: int = 0,
+    ) -> dict[str, Any]:
+        """Virement atomique joueur -> joueur (une transaction, débit conditionnel).
+
+        Le destinataire reçoit amount - taxe (taxe = amount * tax_pct %, détruite).
+        Retourne {sent, net, tax, from_balance, to_balance, insufficient}.
+        """
+        amount = int(amount)
+        tax = int(amount * (float(tax_pct) / 100.0))
+        net = max(0, amount - tax)
+        con = self.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            self._ensure_users_in_con(con, (from_id, to_id), start_balance)
+            debited = con.execute(
+                "UPDATE users SET balance = balance - ? WHERE user_id=? AND balance >= ?",
+                (amount, int(from_id), amount),
+            ).rowcount
+            if debited:
+                con.execute("UPDATE users SET balance = balance + ? WHERE user_id=?", (net, int(to_id)))
+                self._ledger_in_con(con, [
+                    (int(from_id), -amount, reason, int(to_id)),
+                    (int(to_id), net, reason, int(from_id)),
+                ])
+            balances = {
+                int(r["user_id"]): int(r["balance"])
+                for r in con.execute("SELECT user_id, balance FROM users WHERE user_id IN (?, ?)", (int(from_id), int(to_id)))
+            }
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+        return {
+            "sent": amount if debited else 0,
+            "net": net if debited else 0,
+            "tax": tax if debited else 0,
+            "from_balance": balances.get(int(from_id), 0),
+            "to_balance": balances.get(int(to_id), 0),
+            "insufficient": not debited,
+        }
+
+    def transfer_item(self, from_id: int, to_id: int, item_id: str, qty: int = 1, start_balance: int = 0) -> tuple[int, int] | None:
+        """Déplace qty exemplaires d'un item d'un inventaire à l'autre (une transaction).
+
+        Retourne (quantité restante chez from_id, quantité chez to_id), ou None si
+        from_id n'en possède pas assez.
+        """
+        qty = int(qty)
+        if qty <= 0:
+            raise ValueError("qty doit être > 0")
+        con = self.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            self._ensure_users_in_con(con, (from_id, to_id), start_balance)
+            invs = {}
+            for r in con.execute(
+                "SELECT user_id, inventory_json FROM users WHERE user_id IN (?, ?)", (int(from_id), int(to_id))
+            ):
+                try:
+                    invs[int(r["user_id"])] = json.loads(r["inventory_json"]) or {}
+                except Exception:
+                    invs[int(r["user_id"])] = {}
+            src, dst = invs.get(int(from_id), {}), invs.get(int(to_id), {})
+            have = int(src.get(item_id, 0))
+            if have < qty:
+                con.rollback()
+                return None
+            if have - qty > 0:
+                src[item_id] = have - qty
+            else:
+                src.pop(item_id, None)
+            dst[item_id] = int(dst.get(item_id, 0)) + qty
+            con.executemany(
+                "UPDATE users SET inventory_json=? WHERE user_id=?",
+                [(json.dumps(src), int(from_id)), (json.dumps(dst), int(to_id))],
+            )
+            self._notify(con, "inventory", from_id, to_id)
+            con.commit()
+            return have - qty, int(dst[item_id])
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+
+    @staticmethod
+    def _load_json(raw: str | None) -> dict[str, Any]:
+        try:
+            return (json.loads(raw) or {}) if raw else {}
+        except Exception:
+            return {}
+
+    def buy_item(self, user_id: int, item_id: str, qty: int, unit_price: int, start_balance: int = 0) -> dict[str, Any]:
+        """Achat de qty exemplaires en une transaction (débit conditionnel + inventaire + ledger).
+
+        Retourne {total, balance, owned, insufficient}.
+        """
+        qty = int(qty)
+        if qty <= 0:
+            raise ValueError("qty doit être > 0")
+        total = int(unit_price) * qty
+        con = self.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            self._ensure_users_in_con(con, (user_id,), start_balance)
+            debited = con.execute(
+                "UPDATE users SET balance = balance - ? WHERE user_id=? AND balance >= ?", (total, int(user_id), total)
+            ).rowcount
+            row = con.execute("SELECT balance, inventory_json FROM users WHERE user_id=?", (int(user_id),)).fetchone()
+            inv = self._load_json(row["inventory_json"])
+            if debited:
+                inv[item_id] = int(inv.get(item_id, 0)) + qty
+                con.execute("UPDATE users SET inventory_json=? WHERE user_id=?", (json.dumps(inv), int(user_id)))
+                self._ledger_in_con(con, [(int(user_id), -total, Reason.SHOP, None)])
+                self._notify(con, "inventory", user_id)
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+        return {
+            "total": total if debited else 0,
+            "balance": int(row["balance"]),
+            "owned": int(inv.get(item_id, 0)),
+            "insufficient": not debited,
+        }
+
+    def use_timed_item(
+        self,
+        user_id: int,
+        item_id: str,
+        qty: int,
+        minutes: int,
+        field: str,
+        boost_key: str | None = None,
+        now: datetime | None = None,
+    ) -> tuple[datetime, int] | None:
+        """Consomme qty exemplaires d'un item à durée et prolonge l'effet, en une transaction.
+
+        field: "immunity_until", "vip_until" ou "boosts_json" (clé boost_key). Les
+        exemplaires s'enchaînent: fin = max(fin actuelle, maintenant) + qty × minutes.
+        Retourne (nouvelle fin, quantité restante), ou None si pas assez d'exemplaires.
+        """
+        if field not in ("immunity_until", "vip_until", "boosts_json"):
+            raise ValueError(f"champ non prolongeable: {field}")
+        qty = int(qty)
+        if qty <= 0:
+            raise ValueError("qty doit être > 0")
+        now = now or datetime.now(timezone.utc)
+        con = self.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            row = con.execute(f"SELECT inventory_json, {field} FROM users WHERE user_id=?", (int(user_id),)).fetchone()
+            inv = self._load_json(row["inventory_json"]) if row else {}
+            have = int(inv.get(item_id, 0))
+            if have < qty:
+                con.rollback()
+                return None
+            boosts = self._load_json(row[field]) if boost_key else None
+            raw = boosts.get(boost_key) if boosts is not None else row[field]
+            try:
+                current = datetime.fromisoformat(raw) if raw else None
+            except (TypeError, ValueError):
+                current = None
+            until = (current if current and current > now else now) + timedelta(minutes=int(minutes) * qty)
+            if boosts is not None:
+                boosts[boost_key] = until.isoformat()
+                value = json.dumps(boosts)
+            else:
+                value = until.isoformat()
+            if have > qty:
+                inv[item_id] = have - qty
+            else:
+                inv.pop(item_id, None)
+            con.execute(
+                f"UPDATE users SET inventory_json=?, {field}=? WHERE user_id=?", (json.dumps(inv), value, int(user_id))
+            )
+            self._notify(con, "inventory", user_id)
+            con.commit()
+            return until, have - qty
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+
+    # =====================
+    # Ledger
+    # =====================
+    def _ledger_partition(self, con: sqlite3.Connection, ts: int) -> str:
+        """Crée au besoin la partition du mois de `ts` et rafraîchit la vue `ledger`."""
+        name = _ledger_table(ts)
+        if name in self._ledger_tables:
+            return name
+        con.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {name} (
+                ts INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                delta INTEGER NOT NULL,
+                reason_code INTEGER NOT NULL,
+                ref_id INTEGER
+            )
+            """
+        )
+        con.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_user ON {name}(user_id, ts)")
+        parts = self._ledger_partitions(con)
+        con.execute("DROP VIEW IF EXISTS ledger")
+        con.execute(
+            "CREATE VIEW ledger AS "
+            + " UNION ALL ".join(f"SELECT ts, user_id, delta, reason_code, ref_id FROM {p}" for p in parts)
+        )
+        self._ledger_tables.add(name)
+        return name
+
+    @staticmethod
+    def _ledger_partitions(con: sqlite3.Connection) -> list[str]:
+        """Partitions existantes, de la plus récente à la plus ancienne."""
+        rows = con.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' "
+            "AND name GLOB 'ledger_[0-9][0-9][0-9][0-9][0-9][0-9]' ORDER BY name DESC"
+        ).fetchall()
+        return [str(r[0]) for r in rows]
+
+    def _ledger_in_con(self, con: sqlite3.Connection, entries: Iterable[tuple[int, int, int, int | None]]) -> None:
+        """Écrit (user_id, delta, reason_code, ref_id) au ledger via une connexion existante."""
+        ts = int(time.time())
+        rows = [
+            (ts, int(uid), int(delta), int(reason), int(ref) if ref is not None else None)
+            for uid, delta, reason, ref in entries
+            if int(delta) != 0
+        ]
+        if not rows:
+            return
+        self._drop_profiles(*(r[1] for r in rows))  # tout mouvement de solde passe par ici
+        table = self._ledger_partition(con, ts)
+        con.executemany(
+            f"INSERT INTO {table} (ts, user_id, delta, reason_code, ref_id) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def ledger_for_user(self, user_id: int, limit: int = 20) -> list[sqlite3.Row]:
+        """Derniers mouvements d'un joueur (parcourt les partitions du plus récent au plus ancien)."""
+        out: list[sqlite3.Row] = []
+        with self.connect() as con:
+            for part in self._ledger_partitions(con):
+                out.extend(
+                    con.execute(
+                        f"SELECT ts, user_id, delta, reason_code, ref_id FROM {part} "
+                        "WHERE user_id=? ORDER BY ts DESC, rowid DESC LIMIT ?",
+                        (int(user_id), int(limit) - len(out)),
+                    ).fetchall()
+                )
+                if len(out) >= int(limit):
+                    break
+        return out
+
+    def snapshot_balances(self) -> int:
+        """Snapshot (quotidien) de tous les soldes. Retourne le nombre de joueurs."""
+        now = datetime.now(timezone.utc)
+        ts = int(now.timestamp())
+        con = self.connect()
+        try:
+            # Verrou d'écriture: soldes et position du ledger sont lus au même instant
+            con.execute("BEGIN IMMEDIATE")
+            self._ledger_partition(con, ts)
+            seq = con.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {_ledger_table(ts)}").fetchone()[0]
+            cur = con.execute(
+                "INSERT OR REPLACE INTO balance_snapshots (day, ts, seq, user_id, balance) "
+                "SELECT ?, ?, ?, user_id, balance FROM users",
+                (now.strftime("%Y-%m-%d"), ts, int(seq)),
+            )
+            con.commit()
+            return int(cur.rowcount or 0)
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+
+    def ledger_audit(self, user_id: int) -> dict[str, Any]:
+        """Reconstruit le solde attendu: dernier snapshot + somme du ledger depuis.
+
+        Ne lit que les partitions postérieures au snapshot (pas de scan de l'historique).
+        """
+        with self.connect() as con:
+            snap = con.execute(
+                "SELECT day, ts, seq, balance FROM balance_snapshots WHERE user_id=? ORDER BY day DESC LIMIT 1",
+                (int(user_id),),
+            ).fetchone()
+            base = int(snap["balance"]) if snap else 0
+            first_part = _ledger_table(int(snap["ts"])) if snap else ""
+            moved = 0
+            for part in self._ledger_partitions(con):
+                if part < first_part:
+                    break
+                seq = int(snap["seq"]) if snap and part == first_part else 0
+                row = con.execute(
+                    f"SELECT COALESCE(SUM(delta), 0) FROM {part} WHERE user_id=? AND rowid > ?",
+                    (int(user_id), seq),
+                ).fetchone()
+                moved += int(row[0] or 0)
+            cur = con.execute("SELECT balance FROM users WHERE user_id=?", (int(user_id),)).fetchone()
+        return {
+            "snapshot_day": str(snap["day"]) if snap else None,
+            "snapshot_balance": base,
+            "delta_since": moved,
+            "expected": base + moved,
+            "actual": int(cur["balance"]) if cur else 0,
+        }
+
     # =====================
     # XP / Niveau
     # =====================
     def _add_xp_in_con(self, con, user_id: int, amount: int) -> tuple[int, int]:
         """Ajoute de l'XP via une connexion existante. Retourne (new_xp, new_level)."""
         amount = int(amount)
+        self._drop_profiles(user_id)
 
         # Lire XP avant (pour détecter les level up)
         prev_row = con.execute("SELECT xp, profile_color FROM users WHERE user_id=?", (int(user_id),)).fetchone()
         prev_xp = int(prev_row["xp"]) if prev_row else 0
         prev_profile_color = (prev_row["profile_color"] if prev_row else None)
 
-        from . import config
-        from .leveling import level_from_xp
         cap = int(getattr(config, 'XP_LEVEL_CAP', 100))
-        old_level = level_from_xp(prev_xp, cap=cap)
+        levels = curve(cap)
+        old_level = levels.level(prev_xp)
 
         if amount <= 0:
-            row = con.execute("SELECT xp FROM users WHERE user_id=?", (int(user_id),)).fetchone()
-            xp = int(row["xp"]) if row else 0
-            lvl = level_from_xp(xp, cap=cap)
+            xp, lvl = prev_xp, old_level
             con.execute("UPDATE users SET level=? WHERE user_id=?", (int(lvl), int(user_id)))
             return xp, lvl
 
@@ -332,28 +1039,21 @@ class Database:
         row = con.execute("SELECT xp FROM users WHERE user_id=?", (int(user_id),)).fetchone()
         xp = int(row["xp"]) if row else 0
 
-        lvl = level_from_xp(xp, cap=cap)
+        lvl = levels.level(xp)
         con.execute("UPDATE users SET level=? WHERE user_id=?", (int(lvl), int(user_id)))
 
         # Récompenses KZ au level up + bonus de grade + déblocage couleur
         try:
             if lvl > old_level:
-                from .leveling import kz_per_level, grade_bonus_between_levels
-
-                # KZ par niveau gagné
-                kz_gain = 0
-                for reached in range(old_level + 1, lvl + 1):
-                    kz_gain += int(kz_per_level(reached))
-
-                # Bonus à chaque nouveau grade
-                grade_bonus, unlocked_grades = grade_bonus_between_levels(old_level, lvl, cap=cap)
-                kz_gain += int(grade_bonus)
+                # KZ par niveau gagné + bonus à chaque nouveau grade (sommes préfixes de la courbe)
+                kz_gain, unlocked_grades = level_up_rewards(old_level, lvl, cap=cap)
 
                 if kz_gain != 0:
                     con.execute(
                         "UPDATE users SET balance = MAX(0, balance + ?) WHERE user_id=?",
                         (int(kz_gain), int(user_id)),
                     )
+                    self._ledger_in_con(con, [(int(user_id), int(kz_gain), Reason.LEVEL_UP, int(lvl))])
 
                 # Débloque / applique automatiquement la couleur du dernier grade atteint
                 # - si l'utilisateur n'a pas défini de couleur
@@ -361,7 +1061,6 @@ class Database:
                 if unlocked_grades:
                     last_grade = unlocked_grades[-1]
                     if last_grade.profile_color:
-                        from .leveling import grade_for_level
                         old_grade = grade_for_level(old_level, cap=cap)
                         if (prev_profile_color is None) or (old_grade.profile_color and prev_profile_color == old_grade.profile_color):
                             con.execute(
@@ -379,8 +1078,73 @@ class Database:
             xp, lvl = self._add_xp_in_con(con, int(user_id), int(amount))
             con.commit()
             return xp, lvl
+
+    def level_recompute_state(self, cap: int) -> tuple[bool, int]:
+        """(recalcul nécessaire, dernier user_id déjà traité) pour la courbe actuelle."""
+        sig = curve(cap).signature
+        with self.connect() as con:
+            rows = dict(
+                con.execute(
+                    "SELECT key, value FROM settings WHERE key IN (?, ?)", (LEVEL_CURVE_KEY, LEVEL_RECOMPUTE_KEY)
+                ).fetchall()
+            )
+        cursor_sig, _, after = (rows.get(LEVEL_RECOMPUTE_KEY) or "").rpartition(":")
+        return rows.get(LEVEL_CURVE_KEY) != sig, int(after) if cursor_sig == sig else 0
+
+    def count_users(self, after: int = 0) -> int:
+        row = self.fetchone("SELECT COUNT(*) AS n FROM users WHERE user_id > ?", (int(after),))
+        return int(row["n"]) if row else 0
+
+    def recompute_levels_chunk(self, after: int, limit: int, cap: int) -> tuple[int | None, int, int, float]:
+        """Recalcule niveau et couleur des `limit` joueurs suivant user_id `after`, sans récompenses.
+
+        Lecture, calcul (un appel à curve().levels) et écriture des seules lignes
+        modifiées (executemany) se font dans une même transaction courte, avec le
+        point de reprise: la taille du lot borne la durée du verrou. Le dernier lot
+        enregistre la signature de la courbe.
+
+        Retourne (dernier user_id, ou None si terminé; lus; modifiés; durée du verrou en s).
+        """
+        c = curve(cap)
+        con = self.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            t = time.perf_counter()
+            rows = con.execute(
+                "SELECT user_id, xp, level, profile_color FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                (int(after), int(limit)),
+            ).fetchall()
+            updates = []
+            for r, lvl in zip(rows, c.levels(r["xp"] for r in rows)):
+                color = regraded_color(r["profile_color"], int(r["level"] or 1), lvl, cap=cap)
+                if lvl != r["level"] or color != r["profile_color"]:
+                    updates.append((lvl, color, r["user_id"]))
+            con.executemany("UPDATE users SET level=?, profile_color=? WHERE user_id=?", updates)
+            last = int(rows[-1]["user_id"]) if len(rows) == int(limit) else None
+            if last is None:
+                con.execute(
+                    "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                    (LEVEL_CURVE_KEY, c.signature),
+                )
+                con.execute("DELETE FROM settings WHERE key=?", (LEVEL_RECOMPUTE_KEY,))
+            else:
+                con.execute(
+                    "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+                    (LEVEL_RECOMPUTE_KEY, f"{c.signature}:{last}"),
+                )
+            con.commit()
+            held = time.perf_counter() - t
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+        self._drop_profiles(*(u[2] for u in updates))
+        return last, len(rows), len(updates), held
+
     def add_stat(self, user_id: int, wins_delta: int = 0, losses_delta: int = 0, games_delta: int = 0) -> None:
         # On résout aussi les prédictions sur ce joueur quand il gagne/perd.
+        self._drop_profiles(user_id)
         with self.connect() as con:
             con.execute(
                 "UPDATE users SET wins=wins+?, losses=losses+?, games_played=games_played+? WHERE user_id=?",
@@ -389,7 +1153,6 @@ class Database:
 
             # XP: progression via les jeux (difficile à monter, cf config + leveling)
             try:
-                from . import config
                 xp_gain = int(games_delta) * int(getattr(config, 'XP_PER_GAME', 25))
                 xp_gain += int(wins_delta) * int(getattr(config, 'XP_BONUS_WIN', 25))
                 xp_gain += int(losses_delta) * int(getattr(config, 'XP_BONUS_LOSS', 10))
@@ -404,7 +1167,7 @@ class Database:
             elif losses_delta > 0:
                 target_result = "lose"
 
-            if target_result:
+            if target_result and self.has_pending_predictions(user_id):
                 self._resolve_predictions_for_target(con, user_id, target_result)
 
             con.commit()
@@ -430,7 +1193,6 @@ class Database:
 
             # XP: progression PvP
             try:
-                from . import config
                 xp_gain = int(games_delta) * int(getattr(config, 'XP_PER_PVP_GAME', 35))
                 xp_gain += int(wins_delta) * int(getattr(config, 'XP_BONUS_PVP_WIN', 35))
                 xp_gain += int(losses_delta) * int(getattr(config, 'XP_BONUS_PVP_LOSS', 15))
@@ -440,6 +1202,130 @@ class Database:
                 pass
             con.commit()
 
+    # =====================
+    # PvP escrow
+    # =====================
+
+    def escrow_open(
+        self, duel_type: str, guild_id: int, channel_id: int, a_id: int, b_id: int, bet: int
+    ) -> tuple[int | None, int | None]:
+        """Débite la mise des deux joueurs et crée l'escrow dans la même transaction.
+
+        Retourne (escrow_id, None) ou (None, user_id du joueur sans assez de KZ).
+        """
+        con = self.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            for uid in (int(a_id), int(b_id)):
+                debited = con.execute(
+                    "UPDATE users SET balance = balance - ? WHERE user_id=? AND balance >= ?",
+                    (int(bet), uid, int(bet)),
+                ).rowcount
+                if not debited:
+                    con.rollback()
+                    return None, uid
+            cur = con.execute(
+                "INSERT INTO escrows (duel_type, guild_id, channel_id, a_id, b_id, bet, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(duel_type), int(guild_id), int(channel_id), int(a_id), int(b_id), int(bet), utcnow_iso()),
+            )
+            escrow_id = int(cur.lastrowid)
+            self._ledger_in_con(
+                con,
+                [
+                    (int(a_id), -int(bet), Reason.PVP_STAKE, escrow_id),
+                    (int(b_id), -int(bet), Reason.PVP_STAKE, escrow_id),
+                ],
+            )
+            con.commit()
+            return escrow_id, None
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+
+    def escrow_close(self, escrow_id: int, payouts: Iterable[tuple[int, int]], refund: bool = False) -> bool:
+        """Clôt un escrow HELD et verse `payouts` [(user_id, montant)] dans la même transaction.
+
+        Idempotent: retourne False si l'escrow était déjà clos (timeout vs résolution).
+        """
+        status = "REFUNDED" if refund else "SETTLED"
+        reason = Reason.PVP_REFUND if refund else Reason.PVP_PAYOUT
+        con = self.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            closed = con.execute(
+                "UPDATE escrows SET status=?, closed_at=? WHERE escrow_id=? AND status='HELD'",
+                (status, utcnow_iso(), int(escrow_id)),
+            ).rowcount
+            if not closed:
+                con.rollback()
+                return False
+            rows = [(int(amount), int(uid)) for uid, amount in payouts if int(amount) > 0]
+            con.executemany("UPDATE users SET balance = balance + ? WHERE user_id=?", rows)
+            self._ledger_in_con(con, [(uid, amount, reason, int(escrow_id)) for amount, uid in rows])
+            con.commit()
+            return True
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+
+    def escrow_recover(self, shard_ids: Iterable[int] | None = None) -> list[sqlite3.Row]:
+        """Rembourse en bloc tous les escrows HELD (sessions perdues au redémarrage).
+
+        À appeler au démarrage, avant toute nouvelle session. Avec plusieurs process,
+        `shard_ids` limite la reprise aux serveurs de ce process (les duels des autres
+        shards sont toujours en cours). Retourne les escrows remboursés.
+        """
+        ids = None if shard_ids is None else ",".join(str(int(s)) for s in shard_ids) or "NULL"
+
+        def held_where(p: str = "") -> str:
+            sql = f"{p}status='HELD'"
+            if ids is not None:
+                sql += f" AND (({p}guild_id >> 22) % {max(1, int(self.shard_count))}) IN ({ids})"
+            return sql
+
+        held_sql = held_where()
+        con = self.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            held = con.execute(
+                f"SELECT escrow_id, duel_type, guild_id, channel_id, a_id, b_id, bet FROM escrows WHERE {held_sql}"
+            ).fetchall()
+            if not held:
+                con.rollback()
+                return []
+            ledger = self._ledger_partition(con, int(time.time()))
+            for side in ("a_id", "b_id"):
+                con.execute(
+                    f"INSERT INTO {ledger} (ts, user_id, delta, reason_code, ref_id) "
+                    f"SELECT ?, {side}, bet, ?, escrow_id FROM escrows WHERE {held_sql} AND bet > 0",
+                    (int(time.time()), int(Reason.PVP_REFUND)),
+                )
+            con.execute(
+                f"""
+                UPDATE users SET balance = balance + (
+                    SELECT SUM(e.bet) FROM escrows e
+                    WHERE {held_where("e.")} AND users.user_id IN (e.a_id, e.b_id)
+                )
+                WHERE user_id IN (
+                    SELECT a_id FROM escrows WHERE {held_sql}
+                    UNION SELECT b_id FROM escrows WHERE {held_sql}
+                )
+                """
+            )
+            con.execute(f"UPDATE escrows SET status='REFUNDED', closed_at=? WHERE {held_sql}", (utcnow_iso(),))
+            con.commit()
+            return held
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+
     # =====================
     # Predictions
     # =====================
@@ -461,15 +1347,35 @@ class Database:
                 pass
 
 
+    def _pool_adjust(self, target_id: int, choice: str, delta: int) -> None:
+        if self._pred_pools is None:
+            return
+        pool = self._pred_pools.setdefault(int(target_id), [0, 0])
+        pool[0 if str(choice).lower() == "win" else 1] += int(delta)
+        if pool[0] <= 0 and pool[1] <= 0:
+            self._pred_pools.pop(int(target_id), None)
+
+    def _pool_drop(self, target_id: int) -> None:
+        if self._pred_pools is not None:
+            self._pred_pools.pop(int(target_id), None)
+
     def upsert_prediction(self, predictor_id: int, target_id: int, bet: int, choice: str) -> None:
         """Crée/écrase une prédiction (l'argent est géré par la commande, pas ici)."""
         with self.connect() as con:
+            old = con.execute(
+                "SELECT bet, choice FROM predictions WHERE predictor_id=? AND target_id=?",
+                (predictor_id, target_id),
+            ).fetchone()
             con.execute(
                 "INSERT INTO predictions (predictor_id, target_id, bet, choice, created_at) VALUES (?, ?, ?, ?, ?) "
                 "ON CONFLICT(predictor_id, target_id) DO UPDATE SET bet=excluded.bet, choice=excluded.choice, created_at=excluded.created_at",
                 (predictor_id, target_id, int(bet), str(choice), utcnow_iso()),
             )
+            self._notify(con, "prediction", target_id)
             con.commit()
+        if old:
+            self._pool_adjust(target_id, str(old["choice"]), -int(old["bet"]))
+        self._pool_adjust(target_id, str(choice), int(bet))
 
     def delete_prediction(self, predictor_id: int, target_id: int) -> sqlite3.Row | None:
         """Supprime une prédiction et renvoie la ligne supprimée (pour rembourser si besoin)."""
@@ -483,8 +1389,24 @@ class Database:
                     "DELETE FROM predictions WHERE predictor_id=? AND target_id=?",
                     (predictor_id, target_id),
                 )
+                self._notify(con, "prediction", target_id)
             con.commit()
-            return row
+        if row:
+            self._pool_adjust(target_id, str(row["choice"]), -int(row["bet"]))
+        return row
+
+    def prediction_pool(self, target_id: int) -> tuple[int, int]:
+        """Retourne (pool_win, pool_lose) en attente sur target_id."""
+        if self._pred_pools is not None:
+            pool = self._pred_pools.get(int(target_id))
+            return (pool[0], pool[1]) if pool else (0, 0)
+        row = self.fetchone(
+            "SELECT COALESCE(SUM(CASE WHEN choice='win' THEN bet END), 0) AS w, "
+            "COALESCE(SUM(CASE WHEN choice='lose' THEN bet END), 0) AS l "
+            "FROM predictions WHERE target_id=?",
+            (int(target_id),),
+        )
+        return (int(row["w"]), int(row["l"])) if row else (0, 0)
 
     def list_predictions_for_user(self, user_id: int) -> list[sqlite3.Row]:
         return self.fetchall(
@@ -498,79 +1420,219 @@ class Database:
             (user_id, user_id, int(limit)),
         )
 
+    def has_pending_predictions(self, target_id: int) -> bool:
+        """True si target_id a (peut-être) un pool de prédictions en attente."""
+        if self._pred_pools is None:
+            return True
+        return int(target_id) in self._pred_pools
+
     def _resolve_predictions_for_target(self, con: sqlite3.Connection, target_id: int, target_result: str) -> None:
-        """Résout toutes les prédictions en attente concernant target_id.
+        """Règle le pool de prédictions (pari mutuel) concernant target_id.
 
         Règle:
-          - Le predictor mise X (déjà retiré à la création = escrow).
-          - Si la prédiction est correcte: le predictor récupère son escrow (X) + prend X au target (si possible).
-          - Si incorrecte: l'escrow (X) est donné au target.
+          - Chaque predictor mise X (déjà retiré à la création = escrow).
+          - Les mises gagnantes se partagent tout le pool au prorata:
+            payout = X * pool_total // pool_gagnant (l'arrondi reste à la banque).
+          - Si personne n'a le bon résultat, tout le monde est remboursé.
+
+        Nombre de requêtes constant, quel que soit le nombre de predictors.
         """
-        pending = con.execute(
-            "SELECT * FROM predictions WHERE target_id=?",
-            (target_id,),
-        ).fetchall()
-        if not pending:
+        target_id = int(target_id)
+        row = con.execute(
+            "SELECT COALESCE(SUM(CASE WHEN choice=? THEN bet END), 0) AS win_pool, "
+            "COALESCE(SUM(bet), 0) AS total, COUNT(*) AS n "
+            "FROM predictions WHERE target_id=?",
+            (target_result, target_id),
+        ).fetchone()
+        if not row or int(row["n"]) == 0:
+            self._pool_drop(target_id)
             return
 
-        # solde actuel du target (on le met à jour au fil des transferts)
-        target_row = con.execute("SELECT balance FROM users WHERE user_id=?", (target_id,)).fetchone()
-        target_balance = int(target_row["balance"]) if target_row else 0
-
-        for p in pending:
-            predictor_id = int(p["predictor_id"])
-            bet = int(p["bet"])
-            choice = str(p["choice"]).lower()
+        params = {
+            "target": target_id,
+            "result": target_result,
+            "win_pool": int(row["win_pool"]),
+            "total": int(row["total"]),
+            "now": utcnow_iso(),
+        }
+        payout = (
+            "CASE WHEN :win_pool = 0 THEN p.bet "
+            "WHEN p.choice = :result THEN p.bet * :total / :win_pool ELSE 0 END"
+        )
 
-            # Always ensure predictor exists
-            con.execute(
-                "INSERT OR IGNORE INTO users (user_id, balance, created_at) VALUES (?, ?, ?)",
-                (predictor_id, 0, utcnow_iso()),
-            )
+        con.execute(
+            "INSERT INTO prediction_logs (predictor_id, target_id, bet, choice, result, paid_from_target, payout, created_at, resolved_at) "
+            f"SELECT p.predictor_id, p.target_id, p.bet, p.choice, :result, 0, {payout}, p.created_at, :now "
+            "FROM predictions p WHERE p.target_id = :target",
+            params,
+        )
+        # Always ensure predictors exist
+        con.execute(
+            "INSERT OR IGNORE INTO users (user_id, balance, created_at) "
+            "SELECT predictor_id, 0, :now FROM predictions WHERE target_id = :target",
+            params,
+        )
+        ledger = self._ledger_partition(con, int(time.time()))
+        con.execute(
+            f"INSERT INTO {ledger} (ts, user_id, delta, reason_code, ref_id) "
+            f"SELECT :ts, p.predictor_id, {payout}, "
+            "CASE WHEN :win_pool = 0 THEN :refund ELSE :paid END, p.target_id "
+            "FROM predictions p WHERE p.target_id = :target AND (:win_pool = 0 OR p.choice = :result)",
+            {**params, "ts": int(time.time()), "refund": int(Reason.PREDICTION_REFUND), "paid": int(Reason.PREDICTION_PAYOUT)},
+        )
+        con.execute(
+            f"UPDATE users SET balance = balance + (SELECT {payout} FROM predictions p "
+            "WHERE p.target_id = :target AND p.predictor_id = users.user_id) "
+            "WHERE user_id IN (SELECT predictor_id FROM predictions WHERE target_id = :target "
+            "AND (:win_pool = 0 OR choice = :result))",
+            params,
+        )
+        con.execute("DELETE FROM predictions WHERE target_id = :target", params)
+        # pool local retiré seulement une fois le règlement écrit (un échec le laisse en place)
+        self._pool_drop(target_id)
+        self._notify(con, "prediction", target_id)
 
-            correct = (choice == target_result)
+    def set_user_field(self, user_id: int, field: str, value: Any) -> None:
+        # field must be trusted (internal)
+        self.execute(f"UPDATE users SET {field}=? WHERE user_id=?", (value, user_id))
+        self._drop_profiles(user_id)
+
+    # ---- caches locaux + notifications entre process ----
+    # Topics: guild (guild_id), setting (clé), blacklist / bot_admin (user_id),
+    # prediction (target_id), loan (user_id emprunteur ou prêteur), inventory (user_id),
+    # catalog (version activée). Clé NULL = tout le topic.
+    def _notify(self, con: sqlite3.Connection, topic: str, *keys: Any) -> None:
+        """Journalise une modification (dans la transaction de l'écriture) et invalide le cache local."""
+        now = int(time.time())
+        norm = [None if k is None else str(k) for k in dict.fromkeys(keys)] or [None]
+        con.executemany("INSERT INTO changes (topic, key, ts) VALUES (?, ?, ?)", [(topic, k, now) for k in norm])
+        for k in norm:
+            self._invalidate(topic, k)
+
+    def subscribe(self, topic: str, fn: Callable[[str | None], None]) -> None:
+        """Appelle fn(key) à chaque modification du topic (ce process ou un autre)."""
+        self._subscribers.setdefault(topic, []).append(fn)
+
+    def unsubscribe(self, topic: str, fn: Callable[[str | None], None]) -> None:
+        fns = self._subscribers.get(topic, [])
+        if fn in fns:
+            fns.remove(fn)
+
+    def _invalidate(self, topic: str, key: str | None, con: sqlite3.Connection | None = None) -> None:
+        """con est fourni par poll_changes (modification déjà commitée, relisible)."""
+        self._cache_gen += 1
+        if topic == "prediction":
+            # Pools tenus à jour localement par _pool_adjust; on ne les relit qu'à la relecture du journal
+            if con is not None and self._pred_pools is not None:
+                self._reload_pools(con, None if key is None else int(key))
+        elif topic == "guild":
+            if key is None:
+                self._gates.clear()
+            else:
+                gid = int(key)
+                self._gates.get(shard_of(gid, self.shard_count), {}).pop(gid, None)
+        elif topic == "setting":
+            if key is None:
+                self._settings.clear()
+            else:
+                self._settings.pop(key, None)
+        elif topic == "blacklist":
+            self._blacklist = None
+        elif topic == "bot_admin":
+            self._bot_admins = None
+        elif topic == "inventory":
+            if key is None:
+                self._inventories.clear()
+                self._profiles.clear()
+            else:
+                self._inventories.pop(int(key), None)
+                self._drop_profiles(int(key))
+        self._dispatch(topic, key)
 
-            paid_from_target = 0
-            if correct:
-                # refund escrow
-                con.execute("UPDATE users SET balance = balance + ? WHERE user_id=?", (bet, predictor_id))
+    def _dispatch(self, topic: str, key: str | None) -> None:
+        for fn in self._subscribers.get(topic, ()):
+            try:
+                fn(key)
+            except Exception as e:
+                print(f"⚠️ Invalidation {topic}: {type(e).__name__}: {e}")
+
+    def invalidate_caches(self, con: sqlite3.Connection | None = None) -> None:
+        self._cache_gen += 1
+        self._ledger_tables.clear()  # partitions recréées au besoin (base restaurée)
+        self._gates.clear()
+        self._settings.clear()
+        self._blacklist = None
+        self._bot_admins = None
+        self._inventories.clear()
+        self._profiles.clear()
+        if con is not None and self._pred_pools is not None:
+            self._reload_pools(con, None)
+        for topic in list(self._subscribers):
+            self._dispatch(topic, None)
+
+    def _reload_pools(self, con: sqlite3.Connection, target_id: int | None) -> None:
+        """Relit depuis la base les pools de prédiction (d'une cible, ou tous)."""
+        where, params = ("WHERE target_id=?", (target_id,)) if target_id is not None else ("", ())
+        pools: dict[int, list[int]] = {}
+        for r in con.execute(
+            f"SELECT target_id, choice, SUM(bet) FROM predictions {where} GROUP BY target_id, choice", params
+        ).fetchall():
+            pool = pools.setdefault(int(r[0]), [0, 0])
+            pool[0 if str(r[1]).lower() == "win" else 1] += int(r[2] or 0)
+        if target_id is None:
+            self._pred_pools = pools
+        elif target_id in pools:
+            self._pred_pools[target_id] = pools[target_id]
+        else:
+            self._pred_pools.pop(target_id, None)
 
-                # take bet from target if possible
-                paid_from_target = min(bet, target_balance)
-                if paid_from_target > 0:
-                    con.execute("UPDATE users SET balance = balance - ? WHERE user_id=?", (paid_from_target, target_id))
-                    con.execute("UPDATE users SET balance = balance + ? WHERE user_id=?", (paid_from_target, predictor_id))
-                    target_balance -= paid_from_target
-            else:
-                # give escrow to target
-                con.execute("UPDATE users SET balance = balance + ? WHERE user_id=?", (bet, target_id))
+    def set_shard_count(self, shard_count: int) -> None:
+        shard_count = max(1, int(shard_count))
+        if shard_count != self.shard_count:
+            self.shard_count = shard_count
+            self._gates.clear()  # partitionnement changé
 
-            con.execute(
-                "INSERT INTO prediction_logs (predictor_id, target_id, bet, choice, result, paid_from_target, created_at, resolved_at) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (
-                    predictor_id,
-                    target_id,
-                    bet,
-                    choice,
-                    target_result,
-                    paid_from_target,
-                    str(p["created_at"]),
-                    utcnow_iso(),
-                ),
-            )
+    def drop_shard_cache(self, shard_id: int) -> None:
+        """Oublie les restrictions en cache des serveurs d'un shard (reconnexion du shard)."""
+        self._gates.pop(int(shard_id), None)
 
-        con.execute("DELETE FROM predictions WHERE target_id=?", (target_id,))
+    def poll_changes(self) -> int:
+        """Applique les modifications journalisées depuis le dernier appel (tous process confondus).
 
-    def set_user_field(self, user_id: int, field: str, value: Any) -> None:
-        # field must be trusted (internal)
-        self.execute(f"UPDATE users SET {field}=? WHERE user_id=?", (value, user_id))
+        Au premier appel, ou si le journal a été purgé au-delà de notre position,
+        tous les caches sont vidés. Retourne le nombre de notifications lues.
+        """
+        with self.connect() as con:
+            if self._change_seq is None:
+                self._change_seq = int(con.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0])
+                self.invalidate_caches(con)
+                return 0
+            rows = con.execute(
+                "SELECT seq, topic, key FROM changes WHERE seq > ? ORDER BY seq", (self._change_seq,)
+            ).fetchall()
+            if rows and int(rows[0]["seq"]) > self._change_seq + 1:
+                self.invalidate_caches(con)  # trou: notifications purgées avant d'être lues
+            else:
+                # une seule invalidation par (topic, clé) même si modifiée plusieurs fois
+                for topic, key in dict.fromkeys((str(r["topic"]), r["key"]) for r in rows):
+                    self._invalidate(topic, key, con)
+            if rows:
+                self._change_seq = int(rows[-1]["seq"])
+            if time.monotonic() - self._changes_pruned_at > 60:
+                self._changes_pruned_at = time.monotonic()
+                con.execute("DELETE FROM changes WHERE ts < ?", (int(time.time()) - CHANGES_RETENTION_S,))
+        return len(rows)
 
     def get_setting(self, key: str, default: str | None = None) -> str | None:
-        row = self.fetchone("SELECT value FROM settings WHERE key=?", (key,))
-        if row is None:
-            return default
-        return str(row["value"])
+        if key in self._settings:
+            value = self._settings[key]
+        else:
+            gen = self._cache_gen
+            row = self.fetchone("SELECT value FROM settings WHERE key=?", (key,))
+            value = None if row is None else str(row["value"])
+            if gen == self._cache_gen:
+                self._settings[key] = value
+        return default if value is None else value
 
     def set_setting(self, key: str, value: str | None) -> None:
         with self.connect() as con:
@@ -582,23 +1644,94 @@ class Database:
                     "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
                     (key, value),
                 )
+            self._notify(con, "setting", key)
             con.commit()
 
     def delete_setting(self, key: str) -> bool:
         """Supprime explicitement un setting de la DB. Retourne True si supprimé."""
         with self.connect() as con:
             cur = con.execute("DELETE FROM settings WHERE key=?", (key,))
+            if cur.rowcount > 0:
+                self._notify(con, "setting", key)
             con.commit()
             return cur.rowcount > 0
 
+    # ---- catalogue du shop (versions) ----
+    def catalog_get(self, version: int | None = None) -> sqlite3.Row | None:
+        """Version demandée, sinon la version active (à défaut la plus récente). None si table vide."""
+        with self.connect() as con:
+            if version is None:
+                row = con.execute("SELECT value FROM settings WHERE key=?", (CATALOG_VERSION_KEY,)).fetchone()
+                version = int(row["value"]) if row else None
+            if version is None:
+                return con.execute("SELECT * FROM shop_catalog ORDER BY version DESC LIMIT 1").fetchone()
+            return con.execute("SELECT * FROM shop_catalog WHERE version=?", (int(version),)).fetchone()
+
+    def _catalog_set_active(self, con: sqlite3.Connection, version: int) -> None:
+        con.execute(
+            "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+            (CATALOG_VERSION_KEY, str(int(version))),
+        )
+        self._notify(con, "setting", CATALOG_VERSION_KEY)
+        self._notify(con, "catalog", version)
+
+    def catalog_publish(self, items_json: str, note: str | None = None, created_by: int | None = None) -> int:
+        """Enregistre une nouvelle version et l'active (même transaction). Retourne son numéro."""
+        with self.connect() as con:
+            cur = con.execute(
+                "INSERT INTO shop_catalog (items_json, note, created_by, created_at) VALUES (?, ?, ?, ?)",
+                (items_json, note, created_by, datetime.now(timezone.utc).isoformat()),
+            )
+            version = int(cur.lastrowid)
+            self._catalog_set_active(con, version)
+            con.commit()
+            return version
+
+    def catalog_activate(self, version: int) -> bool:
+        """Réactive une version existante (retour arrière). False si elle n'existe pas."""
+        with self.connect() as con:
+            if con.execute("SELECT 1 FROM shop_catalog WHERE version=?", (int(version),)).fetchone() is None:
+                return False
+            self._catalog_set_active(con, int(version))
+            con.commit()
+            return True
+
+    def catalog_versions(self, limit: int = 10) -> list[sqlite3.Row]:
+        """Dernières versions (sans le JSON), la plus récente en premier."""
+        with self.connect() as con:
+            return con.execute(
+                "SELECT version, note, created_by, created_at, length(items_json) AS size "
+                "FROM shop_catalog ORDER BY version DESC LIMIT ?",
+                (int(limit),),
+            ).fetchall()
+
     # ---- inventory / boosts ----
     # ===== Channel gating (allowed channels + bypass users) =====
+    def guild_gate(self, guild_id: int) -> GuildGate:
+        """Restrictions d'un serveur, en cache (partitionné par shard) jusqu'à la prochaine modification."""
+        gid = int(guild_id)
+        shard = self._gates.setdefault(shard_of(gid, self.shard_count), {})
+        gate = shard.get(gid)
+        if gate is not None:
+            return gate
+        gen = self._cache_gen
+        with self.connect() as con:
+            gate = GuildGate(
+                frozenset(int(r[0]) for r in con.execute("SELECT channel_id FROM allowed_channels WHERE guild_id=?", (gid,))),
+                frozenset(int(r[0]) for r in con.execute("SELECT category_id FROM allowed_categories WHERE guild_id=?", (gid,))),
+                frozenset(int(r[0]) for r in con.execute("SELECT user_id FROM bypass_users WHERE guild_id=?", (gid,))),
+            )
+        if gen == self._cache_gen:
+            shard[gid] = gate
+        return gate
+
     def add_allowed_channel(self, guild_id: int, channel_id: int) -> None:
         with self.connect() as con:
             con.execute(
                 "INSERT OR IGNORE INTO allowed_channels (guild_id, channel_id) VALUES (?, ?)",
                 (int(guild_id), int(channel_id)),
             )
+            self._notify(con, "guild", guild_id)
 
     def remove_allowed_channel(self, guild_id: int, channel_id: int) -> None:
         with self.connect() as con:
@@ -606,14 +1739,10 @@ class Database:
                 "DELETE FROM allowed_channels WHERE guild_id=? AND channel_id=?",
                 (int(guild_id), int(channel_id)),
             )
+            self._notify(con, "guild", guild_id)
 
     def list_allowed_channels(self, guild_id: int) -> list[int]:
-        with self.connect() as con:
-            rows = con.execute(
-                "SELECT channel_id FROM allowed_channels WHERE guild_id=? ORDER BY channel_id ASC",
-                (int(guild_id),),
-            ).fetchall()
-        return [int(r[0]) for r in rows]
+        return sorted(self.guild_gate(guild_id).channels)
 
 
     def clear_allowed_channels(self, guild_id: int) -> None:
@@ -623,12 +1752,13 @@ class Database:
                 "DELETE FROM allowed_channels WHERE guild_id=?",
                 (int(guild_id),),
             )
+            self._notify(con, "guild", guild_id)
 
     def is_channel_allowed(self, guild_id: int, channel_id: int) -> bool:
-        allowed = self.list_allowed_channels(guild_id)
+        allowed = self.guild_gate(guild_id).channels
         if not allowed:
             return True  # aucune restriction configurée
-        return int(channel_id) in set(allowed)
+        return int(channel_id) in allowed
 
     # ---- allowed categories ----
     def add_allowed_category(self, guild_id: int, category_id: int) -> None:
@@ -637,6 +1767,7 @@ class Database:
                 "INSERT OR IGNORE INTO allowed_categories (guild_id, category_id) VALUES (?, ?)",
                 (int(guild_id), int(category_id)),
             )
+            self._notify(con, "guild", guild_id)
 
     def remove_allowed_category(self, guild_id: int, category_id: int) -> None:
         with self.connect() as con:
@@ -644,14 +1775,10 @@ class Database:
                 "DELETE FROM allowed_categories WHERE guild_id=? AND category_id=?",
                 (int(guild_id), int(category_id)),
             )
+            self._notify(con, "guild", guild_id)
 
     def list_allowed_categories(self, guild_id: int) -> list[int]:
-        with self.connect() as con:
-            rows = con.execute(
-                "SELECT category_id FROM allowed_categories WHERE guild_id=? ORDER BY category_id ASC",
-                (int(guild_id),),
-            ).fetchall()
-        return [int(r[0]) for r in rows]
+        return sorted(self.guild_gate(guild_id).categories)
 
     def clear_allowed_categories(self, guild_id: int) -> None:
         """Supprime la whitelist de catégories pour un serveur."""
@@ -660,12 +1787,13 @@ class Database:
                 "DELETE FROM allowed_categories WHERE guild_id=?",
                 (int(guild_id),),
             )
+            self._notify(con, "guild", guild_id)
 
     def is_category_allowed(self, guild_id: int, category_id: int) -> bool:
-        allowed = self.list_allowed_categories(guild_id)
+        allowed = self.guild_gate(guild_id).categories
         if not allowed:
             return True  # aucune restriction configurée
-        return int(category_id) in set(allowed)
+        return int(category_id) in allowed
 
     def add_bypass_user(self, guild_id: int, user_id: int) -> None:
         with self.connect() as con:
@@ -673,6 +1801,7 @@ class Database:
                 "INSERT OR IGNORE INTO bypass_users (guild_id, user_id) VALUES (?, ?)",
                 (int(guild_id), int(user_id)),
             )
+            self._notify(con, "guild", guild_id)
 
     def remove_bypass_user(self, guild_id: int, user_id: int) -> None:
         with self.connect() as con:
@@ -680,35 +1809,41 @@ class Database:
                 "DELETE FROM bypass_users WHERE guild_id=? AND user_id=?",
                 (int(guild_id), int(user_id)),
             )
+            self._notify(con, "guild", guild_id)
 
     def list_bypass_users(self, guild_id: int) -> list[int]:
-        with self.connect() as con:
-            rows = con.execute(
-                "SELECT user_id FROM bypass_users WHERE guild_id=? ORDER BY user_id ASC",
-                (int(guild_id),),
-            ).fetchall()
-        return [int(r[0]) for r in rows]
+        return sorted(self.guild_gate(guild_id).bypass)
 
     def is_bypass_user(self, guild_id: int, user_id: int) -> bool:
-        with self.connect() as con:
-            row = con.execute(
-                "SELECT 1 FROM bypass_users WHERE guild_id=? AND user_id=?",
-                (int(guild_id), int(user_id)),
-            ).fetchone()
-        return row is not None
+        return int(user_id) in self.guild_gate(guild_id).bypass
+
 
+    def inventory_cached(self, user_id: int) -> dict[str, int] | None:
+        """Inventaire en cache (copie), None s'il faut le lire en base. Ne touche pas la DB."""
+        inv = self._inventories.get(int(user_id))
+        return None if inv is None else dict(inv)
 
     def get_inventory(self, user_id: int) -> dict[str, int]:
+        inv = self.inventory_cached(user_id)
+        if inv is not None:
+            return inv
+        gen = self._cache_gen
         row = self.fetchone("SELECT inventory_json FROM users WHERE user_id=?", (user_id,))
-        if not row:
-            return {}
         try:
-            return json.loads(row["inventory_json"]) or {}
+            inv = (json.loads(row["inventory_json"]) or {}) if row else {}
         except Exception:
-            return {}
+            inv = {}
+        if row and gen == self._cache_gen:
+            if len(self._inventories) >= INVENTORY_CACHE_MAX:
+                self._inventories.pop(next(iter(self._inventories)), None)
+            self._inventories[int(user_id)] = dict(inv)
+        return inv
 
     def set_inventory(self, user_id: int, inv: dict[str, int]) -> None:
-        self.execute("UPDATE users SET inventory_json=? WHERE user_id=?", (json.dumps(inv), user_id))
+        with self.connect() as con:
+            con.execute("UPDATE users SET inventory_json=? WHERE user_id=?", (json.dumps(inv), user_id))
+            self._notify(con, "inventory", user_id)
+            con.commit()
 
     def get_boosts(self, user_id: int) -> dict[str, Any]:
         row = self.fetchone("SELECT boosts_json FROM users WHERE user_id=?", (user_id,))
@@ -724,7 +1859,14 @@ class Database:
 
     # ---- blacklist ----
     def bl_get(self, user_id: int) -> sqlite3.Row | None:
-        return self.fetchone("SELECT * FROM blacklist WHERE user_id=?", (user_id,))
+        # Table entière en cache: consultée à chaque commande, rarement modifiée
+        bl = self._blacklist
+        if bl is None:
+            gen = self._cache_gen
+            bl = {int(r["user_id"]): r for r in self.fetchall("SELECT * FROM blacklist")}
+            if gen == self._cache_gen:
+                self._blacklist = bl
+        return bl.get(int(user_id))
 
     def bl_add(self, user_id: int, by_id: int, reason: str | None, expires_at: str | None) -> None:
         with self.connect() as con:
@@ -733,28 +1875,45 @@ class Database:
                 "ON CONFLICT(user_id) DO UPDATE SET reason=excluded.reason, by_id=excluded.by_id, created_at=excluded.created_at, expires_at=excluded.expires_at",
                 (user_id, reason, by_id, utcnow_iso(), expires_at),
             )
+            self._notify(con, "blacklist", user_id)
             con.commit()
 
     def bl_remove(self, user_id: int) -> None:
-        self.execute("DELETE FROM blacklist WHERE user_id=?", (user_id,))
+        with self.connect() as con:
+            con.execute("DELETE FROM blacklist WHERE user_id=?", (user_id,))
+            self._notify(con, "blacklist", user_id)
+            con.commit()
 
     def bl_list(self) -> list[sqlite3.Row]:
         return self.fetchall("SELECT * FROM blacklist ORDER BY created_at DESC")
 
     # ---- bot admins ----
+    def _bot_admin_ids(self) -> frozenset[int]:
+        admins = self._bot_admins
+        if admins is None:
+            gen = self._cache_gen
+            admins = frozenset(int(r["user_id"]) for r in self.fetchall("SELECT user_id FROM bot_admins"))
+            if gen == self._cache_gen:
+                self._bot_admins = admins
+        return admins
+
     def is_bot_admin(self, user_id: int) -> bool:
-        row = self.fetchone("SELECT user_id FROM bot_admins WHERE user_id=?", (user_id,))
-        return row is not None
+        return int(user_id) in self._bot_admin_ids()
 
     def add_bot_admin(self, user_id: int) -> None:
-        self.execute("INSERT OR IGNORE INTO bot_admins (user_id) VALUES (?)", (user_id,))
+        with self.connect() as con:
+            con.execute("INSERT OR IGNORE INTO bot_admins (user_id) VALUES (?)", (user_id,))
+            self._notify(con, "bot_admin", user_id)
+            con.commit()
 
     def remove_bot_admin(self, user_id: int) -> None:
-        self.execute("DELETE FROM bot_admins WHERE user_id=?", (user_id,))
+        with self.connect() as con:
+            con.execute("DELETE FROM bot_admins WHERE user_id=?", (user_id,))
+            self._notify(con, "bot_admin", user_id)
+            con.commit()
 
     def list_bot_admins(self) -> list[int]:
-        rows = self.fetchall("SELECT user_id FROM bot_admins")
-        return [int(r["user_id"]) for r in rows]
+        return list(self._bot_admin_ids())
 
 
 # ==========================
@@ -801,9 +1960,9 @@ class Database:
             return 0
         return bal
 
-    def remove_balance(self, user_id: int, amount: int) -> int:
+    def remove_balance(self, user_id: int, amount: int, reason: int = Reason.OTHER, ref_id: int | None = None) -> int:
         """Enlève des coins (clamp à 0) et renvoie le nouveau solde."""
-        self.add_balance(user_id, -abs(int(amount)))
+        self.add_balance(user_id, -abs(int(amount)), reason, ref_id)
         return self.clamp_balance_non_negative(user_id)
 
     def remove_item(self, user_id: int, item_id: str, qty: int) -> int:
@@ -829,18 +1988,27 @@ class Database:
     def loans_count_active_for_user(self, borrower_id: int) -> int:
         """Compte les prêts PENDING/ACTIVE pour un emprunteur (BANQUE + P2P)."""
         row = self.fetchone(
-            "SELECT COUNT(*) AS c FROM loans WHERE borrower_id=? AND status IN ('PENDING','ACTIVE')",
+            "SELECT active_borrowed AS c FROM loan_counters WHERE user_id=?",
             (int(borrower_id),),
         )
         return int(row["c"]) if row else 0
 
     def loans_count_pending_for_lender(self, lender_id: int) -> int:
         row = self.fetchone(
-            "SELECT COUNT(*) AS c FROM loans WHERE lender_id=? AND status='PENDING' AND kind='P2P'",
+            "SELECT pending_lent AS c FROM loan_counters WHERE user_id=?",
             (int(lender_id),),
         )
         return int(row["c"]) if row else 0
 
+    def loans_next_slot(self, borrower_id: int, max_slots: int) -> int | None:
+        """Premier slot libre (1..max_slots) d'un emprunteur, via le masque de loan_counters."""
+        row = self.fetchone("SELECT slots_mask FROM loan_counters WHERE user_id=?", (int(borrower_id),))
+        mask = int(row["slots_mask"]) if row else 0
+        free = ~mask & ((1 << int(max_slots)) - 1)
+        if not free:
+            return None
+        return (free & -free).bit_length()
+
     def loans_create_request(
         self,
         borrower_id: int,
@@ -851,6 +2019,7 @@ class Database:
         *,
         kind: str = "BANK",
         lender_id: int | None = None,
+        slot: int | None = None,
     ) -> int:
         """Crée une demande de prêt (PENDING) et retourne son ID."""
         principal_i = int(principal)
@@ -866,9 +2035,9 @@ class Database:
                     principal, interest_pct,
                     total_due, remaining_due,
                     term_days, status,
-                    note, created_at
+                    note, created_at, slot
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'PENDING', ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'PENDING', ?, ?, ?)
                 """,
                 (
                     str(kind),
@@ -881,8 +2050,10 @@ class Database:
                     int(term_days),
                     note,
                     created_at,
+                    None if slot is None else int(slot),
                 ),
             )
+            self._notify(con, "loan", *(u for u in (borrower_id, lender_id) if u is not None))
             con.commit()
             return int(cur.lastrowid)
 
@@ -896,6 +2067,58 @@ class Database:
             (int(user_id), int(user_id)),
         )
 
+    def loans_open_for_user(self, user_id: int, statuses: Iterable[str] = ("PENDING", "ACTIVE")) -> list[sqlite3.Row]:
+        """Prêts à slot (emprunteur ou prêteur) dans les statuts donnés, par slot."""
+        statuses = [str(s) for s in statuses]
+        marks = ",".join("?" * len(statuses))
+        return self.fetchall(
+            f"SELECT * FROM loans WHERE (borrower_id=? OR lender_id=?) AND status IN ({marks}) AND slot IS NOT NULL "
+            "ORDER BY slot ASC",
+            (int(user_id), int(user_id), *statuses),
+        )
+
+    def loans_history_for_user(self, user_id: int, limit: int = 15) -> list[sqlite3.Row]:
+        """Prêts terminés (remboursés, refusés, annulés), du plus récent au plus ancien."""
+        return self.fetchall(
+            "SELECT * FROM loans WHERE (borrower_id=? OR lender_id=?) AND status IN ('REPAID','REJECTED','CANCELLED') "
+            "ORDER BY loan_id DESC LIMIT ?",
+            (int(user_id), int(user_id), int(limit)),
+        )
+
+    def loans_get_open_by_slot(self, borrower_id: int, slot: int) -> sqlite3.Row | None:
+        return self.fetchone(
+            "SELECT * FROM loans WHERE borrower_id=? AND slot=? AND status IN ('PENDING','ACTIVE')",
+            (int(borrower_id), int(slot)),
+        )
+
+    def loans_get_pending_by_slot(self, user_id: int, slot: int) -> sqlite3.Row | None:
+        """Demande en attente sur ce slot dont l'utilisateur est l'emprunteur ou le prêteur P2P."""
+        return self.fetchone(
+            "SELECT * FROM loans WHERE slot=? AND status='PENDING' AND (borrower_id=? OR (kind='P2P' AND lender_id=?))",
+            (int(slot), int(user_id), int(user_id)),
+        )
+
+    def loans_close(self, loan_id: int, status: str, decided_by: int | None = None) -> None:
+        """Clôt une demande (REJECTED / CANCELLED) et libère son slot."""
+        with self.connect() as con:
+            con.execute(
+                "UPDATE loans SET status=?, approved_at=?, decided_by=COALESCE(?, decided_by), slot=NULL WHERE loan_id=?",
+                (str(status), utcnow_iso(), decided_by, int(loan_id)),
+            )
+            self._notify_loan(con, loan_id)
+            con.commit()
+
+    def loans_activate(self, loan_id: int, total_due: int, due_at: str, decided_by: int) -> None:
+        """Passe une demande acceptée en ACTIVE (montant dû + échéance)."""
+        with self.connect() as con:
+            con.execute(
+                "UPDATE loans SET status='ACTIVE', total_due=?, remaining_due=?, approved_at=?, due_at=?, decided_by=? "
+                "WHERE loan_id=?",
+                (int(total_due), int(total_due), utcnow_iso(), str(due_at), int(decided_by), int(loan_id)),
+            )
+            self._notify_loan(con, loan_id)
+            con.commit()
+
     def loans_set_decision(
         self,
         loan_id: int,
@@ -918,31 +2141,226 @@ class Database:
                 """,
                 (str(status), int(decided_by), approved_at, due_at, int(loan_id)),
             )
+            self._notify_loan(con, loan_id)
             con.commit()
 
     def loans_set_status(self, loan_id: int, status: str) -> None:
-        self.execute("UPDATE loans SET status=? WHERE loan_id=?", (str(status), int(loan_id)))
+        with self.connect() as con:
+            con.execute("UPDATE loans SET status=? WHERE loan_id=?", (str(status), int(loan_id)))
+            self._notify_loan(con, loan_id)
+            con.commit()
+
+    def _notify_loan(self, con: sqlite3.Connection, loan_id: int) -> None:
+        row = con.execute("SELECT borrower_id, lender_id FROM loans WHERE loan_id=?", (int(loan_id),)).fetchone()
+        if row:
+            self._notify(con, "loan", *(u for u in row if u is not None))
 
     def loans_apply_payment(self, loan_id: int, amount: int) -> sqlite3.Row | None:
-        """Déduit un paiement. Renvoie la ligne mise à jour."""
-        loan = self.loans_get(int(loan_id))
-        if not loan:
-            return None
-        remaining = int(loan["remaining_due"])
-        new_remaining = max(0, remaining - int(amount))
-        new_status = "REPAID" if new_remaining == 0 else str(loan["status"])
+        """Déduit un paiement (sans mouvement de KZ). Renvoie la ligne mise à jour."""
         with self.connect() as con:
             con.execute(
-                "UPDATE loans SET remaining_due=?, status=? WHERE loan_id=?",
-                (int(new_remaining), new_status, int(loan_id)),
+                "UPDATE loans SET remaining_due = MAX(0, remaining_due - ?), "
+                "status = CASE WHEN remaining_due - ? <= 0 THEN 'REPAID' ELSE status END, "
+                "slot = CASE WHEN remaining_due - ? <= 0 THEN NULL ELSE slot END "
+                "WHERE loan_id=?",
+                (int(amount), int(amount), int(amount), int(loan_id)),
             )
+            loan = con.execute("SELECT * FROM loans WHERE loan_id=?", (int(loan_id),)).fetchone()
+            if loan:
+                con.execute(
+                    "INSERT INTO loan_payments (loan_id, payer_id, payee_id, amount, remaining_after, source, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, 'adjust', ?)",
+                    (int(loan_id), int(loan["borrower_id"]), loan["lender_id"], int(amount), int(loan["remaining_due"]), utcnow_iso()),
+                )
+                self._notify_loan(con, loan_id)
             con.commit()
-        return self.loans_get(int(loan_id))
+            return loan
+
+    def loans_repay(self, loan_id: int, amount: int) -> dict[str, Any] | None:
+        """Remboursement atomique d'un prêt ACTIVE par son emprunteur.
+
+        Une seule transaction: débit conditionnel de l'emprunteur, crédit du
+        prêteur (P2P), mise à jour remaining_due/status/slot, ligne loan_payments.
+        Retourne None si le prêt n'est pas actif, sinon un dict
+        {paid, remaining, status, insufficient}.
+        """
+        con = self.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            loan = con.execute(
+                "SELECT borrower_id, lender_id, kind, remaining_due FROM loans WHERE loan_id=? AND status='ACTIVE'",
+                (int(loan_id),),
+            ).fetchone()
+            if loan is None:
+                con.rollback()
+                return None
+
+            borrower_id = int(loan["borrower_id"])
+            remaining = int(loan["remaining_due"])
+            pay = max(0, min(int(amount), remaining))
+            debited = con.execute(
+                "UPDATE users SET balance = balance - ? WHERE user_id=? AND balance >= ?",
+                (pay, borrower_id, pay),
+            ).rowcount
+            if not debited:
+                con.rollback()
+                return {"paid": 0, "remaining": remaining, "status": "ACTIVE", "insufficient": True}
+            ledger = [(borrower_id, -pay, Reason.LOAN_REPAY, int(loan_id))]
+
+            lender_id = int(loan["lender_id"]) if loan["kind"] == "P2P" and loan["lender_id"] is not None else None
+            if lender_id is not None:
+                con.execute(
+                    "INSERT OR IGNORE INTO users (user_id, balance, created_at) VALUES (?, 0, ?)",
+                    (lender_id, utcnow_iso()),
+                )
+                con.execute("UPDATE users SET balance = balance + ? WHERE user_id=?", (pay, lender_id))
+                ledger.append((lender_id, pay, Reason.LOAN_REPAY, int(loan_id)))
+            self._ledger_in_con(con, ledger)
+
+            remaining -= pay
+            status = "REPAID" if remaining <= 0 else "ACTIVE"
+            con.execute(
+                "UPDATE loans SET remaining_due=?, status=?, slot=CASE WHEN ?='REPAID' THEN NULL ELSE slot END "
+                "WHERE loan_id=?",
+                (remaining, status, status, int(loan_id)),
+            )
+            con.execute(
+                "INSERT INTO loan_payments (loan_id, payer_id, payee_id, amount, remaining_after, source, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'manual', ?)",
+                (int(loan_id), borrower_id, lender_id, pay, remaining, utcnow_iso()),
+            )
+            self._notify(con, "loan", *(u for u in (borrower_id, lender_id) if u is not None))
+            con.commit()
+            return {"paid": pay, "remaining": remaining, "status": status, "insufficient": False}
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
+
+    def loans_list_payments(self, loan_id: int, limit: int = 20) -> list[sqlite3.Row]:
+        return self.fetchall(
+            "SELECT * FROM loan_payments WHERE loan_id=? ORDER BY id DESC LIMIT ?",
+            (int(loan_id), int(limit)),
+        )
+
+    def loans_list_due(self) -> list[sqlite3.Row]:
+        """(loan_id, due_at) de tous les prêts actifs avec échéance (scan indexé)."""
+        return self.fetchall(
+            "SELECT loan_id, due_at FROM loans WHERE status='ACTIVE' AND due_at IS NOT NULL"
+        )
 
+    def loans_service_overdue(
+        self,
+        now: datetime,
+        penalty_pct: float,
+        period_hours: int,
+        limit: int = 200,
+    ) -> list[dict[str, Any]]:
+        """Traite en une transaction les prêts ACTIVE dont l'échéance est passée.
+
+        Pour chaque prêt (par échéance croissante):
+          - pénalité de retard: +penalty_pct% du restant dû,
+          - prélèvement automatique sur le solde de l'emprunteur (jusqu'à 0),
+          - versement au prêteur si P2P,
+          - remboursé => REPAID + slot libéré, sinon nouvelle échéance dans period_hours.
+
+        Retourne un dict par prêt traité (pour les notifications MP).
+        """
+        stamp = "%Y-%m-%dT%H:%M:%SZ"  # même format que due_at (cf. cogs/loans.py)
+        now_s = now.strftime(stamp)
+        next_due = (now + timedelta(hours=int(period_hours))).strftime(stamp)
+
+        con = self.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            loans = con.execute(
+                "SELECT loan_id, kind, lender_id, borrower_id, remaining_due, total_due, slot, penalties "
+                "FROM loans WHERE status='ACTIVE' AND due_at IS NOT NULL AND due_at <= ? "
+                "ORDER BY due_at LIMIT ?",
+                (now_s, int(limit)),
+            ).fetchall()
+            if not loans:
+                con.rollback()
+                return []
+
+            borrower_ids = sorted({int(l["borrower_id"]) for l in loans})
+            marks = ",".join("?" * len(borrower_ids))
+            balances = {
+                int(r["user_id"]): int(r["balance"])
+                for r in con.execute(f"SELECT user_id, balance FROM users WHERE user_id IN ({marks})", borrower_ids)
+            }
+
+            deltas: dict[int, int] = {}
+            loan_updates: list[tuple] = []
+            payments: list[tuple] = []
+            ledger: list[tuple] = []
+            out: list[dict[str, Any]] = []
+            for l in loans:
+                borrower_id = int(l["borrower_id"])
+                remaining = int(l["remaining_due"])
+                penalty = int(round(remaining * float(penalty_pct) / 100.0))
+                remaining += penalty
+                total = int(l["total_due"]) + penalty
+
+                paid = min(max(0, balances.get(borrower_id, 0)), remaining)
+                balances[borrower_id] = balances.get(borrower_id, 0) - paid
+                remaining -= paid
+                deltas[borrower_id] = deltas.get(borrower_id, 0) - paid
+                lender_id = int(l["lender_id"]) if l["kind"] == "P2P" and l["lender_id"] is not None else None
+                if lender_id is not None and paid:
+                    deltas[lender_id] = deltas.get(lender_id, 0) + paid
+
+                status = "REPAID" if remaining <= 0 else "ACTIVE"
+                if paid:
+                    payments.append((int(l["loan_id"]), borrower_id, lender_id, paid, remaining, now_s))
+                    ledger.append((borrower_id, -paid, Reason.LOAN_AUTO, int(l["loan_id"])))
+                    if lender_id is not None:
+                        ledger.append((lender_id, paid, Reason.LOAN_AUTO, int(l["loan_id"])))
+                loan_updates.append(
+                    (remaining, total, status, status, None if status == "REPAID" else next_due, int(l["loan_id"]))
+                )
+                out.append({
+                    "loan_id": int(l["loan_id"]),
+                    "kind": str(l["kind"]),
+                    "slot": l["slot"],
+                    "borrower_id": borrower_id,
+                    "lender_id": lender_id,
+                    "penalty": penalty,
+                    "paid": paid,
+                    "remaining": remaining,
+                    "status": status,
+                    "next_due": None if status == "REPAID" else next_due,
+                })
+
+            con.executemany(
+                "UPDATE loans SET remaining_due=?, total_due=?, status=?, penalties=penalties+1, "
+                "slot=CASE WHEN ?='REPAID' THEN NULL ELSE slot END, due_at=COALESCE(?, due_at) "
+                "WHERE loan_id=?",
+                loan_updates,
+            )
+            con.executemany(
+                "UPDATE users SET balance = MAX(0, balance + ?) WHERE user_id=?",
+                [(d, uid) for uid, d in deltas.items() if d],
+            )
+            con.executemany(
+                "INSERT INTO loan_payments (loan_id, payer_id, payee_id, amount, remaining_after, source, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'auto', ?)",
+                payments,
+            )
+            self._ledger_in_con(con, ledger)
+            self._notify(con, "loan", *(u for n in out for u in (n["borrower_id"], n["lender_id"]) if u is not None))
+            con.commit()
+            return out
+        except Exception:
+            con.rollback()
+            raise
+        finally:
+            con.close()
 
     def wipe_user(self, user_id: int) -> None:
         """Reset total d’un joueur (KZ, inv, boosts, VIP, immunité, cooldowns, sabotage etc)."""
-        self.set_balance(user_id, 0)
+        self.set_balance(user_id, 0, Reason.WIPE)
         self.set_inventory(user_id, {})
         self.set_boosts(user_id, {})
         safe_fields = [
@@ -965,13 +2383,195 @@ class Database:
     def wipe_all_users(self) -> None:
         """DANGEREUX: wipe tous les utilisateurs."""
         with self.connect() as con:
+            ledger = self._ledger_partition(con, int(time.time()))
+            con.execute(
+                f"INSERT INTO {ledger} (ts, user_id, delta, reason_code, ref_id) "
+                "SELECT ?, user_id, -balance, ?, NULL FROM users WHERE balance <> 0",
+                (int(time.time()), int(Reason.WIPE)),
+            )
             con.execute("UPDATE users SET balance=0, inventory_json='{}', boosts_json='{}', vip_until=NULL, immunity_until=NULL, last_daily=NULL, last_weekly=NULL, last_work=NULL, last_chest=NULL, last_steal=NULL, last_sabotage=NULL, sabotaged_until=NULL")
+            self._notify(con, "inventory")
             try:
                 con.execute("DELETE FROM activity")
             except Exception:
                 pass
             con.commit()
 
+    # ======================================================
+    # Maintenance du fichier (cf. maintenance.py)
+    # ======================================================
+    def file_sizes(self) -> tuple[int, int]:
+        """(taille de la base, taille du -wal) en octets."""
+        size = lambda p: os.path.getsize(p) if os.path.exists(p) else 0
+        return size(self.path), size(self.path + "-wal")
+
+    def storage_stats(self) -> dict[str, int]:
+        with self.connect() as con:
+            one = lambda pragma: int(con.execute(f"PRAGMA {pragma}").fetchone()[0])
+            analyzed = con.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone() is not None
+            return {
+                "page_size": one("page_size"),
+                "page_count": one("page_count"),
+                "freelist_count": one("freelist_count"),
+                "auto_vacuum": one("auto_vacuum"),  # 0 none, 1 full, 2 incremental
+                "analyzed": int(analyzed),
+            }
+
+    def checkpoint(self, mode: str = "TRUNCATE") -> tuple[int, int, int]:
+        """wal_checkpoint(mode). Retourne (busy, pages du wal, pages recopiées)."""
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise ValueError(mode)
+        with self.connect() as con:
+            busy, log, done = con.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+            return int(busy), int(log), int(done)
+
+    def optimize(self, analyze: bool = False) -> None:
+        """PRAGMA optimize (statistiques du planificateur), ou ANALYZE complet."""
+        with self.connect() as con:
+            con.execute("ANALYZE" if analyze else "PRAGMA optimize")
+            con.commit()
+
+    def incremental_vacuum(self, pages: int) -> int:
+        """Rend au système jusqu'à `pages` pages libres. Retourne le nombre de pages libérées."""
+        with self.connect() as con:
+            before = int(con.execute("PRAGMA freelist_count").fetchone()[0])
+            # executescript: execute() ne ferait qu'une étape (une seule page libérée)
+            con.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            return before - int(con.execute("PRAGMA freelist_count").fetchone()[0])
+
+    def enable_incremental_vacuum(self) -> None:
+        """Passe une base existante en auto_vacuum=INCREMENTAL (VACUUM complet, une seule fois)."""
+        con = self.connect()
+        try:
+            con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            con.execute("VACUUM")
+        finally:
+            con.close()
+
+    # ======================================================
+    # Export pour analyse hors ligne (cf. export.py)
+    # ======================================================
+    @contextmanager
+    def read_snapshot(self) -> Iterator[sqlite3.Connection]:
+        """Connexion en lecture seule figée sur un instantané: toutes ses lectures voient le même état.
+
+        En WAL les écritures continuent pendant ce temps; seul le checkpoint ne
+        peut pas recycler le -wal au-delà de l'instantané tant qu'il est ouvert.
+        """
+        con = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        try:
+            con.execute("BEGIN")
+            con.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()  # l'instantané commence à la 1re lecture
+            yield con
+        finally:
+            con.rollback()
+            con.close()
+
+    @staticmethod
+    def export_queries(con: sqlite3.Connection, since_ts: int | None = None) -> list[tuple[str, str, tuple]]:
+        """(nom, requête, paramètres) des données d'économie à exporter, ledger du plus ancien au plus récent.
+
+        since_ts ne filtre que le ledger (les autres tables sont des états courants).
+        """
+        queries: list[tuple[str, str, tuple]] = [
+            (
+                "users",
+                "SELECT user_id, balance, created_at, xp, level, games_played, wins, losses,"
+                " pvp_games, pvp_wins, pvp_losses, pvp_profit, bot_wins, bot_losses,"
+                " vip_until, immunity_until, inventory_json FROM users ORDER BY user_id",
+                (),
+            ),
+            ("game_stats", "SELECT user_id, game, games, wins, losses, profit, updated_at FROM game_stats ORDER BY user_id, game", ()),
+            (
+                "loans",
+                "SELECT loan_id, kind, lender_id, borrower_id, principal, interest_pct, total_due, remaining_due,"
+                " term_days, status, penalties, created_at, approved_at, due_at FROM loans ORDER BY loan_id",
+                (),
+            ),
+            ("loan_payments", "SELECT id, loan_id, payer_id, payee_id, amount, remaining_after, source, created_at FROM loan_payments ORDER BY id", ()),
+            (
+                "prediction_logs",
+                "SELECT id, predictor_id, target_id, bet, choice, result, payout, created_at, resolved_at"
+                " FROM prediction_logs ORDER BY id",
+                (),
+            ),
+        ]
+        parts = sorted(Database._ledger_partitions(con))
+        if since_ts is not None:
+            first = _ledger_table(since_ts)
+            parts = [p for p in parts if p >= first]
+        for part in parts:
+            queries.append(
+                ("ledger", f"SELECT ts, user_id, delta, reason_code, ref_id FROM {part} WHERE ts >= ?", (int(since_ts or 0),))
+            )
+        if not parts:  # aucune partition (ou toutes avant since_ts): fichier vide mais présent, avec ses colonnes
+            queries.append(("ledger", "SELECT 0 AS ts, 0 AS user_id, 0 AS delta, 0 AS reason_code, NULL AS ref_id WHERE 0", ()))
+        return queries
+
+    # ======================================================
+    # Sauvegardes à chaud (API backup de SQLite, cf. backup.py)
+    # ======================================================
+    def backup_to(self, dest_path: str, pages: int = 256, pause: float = 0.01) -> int:
+        """Copie cohérente de la base (WAL compris) vers dest_path, sans arrêter le bot.
+
+        Copie `pages` pages par étape et dort `pause` s entre deux étapes. Si la
+        base est modifiée pendant la copie, SQLite la recommence; après
+        BACKUP_MAX_RESTARTS reprises on copie en une seule étape (en WAL, un
+        lecteur ne bloque pas les écritures). Retourne le nombre de pages copiées.
+        """
+        src = self.connect()
+        dst = sqlite3.connect(dest_path)
+        try:
+            total = 0
+            last = [None, 0]  # [restant à l'étape précédente, reprises]
+
+            def progress(status: int, remaining: int, count: int) -> None:
+                nonlocal total
+                total = count
+                if last[0] is not None and remaining > last[0]:
+                    last[1] += 1
+                    if last[1] >= BACKUP_MAX_RESTARTS:
+                        raise _BackupRestarted
+                last[0] = remaining
+                if remaining and pause > 0:
+                    time.sleep(pause)
+
+            try:
+                src.backup(dst, pages=max(1, int(pages)), progress=progress)
+            except _BackupRestarted:
+                src.backup(dst)
+                total = int(dst.execute("PRAGMA page_count").fetchone()[0])
+            return total
+        finally:
+            dst.close()
+            src.close()
+
+    def restore_from(self, src_path: str) -> None:
+        """Remplace tout le contenu de la base par celui du fichier SQLite src_path.
+
+        Les autres process voient un trou dans `changes` et rechargent tous leurs caches.
+        """
+        src = sqlite3.connect(f"file:{src_path}?mode=ro", uri=True)
+        con = self.connect()
+        try:
+            head = int(con.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0])
+            src.backup(con)
+        finally:
+            src.close()
+            con.close()
+        self._ledger_tables.clear()
+        self.init()  # migrations si l'instantané est plus ancien que le schéma
+        with self.connect() as con:
+            restored = int(con.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0])
+            # saut volontaire de numérotation: trou détecté par poll_changes dans chaque process
+            seq = max(head, restored) + 2
+            con.execute(
+                "INSERT INTO changes (seq, topic, key, ts) VALUES (?, 'restore', NULL, ?)", (seq, int(time.time()))
+            )
+            con.commit()
+            self._change_seq = seq
+            self.invalidate_caches(con)
+
     # ======================================================
     # Game stats (par jeu) — blackjack / coinflip / etc.
     # ======================================================
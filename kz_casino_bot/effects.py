@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Effets des items (/use), par effect_key.
+
+Chaque effet est une fonction enregistrée dans EFFECTS via @effect(...). Une
+clé se terminant par « * » couvre toute une famille (boost_* -> boost_all,
+boost_crash...). Le catalogue (shop_data) refuse les effect_key sans handler,
+et les effets à durée (@effect(..., timed=True)) sans duration_minutes positive.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from .db import Database
+    from .shop_data import ShopItem
+
+
+@dataclass(slots=True)
+class EffectResult:
+    title: str
+    description: str
+    until: datetime | None = None  # fin de l'effet (champ « Expire »)
+    consumed: int = 0  # exemplaires retirés de l'inventaire
+    remaining: int | None = None  # exemplaires restants (si consommés)
+
+
+# (db, user_id, item, quantité, maintenant) -> résultat, ou None s'il n'y a pas assez d'exemplaires
+EffectHandler = Callable[["Database", int, "ShopItem", int, datetime], "EffectResult | None"]
+EFFECTS: dict[str, EffectHandler] = {}
+_TIMED: set[EffectHandler] = set()  # handlers qui prolongent un effet de duration_minutes × quantité
+
+BOOST_NAMES = {
+    "boost_all": "🎯 Chance Globale",
+    "boost_roulette": "🎡 Boost Roulette",
+    "boost_blackjack": "🃏 Boost Blackjack",
+    "boost_crash": "📈 Boost Crash",
+    "boost_steal": "🥷 Boost Vol",
+}
+
+
+def effect(*keys: str, timed: bool = False) -> Callable[[EffectHandler], EffectHandler]:
+    def register(fn: EffectHandler) -> EffectHandler:
+        for key in keys:
+            EFFECTS[key] = fn
+        if timed:
+            _TIMED.add(fn)
+        return fn
+
+    return register
+
+
+def get_effect(effect_key: str) -> EffectHandler | None:
+    fn = EFFECTS.get(effect_key)
+    if fn is None:
+        fn = next((h for k, h in EFFECTS.items() if k.endswith("*") and effect_key.startswith(k[:-1])), None)
+    return fn
+
+
+def is_timed(effect_key: str) -> bool:
+    """L'effet a besoin d'une durée (duration_minutes) pour avoir un sens."""
+    fn = get_effect(effect_key)
+    return fn is not None and fn in _TIMED
+
+
+def _count(qty: int) -> str:
+    return f" (×{qty})" if qty > 1 else ""
+
+
+# Effets à durée: Database.use_timed_item consomme et prolonge en une seule transaction
+@effect("immunity", timed=True)
+def _immunity(db: Database, user_id: int, it: ShopItem, qty: int, now: datetime) -> EffectResult | None:
+    minutes = (it.duration_minutes or 0) * qty
+    res = db.use_timed_item(user_id, it.item_id, qty, it.duration_minutes or 0, "immunity_until", now=now)
+    if res is None:
+        return None
+    return EffectResult(
+        "🛡️ Bouclier activé !" + _count(qty), f"Tu es protégé contre le vol pendant **{minutes} minutes**.", res[0], qty, res[1]
+    )
+
+
+@effect("vip", timed=True)
+def _vip(db: Database, user_id: int, it: ShopItem, qty: int, now: datetime) -> EffectResult | None:
+    minutes = (it.duration_minutes or 0) * qty
+    res = db.use_timed_item(user_id, it.item_id, qty, it.duration_minutes or 0, "vip_until", now=now)
+    if res is None:
+        return None
+    return EffectResult(
+        "👑 VIP activé !" + _count(qty), f"Tu es maintenant VIP pendant **{minutes // (24 * 60)} jours** !", res[0], qty, res[1]
+    )
+
+
+@effect("boost_*", timed=True)
+def _boost(db: Database, user_id: int, it: ShopItem, qty: int, now: datetime) -> EffectResult | None:
+    key = it.effect_key or ""
+    minutes = (it.duration_minutes or 0) * qty
+    res = db.use_timed_item(user_id, it.item_id, qty, it.duration_minutes or 0, "boosts_json", boost_key=key, now=now)
+    if res is None:
+        return None
+    return EffectResult(
+        f"{BOOST_NAMES.get(key, key)} activé !" + _count(qty),
+        f"**{it.name}** est maintenant actif pendant **{minutes} minutes** !",
+        res[0],
+        qty,
+        res[1],
+    )
+
+
+@effect("setprofile")
+def _setprofile_ticket(db: Database, user_id: int, it: ShopItem, qty: int, now: datetime) -> EffectResult | None:
+    # consommé par /profileset banner, pas ici
+    return EffectResult(
+        "🎫 Ticket SetProfile",
+        "Ce ticket te permet de définir une bannière sur ton profil.\n"
+        "Utilise `/profileset banner <url>` pour l'utiliser (le ticket sera consommé automatiquement).",
+    )
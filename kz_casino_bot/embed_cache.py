@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Cache d'embeds « statiques » (aide, pages du shop, /odds help, panel).
+
+Un embed est construit une fois par clé (écran, catégorie, page, ...) puis
+stocké sous forme de dict (Embed.to_dict()); chaque interaction en reçoit un
+clone. Tout le cache est vidé quand un réglage change (/odds set|reset, dans ce
+process ou un autre via la table `changes`) ou quand le catalogue change: la
+version fait partie de la clé, les anciennes entrées ne sont plus jamais lues.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Hashable
+
+import discord
+
+from .metrics import METRICS
+
+
+def _clone(data: dict[str, Any]) -> discord.Embed:
+    # Embed.from_dict garde les références: on copie ce que set_*/add_field modifient
+    copy = {
+        k: [dict(f) for f in v] if k == "fields" else dict(v) if isinstance(v, dict) else v
+        for k, v in data.items()
+    }
+    return discord.Embed.from_dict(copy)
+
+
+class EmbedTemplates:
+    def __init__(self) -> None:
+        self.version = 0
+        self._embeds: dict[tuple, dict[str, Any]] = {}
+        self._options: dict[tuple, tuple[discord.SelectOption, ...]] = {}
+
+    def embed(self, key: tuple[Hashable, ...], build: Callable[[], discord.Embed]) -> discord.Embed:
+        full = (self.version, *key)
+        data = self._embeds.get(full)
+        if data is None:
+            METRICS.inc("kz_cache_requests_total", cache="embeds", result="miss")
+            data = build().to_dict()
+            if full[0] == self.version:
+                self._embeds[full] = data
+        else:
+            METRICS.inc("kz_cache_requests_total", cache="embeds", result="hit")
+        return _clone(data)
+
+    def options(
+        self, key: tuple[Hashable, ...], build: Callable[[], list[discord.SelectOption]]
+    ) -> list[discord.SelectOption]:
+        """Options de menu déroulant (nouvelle liste, options partagées: discord.py ne les modifie pas)."""
+        full = (self.version, *key)
+        opts = self._options.get(full)
+        if opts is None:
+            opts = tuple(build())
+            if full[0] == self.version:
+                self._options[full] = opts
+        return list(opts)
+
+    def invalidate(self, _key: str | None = None) -> None:
+        """Vide tout le cache (signature compatible avec Database.subscribe)."""
+        self.version += 1
+        self._embeds = {}
+        self._options = {}
+
+
+EMBEDS = EmbedTemplates()
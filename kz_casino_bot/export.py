@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Export des données d'économie pour analyse hors ligne (réglages, objectif 1M).
+
+Tout est lu dans un seul instantané en lecture seule (Database.read_snapshot):
+joueurs, stats par jeu, prêts et remboursements, prédictions résolues et
+ledger sont cohérents entre eux, sans bloquer le bot. Chaque requête est lue
+par paquets (fetchmany) et écrite au fil de l'eau en CSV gzip: la mémoire ne
+dépend pas de la taille de la base.
+
+    EXPORT_DIR/economy-YYYYmmdd-HHMMSS/
+        users.csv.gz  game_stats.csv.gz  loans.csv.gz  loan_payments.csv.gz
+        prediction_logs.csv.gz  ledger.csv.gz  manifest.json
+
+Le ledger (toutes partitions, de la plus ancienne à la plus récente) porte en
+plus le nom du motif (colonne reason). manifest.json: colonnes, nombre de
+lignes, instantané, codes motif. Deux exports dans la même seconde prennent un
+suffixe (-1, -2...). On garde les EXPORT_KEEP exports les plus récents.
+
+En ligne de commande (sans le bot): python -m kz_casino_bot.export --days 30
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+import shutil
+import sqlite3
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+from . import config
+from .db import Database, Reason
+from .metrics import METRICS
+
+_NAME_RE = re.compile(r"^economy-(\d{8}-\d{6})(?:-(\d+))?$")
+
+METRICS.describe("kz_exports_total", "counter", "Exports de l'économie (result=ok|error)")
+
+
+@dataclass(frozen=True, slots=True)
+class ExportInfo:
+    name: str
+    path: str
+    rows: dict[str, int]  # lignes par fichier
+    size: int  # octets (compressé, tous fichiers)
+    seconds: float
+
+
+def _batches(cur: sqlite3.Cursor, size: int) -> Iterator[list[tuple]]:
+    while True:
+        rows = cur.fetchmany(size)
+        if not rows:
+            return
+        yield rows
+
+
+def _rotate(directory: str, keep: int) -> None:
+    found = [(m.group(1), int(m.group(2) or 0), n) for n in os.listdir(directory) if (m := _NAME_RE.match(n))]
+    for *_, name in sorted(found, reverse=True)[max(1, keep):]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def _reserve(directory: str) -> tuple[str, str]:
+    """(nom, dossier .part créé) d'un nouvel export; suffixe si un autre export a pris la même seconde."""
+    base = f"economy-{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}"
+    os.makedirs(directory, exist_ok=True)
+    for n in range(1000):
+        name = base if n == 0 else f"{base}-{n}"
+        if os.path.exists(os.path.join(directory, name)):
+            continue
+        try:
+            os.mkdir(os.path.join(directory, name + ".part"))
+        except FileExistsError:  # export concurrent en cours sous ce nom
+            continue
+        return name, os.path.join(directory, name + ".part")
+    raise FileExistsError(base)
+
+
+def export_economy(
+    db: Database, directory: str, *, since_ts: int | None = None, chunk: int = 5000, keep: int = 5
+) -> ExportInfo:
+    """Écrit un export complet dans `directory` (bloquant: via asyncio.to_thread). since_ts borne le ledger."""
+    t = time.perf_counter()
+    name, tmp = _reserve(directory)
+    path = os.path.join(directory, name)
+    reasons = {int(r): r.name for r in Reason}
+    tables: dict[str, dict] = {}
+    try:
+        with db.read_snapshot() as con, ExitStack() as files:
+            snapshot_at = int(time.time())
+            writers: dict[str, Any] = {}  # csv.writer par fichier
+            for table, sql, params in Database.export_queries(con, since_ts):
+                cur = con.execute(sql, params)
+                if table not in writers:
+                    columns = [d[0] for d in cur.description] + (["reason"] if table == "ledger" else [])
+                    f = files.enter_context(
+                        gzip.open(os.path.join(tmp, f"{table}.csv.gz"), "wt", encoding="utf-8", newline="", compresslevel=6)
+                    )
+                    writers[table] = csv.writer(f)
+                    writers[table].writerow(columns)
+                    tables[table] = {"file": f"{table}.csv.gz", "columns": columns, "rows": 0}
+                w = writers[table]
+                for rows in _batches(cur, max(1, int(chunk))):
+                    if table == "ledger":
+                        rows = [(*r, reasons.get(r[3], "")) for r in rows]
+                    w.writerows(rows)
+                    tables[table]["rows"] += len(rows)
+        manifest = {
+            "snapshot_at": snapshot_at,
+            "ledger_since": since_ts,
+            "tables": tables,
+            "reasons": reasons,
+        }
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except Exception:
+        METRICS.inc("kz_exports_total", result="error")
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    METRICS.inc("kz_exports_total", result="ok")
+    _rotate(directory, keep)
+    size = sum(e.stat().st_size for e in os.scandir(path))
+    return ExportInfo(name, path, {k: v["rows"] for k, v in tables.items()}, size, time.perf_counter() - t)
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m kz_casino_bot.export", description="Export CSV gzip de l'économie")
+    ap.add_argument("--db", default=config.DB_PATH, help="base SQLite (défaut: DB_PATH)")
+    ap.add_argument("--out", default=config.EXPORT_DIR, help="dossier des exports (défaut: EXPORT_DIR)")
+    ap.add_argument("--days", type=float, default=None, help="ledger des N derniers jours seulement")
+    ap.add_argument("--chunk", type=int, default=config.EXPORT_CHUNK_ROWS, help="lignes lues par paquet")
+    args = ap.parse_args(argv)
+    since = int(time.time() - args.days * 86400) if args.days else None
+    info = export_economy(Database(args.db), args.out, since_ts=since, chunk=args.chunk, keep=config.EXPORT_KEEP)
+    for table, n in info.rows.items():
+        print(f"{table:16} {n:>12,} lignes")
+    print(f"{info.path} ({info.size / 1e6:.2f} Mo, {info.seconds:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
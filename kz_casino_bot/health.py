@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Serveur HTTP minimal (asyncio) dans la boucle du bot.
+
+Remplace l'ancien keep_alive Flask:
+  - /         : "le bot est en ligne" (pings d'uptime)
+  - /healthz  : JSON gateway / DB / lag de la boucle (503 si dégradé)
+  - /metrics  : format texte Prometheus (voir metrics.py)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+
+from . import config
+from .db import Database
+from .loopmon import LoopMonitor
+from .metrics import METRICS
+
+DB_PROBE_TIMEOUT_S = 2.0
+
+_REASONS = {200: "OK", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+class HealthServer:
+    def __init__(self, db: Database, host: str, port: int, monitor: LoopMonitor | None = None):
+        self.db = db
+        self.host = host
+        self.port = int(port)
+        self.monitor = monitor
+        self.bot = None  # discord Client courant (remplacé à chaque tentative de connexion)
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        print(f"🩺 Health: http://{self.host}:{self.port}/healthz")
+
+    async def close(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # ---------- mesures ----------
+
+    def _db_probe(self) -> float:
+        """Prend (puis relâche) le verrou d'écriture: prouve que la base est inscriptible."""
+        t = time.perf_counter()
+        con = self.db.connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            con.execute("SELECT 1 FROM settings LIMIT 1").fetchone()
+            con.rollback()
+        finally:
+            con.close()
+        return time.perf_counter() - t
+
+    async def snapshot(self) -> dict:
+        try:
+            db_latency = await asyncio.wait_for(asyncio.to_thread(self._db_probe), DB_PROBE_TIMEOUT_S)
+            db_ok = True
+        except Exception:
+            db_latency, db_ok = float("nan"), False
+
+        bot = self.bot
+        ready = bool(bot is not None and bot.is_ready())
+        latency = float(bot.latency) if ready else float("nan")
+        loop = self.monitor.stats() if self.monitor else None
+        lag_last = loop["lag_last"] if loop else 0.0
+        lag_max = loop["lag_max"] if loop else 0.0
+        ok = ready and db_ok and lag_max < config.HEALTH_MAX_LOOP_LAG_S
+        snap = {
+            "status": "ok" if ok else "degraded",
+            "gateway": {"ready": ready, "latency_ms": None if latency != latency else round(latency * 1000, 1)},
+            "db": {"writable": db_ok, "latency_ms": None if not db_ok else round(db_latency * 1000, 2)},
+            "_raw": (ready, latency, db_ok, db_latency, lag_last, lag_max),
+        }
+        if loop:
+            last = loop["last_stall"]
+            snap["loop"] = {
+                "window_s": loop["window_s"],
+                "lag_ms": {k: round(loop[f"lag_{k}"] * 1000, 1) for k in ("last", "p50", "p95", "p99", "max")},
+                "stalls_recent": loop["stalls_recent"],
+                "last_stall": None if last is None else {
+                    "handler": last.handler,
+                    "task": last.task,
+                    "duration_ms": round(last.duration * 1000, 1),
+                    "age_s": round(time.time() - last.ts, 1),
+                },
+            }
+        return snap
+
+    async def _metrics_text(self) -> str:
+        snap = await self.snapshot()
+        ready, latency, db_ok, db_latency, lag_last, lag_max = snap["_raw"]
+        guilds = len(self.bot.guilds) if ready else 0
+        return METRICS.render(
+            {
+                "kz_gateway_ready": float(ready),
+                "kz_gateway_latency_seconds": latency,
+                "kz_guilds": float(guilds),
+                "kz_db_writable": float(db_ok),
+                "kz_db_probe_seconds": db_latency,
+                "kz_loop_lag_seconds": lag_last,
+                "kz_loop_lag_max_seconds": lag_max,
+            }
+        )
+
+    # ---------- HTTP ----------
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5.0)
+            # en-têtes ignorés (GET uniquement, pas de corps)
+            while True:
+                line = await asyncio.wait_for(reader.readline(), 5.0)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            parts = request_line.decode("latin-1").split()
+            method, path = (parts[0], parts[1].split("?", 1)[0]) if len(parts) >= 2 else ("", "")
+
+            if method not in ("GET", "HEAD"):
+                status, ctype, body = 405, "text/plain", "method not allowed\n"
+            elif path == "/":
+                status, ctype, body = 200, "text/plain", "le bot est en ligne"
+            elif path == "/healthz":
+                snap = await self.snapshot()
+                snap.pop("_raw")
+                status = 200 if snap["status"] == "ok" else 503
+                ctype, body = "application/json", json.dumps(snap)
+            elif path == "/metrics":
+                status, ctype, body = 200, "text/plain; version=0.0.4", await self._metrics_text()
+            else:
+                status, ctype, body = 404, "text/plain", "not found\n"
+
+            payload = body.encode("utf-8")
+            head = (
+                f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                f"Content-Type: {ctype}; charset=utf-8\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("latin-1")
+            writer.write(head if method == "HEAD" else head + payload)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
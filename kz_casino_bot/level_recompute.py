@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Recalcul en masse des niveaux stockés (users.level, profile_color).
+
+Quand la courbe d'XP (leveling._xp_table), XP_LEVEL_CAP ou les grades changent,
+les niveaux en base sont périmés. Le job parcourt `users` par user_id croissant,
+par lots: chaque lot est lu, recalculé en un appel (curve().levels) et ses seules
+lignes modifiées réécrites dans une transaction courte
+(Database.recompute_levels_chunk). Aucune récompense n'est versée ni retirée.
+
+- Reprise: le point d'avancement est enregistré avec chaque lot (settings), un
+  redémarrage repart du dernier lot écrit tant que la courbe n'a pas changé.
+- Verrou d'écriture: la taille du lot s'adapte pour que chaque transaction
+  reste sous LEVEL_RECOMPUTE_MAX_LOCK_MS, avec une pause entre deux lots.
+
+Lancé au démarrage par le process principal si la signature de la courbe a
+changé (LEVEL_RECOMPUTE_AUTO), ou à la main avec /xp recompute.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from .db import Database
+from .metrics import METRICS
+
+METRICS.describe("kz_level_recompute_rows_total", "counter", "Joueurs traités par le recalcul des niveaux (result=scanned|changed)")
+
+
+@dataclass(slots=True)
+class RecomputeProgress:
+    scanned: int
+    total: int
+    changed: int
+    chunk: int
+    started: float  # time.monotonic()
+    done: bool = False
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+ProgressCallback = Callable[[RecomputeProgress], Awaitable[None]]
+
+
+class LevelRecompute:
+    def __init__(self, db: Database, cap: int, chunk: int = 500, pause: float = 0.02, max_lock_ms: float = 5.0):
+        self.db = db
+        self.cap = int(cap)
+        self.max_chunk = max(1, int(chunk))
+        self.pause = float(pause)
+        self.max_lock = float(max_lock_ms) / 1000
+        self._lock = asyncio.Lock()  # un seul parcours à la fois dans ce process
+        self.progress: RecomputeProgress | None = None  # dernier état (en cours ou terminé)
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def needed(self) -> bool:
+        needed, _ = await asyncio.to_thread(self.db.level_recompute_state, self.cap)
+        return needed
+
+    async def run(self, *, restart: bool = False, on_progress: ProgressCallback | None = None, every: float = 2.0) -> RecomputeProgress:
+        """Parcourt tous les joueurs (ou reprend). on_progress est appelée au plus toutes les `every` s, et à la fin."""
+        async with self._lock:
+            _, after = await asyncio.to_thread(self.db.level_recompute_state, self.cap)
+            if restart:
+                after = 0
+            total = await asyncio.to_thread(self.db.count_users, after)
+            p = self.progress = RecomputeProgress(0, total, 0, self.max_chunk, time.monotonic())
+            last_report = 0.0
+            cursor: int | None = after
+            while cursor is not None:
+                cursor, scanned, changed, held = await asyncio.to_thread(
+                    self.db.recompute_levels_chunk, cursor, p.chunk, self.cap
+                )
+                p.scanned += scanned
+                p.changed += changed
+                METRICS.inc("kz_level_recompute_rows_total", scanned, result="scanned")
+                METRICS.inc("kz_level_recompute_rows_total", changed, result="changed")
+                # verrou trop long: lots plus petits; large marge: on remonte vers le maximum
+                if held > self.max_lock and p.chunk > 1:
+                    p.chunk = max(1, p.chunk // 2)
+                elif held < self.max_lock / 4 and p.chunk < self.max_chunk:
+                    p.chunk = min(self.max_chunk, p.chunk * 2)
+                if on_progress and cursor is not None and time.monotonic() - last_report >= every:
+                    last_report = time.monotonic()
+                    await on_progress(p)
+                await asyncio.sleep(self.pause)
+            p.done = True
+            if on_progress:
+                await on_progress(p)
+            return p
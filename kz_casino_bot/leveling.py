@@ -7,6 +7,8 @@ Ce module centralise TOUT ce qui touche à la progression:
 - Grades (Débutant → Maître du Casino)
 - Couleurs débloquées par grade
 - Récompenses KZ à chaque niveau + bonus à chaque nouveau grade
+- Courbe précalculée par cap (curve()): niveau par bisect, récompenses par
+  sommes préfixes, levels_for_xps() pour les recalculs en masse
 
 NOTE: La DB stocke aussi `level`, mais on garde le calcul à partir de l'XP
 comme source de vérité pour éviter les incohérences.
@@ -14,8 +16,13 @@ comme source de vérité pour éviter les incohérences.
 
 from __future__ import annotations
 
+import hashlib
+from array import array
+from bisect import bisect_right
 from dataclasses import dataclass
 from functools import lru_cache
+from itertools import repeat
+from typing import Iterable
 
 
 # -----------------
@@ -54,25 +61,18 @@ def _xp_table(cap: int = 100) -> list[int]:
 
 def xp_for_level(level: int, *, cap: int = 100) -> int:
     """XP total requis pour être au niveau `level` (début du niveau)."""
-    cap = level_cap(cap)
-    level = max(1, min(int(level), cap))
-    return _xp_table(cap)[level - 1]
+    c = curve(cap)
+    return c.starts[max(1, min(int(level), c.cap)) - 1]
 
 
 def level_from_xp(xp: int, *, cap: int = 100) -> int:
     """Calcule le niveau à partir de l'XP (capé)."""
-    cap = level_cap(cap)
-    xp = max(0, int(xp))
+    return curve(cap).level(xp)
 
-    # Recherche binaire sur [1..cap]
-    lo, hi = 1, cap
-    while lo < hi:
-        mid = (lo + hi + 1) // 2
-        if xp_for_level(mid, cap=cap) <= xp:
-            lo = mid
-        else:
-            hi = mid - 1
-    return lo
+
+def levels_for_xps(xps: Iterable[int], *, cap: int = 100) -> array:
+    """Niveaux d'une série d'XP en un appel (migrations, recalculs en masse): array('i') de même longueur."""
+    return curve(cap).levels(xps)
 
 
 # -----------------
@@ -117,13 +117,12 @@ def title_for_level(level: int, *, cap: int = 100) -> str:
 
 def xp_progress(xp: int, *, cap: int = 100) -> tuple[int, int, int]:
     """Retourne (level, in_level_xp, needed_in_level_xp)."""
-    cap = level_cap(cap)
+    c = curve(cap)
     xp = max(0, int(xp))
-    lvl = level_from_xp(xp, cap=cap)
-    cur = xp_for_level(lvl, cap=cap)
-    if lvl >= cap:
+    lvl = c.level(xp)
+    if lvl >= c.cap:
         return lvl, 0, 0
-    nxt = xp_for_level(lvl + 1, cap=cap)
+    cur, nxt = c.starts[lvl - 1], c.starts[lvl]
     return lvl, xp - cur, (nxt - cur)
 
 
@@ -158,17 +157,107 @@ def unlocked_profile_colors(level: int, *, cap: int = 100) -> list[str]:
 
 def grade_bonus_between_levels(old_level: int, new_level: int, *, cap: int = 100) -> tuple[int, list[LevelTitle]]:
     """Retourne (bonus_kz_total, grades_débloqués) entre deux niveaux."""
-    cap = level_cap(cap)
-    old_level = max(1, min(int(old_level), cap))
-    new_level = max(1, min(int(new_level), cap))
+    c = curve(cap)
+    old_level = max(1, min(int(old_level), c.cap))
+    new_level = max(1, min(int(new_level), c.cap))
     if new_level <= old_level:
         return 0, []
+    # Débloqué si on franchit son min_level
+    unlocked = [g for g in TITLES if old_level < g.min_level <= new_level]
+    return c.grade_bonus[new_level] - c.grade_bonus[old_level], unlocked
 
-    unlocked: list[LevelTitle] = []
-    bonus = 0
-    for g in TITLES:
-        # Débloqué si on franchit son min_level
-        if old_level < g.min_level <= new_level:
-            unlocked.append(g)
-            bonus += int(g.grade_bonus_kz)
-    return bonus, unlocked
+
+def level_up_rewards(old_level: int, new_level: int, *, cap: int = 100) -> tuple[int, list[LevelTitle]]:
+    """Retourne (KZ total: niveaux franchis + bonus de grade, grades_débloqués), sans boucle sur les niveaux."""
+    c = curve(cap)
+    old_level = max(1, min(int(old_level), c.cap))
+    new_level = max(1, min(int(new_level), c.cap))
+    if new_level <= old_level:
+        return 0, []
+    return c.rewards(old_level, new_level), [g for g in TITLES if old_level < g.min_level <= new_level]
+
+
+def regraded_color(color: str | None, old_level: int, new_level: int, *, cap: int = 100) -> str | None:
+    """Couleur de profil après un changement de niveau hors progression (courbe ou cap modifiés).
+
+    Comme au level up, la couleur « automatique » (aucune, ou celle de l'ancien grade)
+    suit le grade. Une couleur qui n'est plus débloquée (grade perdu, hex sous le cap)
+    revient à celle du nouveau grade. Sinon la couleur est inchangée.
+    """
+    c = curve(cap)
+    old_grade, new_grade = c.grade(old_level), c.grade(new_level)
+    if color is None or color == old_grade.profile_color:
+        return new_grade.profile_color if new_grade is not old_grade else color
+    if color.startswith("#"):
+        return color if new_level >= c.cap else new_grade.profile_color
+    if color in _GRADE_COLORS and color not in c.colors(new_level):
+        return new_grade.profile_color
+    return color
+
+
+_GRADE_COLORS = frozenset(t.profile_color for t in TITLES if t.profile_color)
+
+
+# -----------------
+# Courbe précalculée
+# -----------------
+
+class LevelCurve:
+    """Tables d'une courbe (un cap donné), construites une fois (cf. curve()).
+
+    starts[i]      XP du début du niveau i+1 (croissant: niveau = bisect)
+    kz[L]          somme de kz_per_level(2..L)   -> KZ des niveaux franchis en O(1)
+    grade_bonus[L] somme des bonus des grades dont min_level <= L (hors grade de départ)
+    grade_of[L]    index dans TITLES du grade du niveau L
+    (index 0 inutilisé pour les tables par niveau)
+    signature      empreinte des tables + grades: change avec _xp_table, le cap ou TITLES
+    """
+
+    __slots__ = ("cap", "starts", "kz", "grade_bonus", "grade_of", "signature", "_colors")
+
+    def __init__(self, cap: int):
+        self.cap = cap
+        self.starts = array("q", _xp_table(cap))
+        self.kz = array("q", [0, 0])
+        self.grade_bonus = array("q", [0, 0])
+        self.grade_of = array("b", [0])
+        for lvl in range(1, cap + 1):
+            g = next((i for i, t in enumerate(TITLES) if t.min_level <= lvl <= t.max_level), 0)
+            self.grade_of.append(g)
+            if lvl >= 2:
+                self.kz.append(self.kz[-1] + int(kz_per_level(lvl)))
+                gained = sum(int(t.grade_bonus_kz) for t in TITLES if t.min_level == lvl)
+                self.grade_bonus.append(self.grade_bonus[-1] + gained)
+        h = hashlib.sha256(self.starts.tobytes() + self.grade_of.tobytes())
+        h.update(repr([(t.min_level, t.max_level, t.profile_color) for t in TITLES]).encode())
+        self.signature = f"{cap}-{h.hexdigest()[:16]}"
+        self._colors: dict[int, frozenset[str]] = {}
+
+    def level(self, xp: int) -> int:
+        return bisect_right(self.starts, max(0, int(xp)))
+
+    def levels(self, xps: Iterable[int]) -> array:
+        # bisect_right(starts, x) >= 1 pour x >= 0: les XP négatives sont ramenées à 0
+        return array("i", map(bisect_right, repeat(self.starts), (x if x > 0 else 0 for x in xps)))
+
+    def rewards(self, old_level: int, new_level: int) -> int:
+        """KZ gagnés en passant de old_level à new_level: niveaux franchis + bonus de grade."""
+        if new_level <= old_level:
+            return 0
+        return (self.kz[new_level] - self.kz[old_level]) + (self.grade_bonus[new_level] - self.grade_bonus[old_level])
+
+    def grade(self, level: int) -> LevelTitle:
+        return TITLES[self.grade_of[max(1, min(int(level), self.cap))]]
+
+    def colors(self, level: int) -> frozenset[str]:
+        """Couleurs de grade débloquées au niveau donné (cf. unlocked_profile_colors)."""
+        lvl = max(1, min(int(level), self.cap))
+        got = self._colors.get(lvl)
+        if got is None:
+            got = self._colors[lvl] = frozenset(unlocked_profile_colors(lvl, cap=self.cap))
+        return got
+
+
+@lru_cache(maxsize=8)
+def curve(cap: int | None = 100) -> LevelCurve:
+    return LevelCurve(level_cap(cap))
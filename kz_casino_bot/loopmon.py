@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Surveillance de la boucle asyncio: lag + détection des callbacks bloquants.
+
+- Un battement (coroutine) mesure le retard de la boucle à intervalle fixe.
+- Un thread « chien de garde » remarque quand le battement s'arrête (boucle
+  bloquée par du code synchrone: DB, calcul...) et échantillonne la pile du
+  thread de la boucle PENDANT le blocage. On retrouve ainsi la commande ou le
+  listener fautif (cogs/*.py, on_message, on_voice_state_update, vues de jeux).
+
+Exposé via /healthz, /metrics et la commande admin /loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+
+from .metrics import METRICS
+
+_PKG_DIR = os.path.dirname(os.path.abspath(__file__))
+_ROOT_DIR = os.path.dirname(_PKG_DIR)
+MAX_STACK_SAMPLES = 3
+STACK_DEPTH = 12
+
+METRICS.describe("kz_loop_stalls_total", "counter", "Blocages de la boucle détectés (par handler)")
+METRICS.describe("kz_loop_stall_seconds_total", "counter", "Temps cumulé de boucle bloquée (par handler)")
+
+
+@dataclass(slots=True)
+class Stall:
+    ts: float  # epoch du début (approx.)
+    task: str  # nom de la tâche asyncio en cours
+    handler: str  # frame du bot la plus profonde (fichier:ligne fonction)
+    duration: float = 0.0  # durée du blocage (mise à jour à la reprise)
+    stacks: list[list[str]] = field(default_factory=list)
+    source: str = "watchdog"  # watchdog | asyncio (mode debug)
+
+
+def _is_ours(filename: str) -> bool:
+    return filename.startswith(_PKG_DIR) or filename == os.path.join(_ROOT_DIR, "main.py")
+
+
+def _short(filename: str) -> str:
+    return os.path.relpath(filename, _ROOT_DIR) if filename.startswith(_ROOT_DIR) else os.path.basename(filename)
+
+
+class _AsyncioSlowCallbackHandler(logging.Handler):
+    """Capte les « Executing <...> took X seconds » du mode debug d'asyncio."""
+
+    def __init__(self, monitor: "LoopMonitor"):
+        super().__init__(level=logging.WARNING)
+        self.monitor = monitor
+
+    def emit(self, record: logging.LogRecord) -> None:
+        msg = record.getMessage()
+        if msg.startswith("Executing ") and " took " in msg:
+            try:
+                duration = float(msg.rsplit(" took ", 1)[1].split()[0])
+            except (ValueError, IndexError):
+                duration = 0.0
+            target = msg[len("Executing "):].rsplit(" took ", 1)[0]
+            self.monitor._record(Stall(time.time(), target[:200], "?", duration, source="asyncio"))
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, stall_threshold: float, window: int = 600):
+        self.interval = float(interval)
+        self.stall_threshold = float(stall_threshold)
+        self.lag_samples: collections.deque[float] = collections.deque(maxlen=window)
+        self.stalls: collections.deque[Stall] = collections.deque(maxlen=50)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread: int | None = None
+        self._beat = time.monotonic()
+        self._current: Stall | None = None
+        self._lock = threading.Lock()
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+        self._log_handler: logging.Handler | None = None
+
+    # ---------- cycle de vie ----------
+    def start(self, asyncio_debug: bool = False) -> None:
+        """À appeler depuis la boucle à surveiller."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True).start()
+        if asyncio_debug:
+            self._loop.set_debug(True)
+            self._loop.slow_callback_duration = self.stall_threshold
+            self._log_handler = _AsyncioSlowCallbackHandler(self)
+            logging.getLogger("asyncio").addHandler(self._log_handler)
+        METRICS.gauge("kz_loop_lag_p99_seconds", lambda: self.lag_quantile(0.99), "Lag p99 de la boucle (fenêtre glissante)")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+        if self._log_handler:
+            logging.getLogger("asyncio").removeHandler(self._log_handler)
+
+    # ---------- mesures ----------
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            t = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - t - self.interval)
+            self.lag_samples.append(lag)
+            self._beat = time.monotonic()
+            with self._lock:
+                stall, self._current = self._current, None
+            if stall is not None:
+                stall.duration = lag
+                METRICS.inc("kz_loop_stalls_total", handler=stall.handler)
+                METRICS.inc("kz_loop_stall_seconds_total", lag, handler=stall.handler)
+
+    def _watchdog(self) -> None:
+        while not self._stop.wait(self.stall_threshold / 2):
+            blocked = time.monotonic() - self._beat - self.interval
+            if blocked < self.stall_threshold:
+                continue
+            sample = self._sample_stack()
+            if sample is None:
+                continue
+            task, handler, stack = sample
+            with self._lock:
+                if time.monotonic() - self._beat - self.interval < self.stall_threshold:
+                    continue  # la boucle a repris entre-temps
+                if self._current is None:
+                    self._current = Stall(time.time() - blocked, task, handler)
+                    self._record(self._current)
+                if len(self._current.stacks) < MAX_STACK_SAMPLES:
+                    self._current.stacks.append(stack)
+
+    def _sample_stack(self) -> tuple[str, str, list[str]] | None:
+        frame = sys._current_frames().get(self._loop_thread or 0)
+        if frame is None:
+            return None
+        frames = traceback.extract_stack(frame)
+        handler = "?"
+        for fs in reversed(frames):
+            if _is_ours(fs.filename) and not fs.filename.endswith("loopmon.py"):
+                handler = f"{_short(fs.filename)}:{fs.lineno} {fs.name}"
+                break
+        try:
+            task = asyncio.current_task(self._loop)
+            task_name = task.get_name() if task else "(callback)"
+        except Exception:
+            task_name = "?"
+        stack = [f"{_short(fs.filename)}:{fs.lineno} {fs.name}" for fs in frames[-STACK_DEPTH:]]
+        return task_name, handler, stack
+
+    def _record(self, stall: Stall) -> None:
+        self.stalls.append(stall)
+
+    # ---------- stats ----------
+    def lag_quantile(self, q: float) -> float:
+        data = sorted(self.lag_samples)
+        if not data:
+            return 0.0
+        return data[min(len(data) - 1, int(q * len(data)))]
+
+    def stats(self) -> dict:
+        window_s = self.lag_samples.maxlen * self.interval if self.lag_samples.maxlen else 0
+        horizon = time.time() - window_s
+        recent = [s for s in self.stalls if s.ts >= horizon]
+        by_handler: dict[str, list[float]] = {}
+        for s in self.stalls:
+            agg = by_handler.setdefault(s.handler, [0, 0.0])
+            agg[0] += 1
+            agg[1] += s.duration
+        return {
+            "window_s": window_s,
+            "lag_last": self.lag_samples[-1] if self.lag_samples else 0.0,
+            "lag_p50": self.lag_quantile(0.50),
+            "lag_p95": self.lag_quantile(0.95),
+            "lag_p99": self.lag_quantile(0.99),
+            "lag_max": max(self.lag_samples, default=0.0),
+            "stalls_recent": len(recent),
+            "top_handlers": sorted(by_handler.items(), key=lambda kv: -kv[1][1])[:5],
+            "last_stall": self.stalls[-1] if self.stalls else None,
+        }
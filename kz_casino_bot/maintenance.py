@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Maintenance périodique du fichier SQLite (process principal uniquement).
+
+- WAL: les checkpoints automatiques recyclent le -wal sans jamais le réduire.
+  Au-delà de MAINT_WAL_LIMIT_MB, on lance wal_checkpoint(TRUNCATE) dès que la
+  base est calme (aucune écriture depuis MAINT_QUIET_S), ou tout de suite si
+  le WAL dépasse 4× la limite.
+- Statistiques du planificateur: ANALYZE si jamais fait, puis PRAGMA optimize
+  toutes les MAINT_OPTIMIZE_H heures.
+- Pages libres: vacuum incrémental par petits paquets (MAINT_VACUUM_PAGES) quand
+  elles dépassent MAINT_VACUUM_FREE_PCT % du fichier. Une base créée avant
+  auto_vacuum=INCREMENTAL est convertie une fois (VACUUM complet, en période calme):
+  automatiquement sous convert_max_bytes (MAINT_VACUUM_CONVERT_MAX_MB), au-delà
+  seulement avec MAINT_VACUUM_CONVERT=1, car le VACUUM bloque les écritures.
+
+Tailles exposées dans /metrics (kz_db_size_bytes, kz_db_wal_bytes, kz_db_freelist_pages).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+
+from .db import Database
+from .metrics import METRICS
+
+METRICS.describe("kz_db_maintenance_total", "counter", "Opérations de maintenance SQLite (op, result)")
+METRICS.describe("kz_db_maintenance_seconds_total", "counter", "Durée cumulée des opérations de maintenance (op)")
+
+
+class DbMaintenance:
+    def __init__(
+        self,
+        db: Database,
+        wal_limit_bytes: int,
+        quiet_s: float,
+        optimize_every_s: float,
+        vacuum_free_pct: float,
+        vacuum_pages: int,
+        convert_max_bytes: int = 0,
+        convert_forced: bool = False,
+    ):
+        self.db = db
+        self.wal_limit = int(wal_limit_bytes)
+        self.quiet_s = float(quiet_s)
+        self.optimize_every_s = float(optimize_every_s)
+        self.vacuum_free_pct = float(vacuum_free_pct)
+        self.vacuum_pages = int(vacuum_pages)
+        self.convert_max_bytes = int(convert_max_bytes)
+        self.convert_forced = bool(convert_forced)
+        self._convert_skipped = False  # prévenu une seule fois
+        self._last_optimize = time.monotonic()
+        self._stats: dict[str, int] = {}
+        METRICS.gauge("kz_db_size_bytes", lambda: self.db.file_sizes()[0], "Taille du fichier de la base")
+        METRICS.gauge("kz_db_wal_bytes", lambda: self.db.file_sizes()[1], "Taille du fichier -wal")
+        METRICS.gauge("kz_db_freelist_pages", lambda: self._stats["freelist_count"], "Pages libres (dernier passage)")
+
+    def _quiet(self) -> bool:
+        try:
+            last_write = os.path.getmtime(self.db.path + "-wal")
+        except OSError:
+            return True
+        return time.time() - last_write >= self.quiet_s
+
+    def _timed(self, op: str, fn, *args):
+        t = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception:
+            METRICS.inc("kz_db_maintenance_total", op=op, result="error")
+            raise
+        METRICS.inc("kz_db_maintenance_total", op=op, result="ok")
+        METRICS.inc("kz_db_maintenance_seconds_total", time.perf_counter() - t, op=op)
+        return result
+
+    def step(self) -> list[str]:
+        """Un passage (bloquant). Retourne les opérations effectuées, pour les logs."""
+        done: list[str] = []
+        quiet = self._quiet()
+
+        _, wal = self.db.file_sizes()
+        if wal > self.wal_limit and (quiet or wal > 4 * self.wal_limit):
+            busy, _, _ = self._timed("checkpoint", self.db.checkpoint, "TRUNCATE")
+            done.append(f"checkpoint {wal / 1e6:.1f} Mo" + (" (lecteurs actifs)" if busy else ""))
+
+        self._stats = st = self.db.storage_stats()
+        if not quiet:
+            return done
+
+        if not st["analyzed"]:
+            self._timed("analyze", self.db.optimize, True)
+            self._last_optimize = time.monotonic()
+            done.append("analyze")
+        elif time.monotonic() - self._last_optimize >= self.optimize_every_s:
+            self._timed("optimize", self.db.optimize)
+            self._last_optimize = time.monotonic()
+            done.append("optimize")
+
+        if st["page_count"] and st["freelist_count"] * 100 >= self.vacuum_free_pct * st["page_count"]:
+            if st["auto_vacuum"] == 2:
+                freed = self._timed("incremental_vacuum", self.db.incremental_vacuum, self.vacuum_pages)
+                done.append(f"vacuum incrémental {freed} pages")
+            elif self.convert_forced or self.db.file_sizes()[0] <= self.convert_max_bytes:
+                self._timed("vacuum", self.db.enable_incremental_vacuum)
+                done.append("vacuum (passage en auto_vacuum=INCREMENTAL)")
+            elif not self._convert_skipped:
+                self._convert_skipped = True
+                done.append("vacuum complet ignoré (base trop grande, MAINT_VACUUM_CONVERT=1 pour l'autoriser)")
+            self._stats = self.db.storage_stats()
+        return done
+
+    async def run(self, interval_s: float) -> None:
+        while True:
+            await asyncio.sleep(interval_s)
+            try:
+                done = await asyncio.to_thread(self.step)
+                if done:
+                    print("🧽 Maintenance DB: " + ", ".join(done))
+            except Exception as e:
+                print(f"⚠️ Maintenance DB: {type(e).__name__}: {e}")
@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+"""Moteur de stockage en mémoire (dictionnaires + enregistrements à __slots__).
+
+Même interface que db.Database pour les domaines de repository.Storage
+(joueurs/soldes, stats/XP, prédictions, prêts, settings), sans I/O: sert aux
+tests de charge et aux simulations d'économie. Rien n'est persisté.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Iterable
+
+from . import config
+from .db import Reason, utcnow_iso
+from .leveling import curve, grade_for_level, level_from_xp, level_up_rewards
+
+
+class _Record:
+    """Enregistrement indexable comme un sqlite3.Row (`rec["col"]`, `dict(rec)`)."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key: str) -> Any:
+        return getattr(self, key)
+
+    def keys(self) -> list[str]:
+        return list(self.__slots__)
+
+
+class UserRecord(_Record):
+    __slots__ = (
+        "user_id", "balance", "created_at", "xp", "level", "games_played", "wins", "losses",
+        "last_daily", "last_weekly", "last_work", "last_chest", "last_steal", "last_sabotage",
+        "sabotaged_until", "vip_until", "immunity_until", "inventory_json", "boosts_json",
+        "profile_banner", "profile_bio", "profile_color", "profile_frame",
+        "pvp_games", "pvp_wins", "pvp_losses", "pvp_profit", "bot_wins", "bot_losses",
+    )
+
+    def __init__(self, user_id: int, balance: int):
+        for name in self.__slots__:
+            setattr(self, name, None)
+        self.user_id = user_id
+        self.balance = balance
+        self.created_at = utcnow_iso()
+        self.level = 1
+        for name in ("xp", "games_played", "wins", "losses", "pvp_games", "pvp_wins", "pvp_losses",
+                     "pvp_profit", "bot_wins", "bot_losses"):
+            setattr(self, name, 0)
+        self.inventory_json = "{}"
+        self.boosts_json = "{}"
+
+
+class LoanRecord(_Record):
+    __slots__ = (
+        "loan_id", "kind", "lender_id", "borrower_id", "principal", "interest_pct", "total_due",
+        "remaining_due", "term_days", "status", "note", "created_at", "approved_at", "due_at",
+        "decided_by", "slot", "penalties",
+    )
+
+    def __init__(self, **values: Any):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+        if self.penalties is None:
+            self.penalties = 0
+
+
+class PredictionRecord(_Record):
+    __slots__ = ("predictor_id", "target_id", "bet", "choice", "created_at")
+
+    def __init__(self, predictor_id: int, target_id: int, bet: int, choice: str, created_at: str):
+        self.predictor_id, self.target_id, self.bet, self.choice, self.created_at = (
+            predictor_id, target_id, bet, choice, created_at
+        )
+
+
+class _Row(_Record):
+    """Ligne de journal (prediction_logs, loan_payments) construite à partir d'un dict."""
+
+    __slots__ = ("_d",)
+
+    def __init__(self, **values: Any):
+        self._d = values
+
+    def __getitem__(self, key: str) -> Any:
+        return self._d[key]
+
+    def keys(self) -> list[str]:
+        return list(self._d)
+
+
+class MemoryDatabase:
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self.users: dict[int, UserRecord] = {}
+        self.settings: dict[str, str] = {}
+        self.game_stats: dict[tuple[int, str], dict[str, int]] = {}
+        self.predictions: dict[tuple[int, int], PredictionRecord] = {}
+        self.prediction_logs: list[_Row] = []
+        self.loans: dict[int, LoanRecord] = {}
+        self.loan_payments: list[_Row] = []
+        # (ts, user_id, delta, reason_code, ref_id), comme les partitions ledger_YYYYMM
+        self.ledger: list[tuple[int, int, int, int, int | None]] = []
+
+    def init(self) -> None:
+        pass
+
+    def _ledger(self, user_id: int, delta: int, reason: int, ref_id: int | None = None) -> None:
+        if delta:
+            self.ledger.append((int(time.time()), int(user_id), int(delta), int(reason), ref_id))
+
+    # ---------- joueurs / soldes ----------
+    def ensure_user(self, user_id: int, start_balance: int) -> None:
+        with self._lock:
+            if int(user_id) not in self.users:
+                self.users[int(user_id)] = UserRecord(int(user_id), int(start_balance))
+                self._ledger(user_id, int(start_balance), Reason.START)
+
+    def get_user(self, user_id: int) -> UserRecord | None:
+        return self.users.get(int(user_id))
+
+    def set_user_field(self, user_id: int, field: str, value: Any) -> None:
+        u = self.users.get(int(user_id))
+        if u is not None:
+            setattr(u, field, value)
+
+    def set_balance(self, user_id: int, new_balance: int, reason: int = Reason.ADMIN, ref_id: int | None = None) -> None:
+        with self._lock:
+            u = self.users.get(int(user_id))
+            if u is not None:
+                new_balance = max(0, int(new_balance))
+                self._ledger(user_id, new_balance - u.balance, reason, ref_id)
+                u.balance = new_balance
+
+    def add_balance(self, user_id: int, delta: int, reason: int = Reason.OTHER, ref_id: int | None = None) -> int:
+        with self._lock:
+            u = self.users.get(int(user_id))
+            if u is None:
+                return max(0, int(delta))
+            new_balance = max(0, u.balance + int(delta))
+            self._ledger(user_id, new_balance - u.balance, reason, ref_id)
+            u.balance = new_balance
+            return new_balance
+
+    def remove_balance(self, user_id: int, amount: int, reason: int = Reason.OTHER, ref_id: int | None = None) -> int:
+        return self.add_balance(user_id, -abs(int(amount)), reason, ref_id)
+
+    def transfer(
+        self,
+        from_id: int,
+        to_id: int,
+        amount: int,
+        tax_pct: float = 0.0,
+        reason: int = Reason.TRANSFER,
+        start_balance: int = 0,
+    ) -> dict[str, Any]:
+        amount = int(amount)
+        tax = int(amount * (float(tax_pct) / 100.0))
+        net = max(0, amount - tax)
+        with self._lock:
+            self.ensure_user(from_id, start_balance)
+            self.ensure_user(to_id, start_balance)
+            src, dst = self.users[int(from_id)], self.users[int(to_id)]
+            ok = src.balance >= amount
+            if ok:
+                src.balance -= amount
+                dst.balance += net
+                self._ledger(from_id, -amount, reason, int(to_id))
+                self._ledger(to_id, net, reason, int(from_id))
+            return {
+                "sent": amount if ok else 0,
+                "net": net if ok else 0,
+                "tax": tax if ok else 0,
+                "from_balance": src.balance,
+                "to_balance": dst.balance,
+                "insufficient": not ok,
+            }
+
+    def top_balances(self, limit: int = 10) -> list[UserRecord]:
+        return sorted(self.users.values(), key=lambda u: -u.balance)[: int(limit)]
+
+    def balance_rank(self, user_id: int) -> int:
+        u = self.users.get(int(user_id))
+        if u is None:
+            return 0
+        return 1 + sum(1 for o in self.users.values() if o.balance > u.balance)
+
+    # ---------- XP / stats ----------
+    def _add_xp_locked(self, u: UserRecord, amount: int) -> tuple[int, int]:
+        cap = int(getattr(config, "XP_LEVEL_CAP", 100))
+        levels = curve(cap)
+        old_level = levels.level(u.xp)
+        prev_color = u.profile_color
+        if amount > 0:
+            u.xp = max(0, u.xp + amount)
+        u.level = levels.level(u.xp)
+        if amount > 0 and u.level > old_level:
+            kz_gain, unlocked = level_up_rewards(old_level, u.level, cap=cap)
+            if kz_gain:
+                new_balance = max(0, u.balance + kz_gain)
+                self._ledger(u.user_id, new_balance - u.balance, Reason.LEVEL_UP, u.level)
+                u.balance = new_balance
+            if unlocked and unlocked[-1].profile_color:
+                old_grade = grade_for_level(old_level, cap=cap)
+                if prev_color is None or (old_grade.profile_color and prev_color == old_grade.profile_color):
+                    u.profile_color = str(unlocked[-1].profile_color)
+        return u.xp, u.level
+
+    def add_xp(self, user_id: int, amount: int) -> tuple[int, int]:
+        with self._lock:
+            u = self.users.get(int(user_id))
+            if u is None:
+                return 0, level_from_xp(0, cap=int(getattr(config, "XP_LEVEL_CAP", 100)))
+            return self._add_xp_locked(u, int(amount))
+
+    def set_xp_level(self, user_id: int, xp: int, level: int, profile_color: str | None = None) -> None:
+        u = self.users.get(int(user_id))
+        if u is not None:
+            u.xp, u.level = int(xp), int(level)
+            if profile_color is not None:
+                u.profile_color = profile_color
+
+    def add_stat(self, user_id: int, wins_delta: int = 0, losses_delta: int = 0, games_delta: int = 0) -> None:
+        with self._lock:
+            u = self.users.get(int(user_id))
+            if u is not None:
+                u.wins += int(wins_delta)
+                u.losses += int(losses_delta)
+                u.games_played += int(games_delta)
+                xp_gain = int(games_delta) * int(getattr(config, "XP_PER_GAME", 25))
+                xp_gain += int(wins_delta) * int(getattr(config, "XP_BONUS_WIN", 25))
+                xp_gain += int(losses_delta) * int(getattr(config, "XP_BONUS_LOSS", 10))
+                if xp_gain > 0:
+                    self._add_xp_locked(u, xp_gain)
+            result = "win" if wins_delta > 0 else "lose" if losses_delta > 0 else None
+            if result:
+                self._resolve_predictions(int(user_id), result)
+
+    def add_game_stat(
+        self, user_id: int, game: str, games_delta: int = 0, wins_delta: int = 0, losses_delta: int = 0, profit_delta: int = 0
+    ) -> None:
+        game = (game or "").strip().lower()
+        if not game:
+            return
+        with self._lock:
+            s = self.game_stats.setdefault((int(user_id), game), {"games": 0, "wins": 0, "losses": 0, "profit": 0})
+            s["games"] += int(games_delta)
+            s["wins"] += int(wins_delta)
+            s["losses"] += int(losses_delta)
+            s["profit"] += int(profit_delta)
+
+    def get_game_stat(self, user_id: int, game: str) -> dict[str, int] | None:
+        s = self.game_stats.get((int(user_id), (game or "").strip().lower()))
+        return dict(s) if s else None
+
+    def get_all_game_stats(self, user_id: int) -> dict[str, dict[str, int]]:
+        return {g: dict(s) for (uid, g), s in sorted(self.game_stats.items()) if uid == int(user_id)}
+
+    # ---------- prédictions ----------
+    def upsert_prediction(self, predictor_id: int, target_id: int, bet: int, choice: str) -> None:
+        key = (int(predictor_id), int(target_id))
+        self.predictions[key] = PredictionRecord(key[0], key[1], int(bet), str(choice), utcnow_iso())
+
+    def delete_prediction(self, predictor_id: int, target_id: int) -> PredictionRecord | None:
+        return self.predictions.pop((int(predictor_id), int(target_id)), None)
+
+    def prediction_pool(self, target_id: int) -> tuple[int, int]:
+        win = lose = 0
+        for p in self.predictions.values():
+            if p.target_id == int(target_id):
+                if p.choice == "win":
+                    win += p.bet
+                elif p.choice == "lose":
+                    lose += p.bet
+        return win, lose
+
+    def has_pending_predictions(self, target_id: int) -> bool:
+        return any(p.target_id == int(target_id) for p in self.predictions.values())
+
+    def list_predictions_for_user(self, user_id: int) -> list[PredictionRecord]:
+        rows = [p for p in self.predictions.values() if int(user_id) in (p.predictor_id, p.target_id)]
+        return sorted(rows, key=lambda p: p.created_at, reverse=True)
+
+    def list_prediction_logs_for_user(self, user_id: int, limit: int = 10) -> list[_Row]:
+        rows = [r for r in reversed(self.prediction_logs) if int(user_id) in (r["predictor_id"], r["target_id"])]
+        return rows[: int(limit)]
+
+    def _resolve_predictions(self, target_id: int, result: str) -> None:
+        """Pari mutuel, mêmes règles que Database._resolve_predictions_for_target."""
+        preds = [p for p in self.predictions.values() if p.target_id == target_id]
+        if not preds:
+            return
+        total = sum(p.bet for p in preds)
+        win_pool = sum(p.bet for p in preds if p.choice == result)
+        now = utcnow_iso()
+        for p in preds:
+            payout = p.bet if win_pool == 0 else (p.bet * total // win_pool if p.choice == result else 0)
+            self.prediction_logs.append(_Row(
+                id=len(self.prediction_logs) + 1, predictor_id=p.predictor_id, target_id=target_id, bet=p.bet,
+                choice=p.choice, result=result, paid_from_target=0, payout=payout, created_at=p.created_at,
+                resolved_at=now,
+            ))
+            if payout:
+                u = self.users.get(p.predictor_id)
+                if u is None:
+                    u = self.users[p.predictor_id] = UserRecord(p.predictor_id, 0)
+                u.balance += payout
+                self._ledger(p.predictor_id, payout, Reason.PREDICTION_REFUND if win_pool == 0 else Reason.PREDICTION_PAYOUT, target_id)
+            del self.predictions[(p.predictor_id, target_id)]
+
+    # ---------- prêts ----------
+    def _loans_of(self, user_id: int) -> list[LoanRecord]:
+        return [l for l in self.loans.values() if int(user_id) in (l.borrower_id, l.lender_id)]
+
+    def loans_count_active_for_user(self, borrower_id: int) -> int:
+        return sum(1 for l in self.loans.values() if l.borrower_id == int(borrower_id) and l.status in ("PENDING", "ACTIVE"))
+
+    def loans_count_pending_for_lender(self, lender_id: int) -> int:
+        return sum(1 for l in self.loans.values() if l.lender_id == int(lender_id) and l.status == "PENDING" and l.kind == "P2P")
+
+    def loans_next_slot(self, borrower_id: int, max_slots: int) -> int | None:
+        used = {
+            l.slot for l in self.loans.values()
+            if l.borrower_id == int(borrower_id) and l.slot is not None and l.status in ("PENDING", "ACTIVE")
+        }
+        return next((s for s in range(1, int(max_slots) + 1) if s not in used), None)
+
+    def loans_create_request(
+        self,
+        borrower_id: int,
+        principal: int,
+        interest_pct: float,
+        term_days: int,
+        note: str | None,
+        *,
+        kind: str = "BANK",
+        lender_id: int | None = None,
+        slot: int | None = None,
+    ) -> int:
+        with self._lock:
+            loan_id = max(self.loans, default=0) + 1
+            total = int(round(int(principal) * (1.0 + float(interest_pct) / 100.0)))
+            self.loans[loan_id] = LoanRecord(
+                loan_id=loan_id, kind=str(kind), lender_id=None if lender_id is None else int(lender_id),
+                borrower_id=int(borrower_id), principal=int(principal), interest_pct=float(interest_pct),
+                total_due=total, remaining_due=total, term_days=int(term_days), status="PENDING", note=note,
+                created_at=utcnow_iso(), slot=None if slot is None else int(slot),
+            )
+            return loan_id
+
+    def loans_get(self, loan_id: int) -> LoanRecord | None:
+        return self.loans.get(int(loan_id))
+
+    def loans_list_for_user(self, user_id: int) -> list[LoanRecord]:
+        return sorted(self._loans_of(user_id), key=lambda l: -l.loan_id)[:50]
+
+    def loans_open_for_user(self, user_id: int, statuses: Iterable[str] = ("PENDING", "ACTIVE")) -> list[LoanRecord]:
+        statuses = set(statuses)
+        rows = [l for l in self._loans_of(user_id) if l.status in statuses and l.slot is not None]
+        return sorted(rows, key=lambda l: l.slot)
+
+    def loans_history_for_user(self, user_id: int, limit: int = 15) -> list[LoanRecord]:
+        rows = [l for l in self._loans_of(user_id) if l.status in ("REPAID", "REJECTED", "CANCELLED")]
+        return sorted(rows, key=lambda l: -l.loan_id)[: int(limit)]
+
+    def loans_get_open_by_slot(self, borrower_id: int, slot: int) -> LoanRecord | None:
+        return next((
+            l for l in self.loans.values()
+            if l.borrower_id == int(borrower_id) and l.slot == int(slot) and l.status in ("PENDING", "ACTIVE")
+        ), None)
+
+    def loans_get_pending_by_slot(self, user_id: int, slot: int) -> LoanRecord | None:
+        uid = int(user_id)
+        return next((
+            l for l in self.loans.values()
+            if l.slot == int(slot) and l.status == "PENDING" and (l.borrower_id == uid or (l.kind == "P2P" and l.lender_id == uid))
+        ), None)
+
+    def loans_close(self, loan_id: int, status: str, decided_by: int | None = None) -> None:
+        l = self.loans.get(int(loan_id))
+        if l is not None:
+            l.status, l.approved_at, l.slot = str(status), utcnow_iso(), None
+            if decided_by is not None:
+                l.decided_by = int(decided_by)
+
+    def loans_activate(self, loan_id: int, total_due: int, due_at: str, decided_by: int) -> None:
+        l = self.loans.get(int(loan_id))
+        if l is not None:
+            l.status, l.total_due, l.remaining_due = "ACTIVE", int(total_due), int(total_due)
+            l.approved_at, l.due_at, l.decided_by = utcnow_iso(), str(due_at), int(decided_by)
+
+    def _pay_loan(self, l: LoanRecord, pay: int, source: str, reason: int, when: str) -> int | None:
+        """Crédite le prêteur P2P, met à jour le prêt et journalise. Retourne le prêteur crédité."""
+        lender_id = l.lender_id if l.kind == "P2P" and l.lender_id is not None else None
+        if lender_id is not None and pay:
+            lender = self.users.get(lender_id)
+            if lender is None:
+                lender = self.users[lender_id] = UserRecord(lender_id, 0)
+            lender.balance += pay
+            self._ledger(lender_id, pay, reason, l.loan_id)
+        l.remaining_due -= pay
+        if l.remaining_due <= 0:
+            l.status, l.slot = "REPAID", None
+        if pay:
+            self.loan_payments.append(_Row(
+                id=len(self.loan_payments) + 1, loan_id=l.loan_id, payer_id=l.borrower_id, payee_id=lender_id,
+                amount=pay, remaining_after=l.remaining_due, source=source, created_at=when,
+            ))
+        return lender_id
+
+    def loans_repay(self, loan_id: int, amount: int) -> dict[str, Any] | None:
+        with self._lock:
+            l = self.loans.get(int(loan_id))
+            if l is None or l.status != "ACTIVE":
+                return None
+            pay = max(0, min(int(amount), l.remaining_due))
+            borrower = self.users.get(l.borrower_id)
+            if borrower is None or borrower.balance < pay:
+                return {"paid": 0, "remaining": l.remaining_due, "status": "ACTIVE", "insufficient": True}
+            borrower.balance -= pay
+            self._ledger(l.borrower_id, -pay, Reason.LOAN_REPAY, l.loan_id)
+            self._pay_loan(l, pay, "manual", Reason.LOAN_REPAY, utcnow_iso())
+            return {"paid": pay, "remaining": l.remaining_due, "status": l.status, "insufficient": False}
+
+    def loans_list_payments(self, loan_id: int, limit: int = 20) -> list[_Row]:
+        return [p for p in reversed(self.loan_payments) if p["loan_id"] == int(loan_id)][: int(limit)]
+
+    def loans_list_due(self) -> list[LoanRecord]:
+        return [l for l in self.loans.values() if l.status == "ACTIVE" and l.due_at is not None]
+
+    def loans_service_overdue(self, now: datetime, penalty_pct: float, period_hours: int, limit: int = 200) -> list[dict[str, Any]]:
+        stamp = "%Y-%m-%dT%H:%M:%SZ"  # même format que due_at (cf. cogs/loans.py)
+        now_s = now.strftime(stamp)
+        next_due = (now + timedelta(hours=int(period_hours))).strftime(stamp)
+        out: list[dict[str, Any]] = []
+        with self._lock:
+            due = sorted(
+                (l for l in self.loans.values() if l.status == "ACTIVE" and l.due_at is not None and l.due_at <= now_s),
+                key=lambda l: l.due_at,
+            )[: int(limit)]
+            for l in due:
+                penalty = int(round(l.remaining_due * float(penalty_pct) / 100.0))
+                l.remaining_due += penalty
+                l.total_due += penalty
+                l.penalties += 1
+                borrower = self.users.get(l.borrower_id)
+                paid = min(max(0, borrower.balance if borrower else 0), l.remaining_due)
+                if paid:
+                    borrower.balance -= paid
+                    self._ledger(l.borrower_id, -paid, Reason.LOAN_AUTO, l.loan_id)
+                slot = l.slot
+                lender_id = self._pay_loan(l, paid, "auto", Reason.LOAN_AUTO, now_s)
+                if l.status == "ACTIVE":
+                    l.due_at = next_due
+                out.append({
+                    "loan_id": l.loan_id, "kind": l.kind, "slot": slot, "borrower_id": l.borrower_id,
+                    "lender_id": lender_id,
+                    "penalty": penalty, "paid": paid, "remaining": l.remaining_due, "status": l.status,
+                    "next_due": None if l.status == "REPAID" else next_due,
+                })
+        return out
+
+    # ---------- settings ----------
+    def get_setting(self, key: str, default: str | None = None) -> str | None:
+        return self.settings.get(key, default)
+
+    def set_setting(self, key: str, value: str | None) -> None:
+        if value is None:
+            self.settings.pop(key, None)
+        else:
+            self.settings[key] = str(value)
+
+    def delete_setting(self, key: str) -> bool:
+        return self.settings.pop(key, None) is not None
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Métriques en mémoire, exposées au format texte Prometheus (/metrics).
+
+Compteurs incrémentés par les cogs (commandes, caches...) et jauges calculées
+au moment du scrape (sessions actives, etc.). Aucune dépendance externe.
+"""
+from __future__ import annotations
+
+import time
+import weakref
+from typing import Callable
+
+Labels = tuple[tuple[str, str], ...]
+# Une jauge renvoie une valeur simple, ou {labels: valeur}
+GaugeFn = Callable[[], "float | dict[Labels, float]"]
+
+
+def _labels(**labels: object) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    esc = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, esc)) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    v = float(v)
+    if v != v:
+        return "NaN"
+    if v in (float("inf"), float("-inf")):
+        return "+Inf" if v > 0 else "-Inf"
+    if v.is_integer():
+        return str(int(v))
+    return repr(v)
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.started = time.time()
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._gauges: dict[str, list[GaugeFn]] = {}
+        self._help: dict[str, tuple[str, str]] = {}
+        self._views: dict[str, weakref.WeakSet] = {}
+        self.gauge("kz_active_games", self._active_views, "Parties interactives en cours")
+        self.gauge("kz_uptime_seconds", lambda: time.time() - self.started, "Uptime du process")
+
+    def describe(self, name: str, kind: str, help_text: str) -> None:
+        self._help.setdefault(name, (kind, help_text))
+
+    def inc(self, name: str, value: float = 1.0, **labels: object) -> None:
+        series = self._counters.setdefault(name, {})
+        key = _labels(**labels)
+        series[key] = series.get(key, 0.0) + value
+
+    def counter(self, name: str, **labels: object) -> float:
+        return self._counters.get(name, {}).get(_labels(**labels), 0.0)
+
+    def gauge(self, name: str, fn: GaugeFn, help_text: str = "") -> None:
+        """Enregistre une jauge évaluée à chaque scrape (plusieurs sources possibles par nom)."""
+        self._gauges.setdefault(name, []).append(fn)
+        if help_text:
+            self.describe(name, "gauge", help_text)
+
+    def remove_gauge(self, name: str, fn: GaugeFn) -> None:
+        fns = self._gauges.get(name, [])
+        if fn in fns:
+            fns.remove(fn)
+
+    def track_view(self, game: str, view) -> None:
+        """Compte une vue de jeu tant qu'elle n'est pas terminée (référence faible)."""
+        self._views.setdefault(game, weakref.WeakSet()).add(view)
+
+    def _active_views(self) -> dict[Labels, float]:
+        return {
+            _labels(game=game): float(sum(1 for v in views if not v.is_finished()))
+            for game, views in self._views.items()
+        }
+
+    def render(self, extra: dict[str, float] | None = None) -> str:
+        lines: list[str] = []
+
+        def head(name: str, default_kind: str) -> None:
+            kind, help_text = self._help.get(name, (default_kind, ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for name, series in sorted(self._counters.items()):
+            head(name, "counter")
+            lines.extend(f"{name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in sorted(series.items()))
+
+        for name, fns in sorted(self._gauges.items()):
+            values: dict[Labels, float] = {}
+            for fn in fns:
+                try:
+                    v = fn()
+                except Exception:
+                    continue
+                if isinstance(v, dict):
+                    values.update(v)
+                else:
+                    values[()] = float(v)
+            if values:
+                head(name, "gauge")
+                lines.extend(f"{name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in sorted(values.items()))
+
+        for name, v in sorted((extra or {}).items()):
+            head(name, "gauge")
+            lines.append(f"{name} {_fmt_value(v)}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+METRICS.describe("kz_commands_total", "counter", "Slash commands exécutées")
+METRICS.describe("kz_command_errors_total", "counter", "Slash commands en erreur")
+METRICS.describe("kz_cache_requests_total", "counter", "Lectures de cache (result=hit|miss)")
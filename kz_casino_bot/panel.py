@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""UI du panel public (/panel).
+
+Importé à la demande par PanelCog: la vue (et le shop qu'elle ouvre) ne pèse
+pas sur l'import de cogs/admin.py au démarrage.
+"""
+from __future__ import annotations
+
+import discord
+
+from . import config
+from .db import Database
+from .embed_cache import EMBEDS
+from .utils import embed_info, embed_neutral
+from .cogs.shop import ShopView
+
+
+def panel_embed(title: str, description: str, gif_url: str | None = None, info: bool = False) -> discord.Embed:
+    e = (embed_info if info else embed_neutral)(title, description)
+    if gif_url:
+        e.set_image(url=gif_url)
+    return e
+
+
+# Pages d'info des boutons (embeds construits une fois, cf. embed_cache)
+_PAGES: dict[str, tuple[str, str]] = {
+    "start": (
+        "🚀 Bien démarrer",
+        (
+            "**1) Crée ton compte** : `/register`\n"
+            "**2) Récupère des KZ** : `/daily`, `/weekly`, `/work` (+ récompenses messages/vocal)\n"
+            "**3) Achète des items** : `/shop` (boutons **Acheter x1/x5**)\n"
+            "**4) Joue** : `/slots`, `/roulette`, `/blackjack`, `/crash`, etc.\n"
+            "**5) PvP** : duels (`/pvp`, `/rps1v1`, `/blackjack1v1`) + actions (`/steal`, `/sabotage`)\n\n"
+            "➡️ Conseil : fais `/help` pour voir toutes les commandes."
+        ),
+    ),
+    "games": (
+        "🎮 Jeux",
+        (
+            "**Miser** : tu peux mettre un nombre, ou `all` / `max` / `tout`.\n\n"
+            "🎰 **Jeux casino** :\n"
+            "• **/slots** — machine à sous\n"
+            "• **/roulette** — rouge/noir/vert/numéro\n"
+            "• **/coinflip** — pile/face\n"
+            "• **/blackjack** — interactif\n"
+            "• **/crash** — cash-out avant le crash\n"
+            "• **/guess** — devine 1-100\n"
+            "• **/chest** — coffre (cooldown)\n\n"
+            "📌 **Prediction** : `/prediction`, `/predictions`, `/prediction_cancel`\n\n"
+            "⚔️ **Duels** : `/pvp`, `/rps1v1`, `/blackjack1v1` (possible contre le bot si activé)\n\n"
+            "➡️ `/help` pour les détails et les cooldowns."
+        ),
+    ),
+    "profile": (
+        "🧑‍🎤 Profil",
+        (
+            "Commandes profil :\n"
+            "• **/profile** — afficher ton profil\n"
+            "• **/profileset banner:<url>** — mettre une image\n"
+            "• **/profileset removebanner** — retirer l'image\n\n"
+            "⚠️ Pour définir une image, il faut l'item **setprofile** dans le shop."
+        ),
+    ),
+    "rules": (
+        "📜 Règles",
+        (
+            "• Respect & fair-play\n"
+            "• Pas de spam / exploit / abuse de bugs\n"
+            "• Pas de multi-comptes pour farmer les KZ\n"
+            "• Les gains/pertes sont automatiques (les décisions du bot font foi)\n"
+            "• En cas de bug : contacte un staff avec un screen\n\n"
+            "Astuce : **/help** pour toutes les commandes."
+        ),
+    ),
+}
+
+
+class PanelView(discord.ui.View):
+    """
+    Panel PUBLIC (visible par tout le monde),
+    mais chaque bouton renvoie un menu EPHEMERAL pour l'utilisateur qui clique.
+    """
+    def __init__(self, db: Database, gif_url: str | None = None):
+        super().__init__(timeout=None)
+        self.db = db
+        self.gif_url = gif_url
+
+    def _page(self, name: str) -> discord.Embed:
+        return EMBEDS.embed(("panel", name, self.gif_url), lambda: panel_embed(*_PAGES[name], self.gif_url, info=True))
+
+    @discord.ui.button(label="🚀 Débuter", style=discord.ButtonStyle.secondary)
+    async def start_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.followup.send(embed=self._page("start"), ephemeral=True)
+
+    @discord.ui.button(label="🛒 Shop", style=discord.ButtonStyle.success)
+    async def shop_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        # Ouvre le shop en ephemeral pour la personne qui clique
+        view = ShopView(self.db, interaction.user.id, start_category=config.SHOP_CATEGORIES[0])
+        await interaction.response.send_message(
+            embed=view.current_embed(interaction.user.id),
+            view=view,
+            ephemeral=True,
+        )
+
+    @discord.ui.button(label="🎮 Jeux", style=discord.ButtonStyle.primary)
+    async def games_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.followup.send(embed=self._page("games"), ephemeral=True)
+
+    @discord.ui.button(label="🧑‍🎤 Profil", style=discord.ButtonStyle.primary)
+    async def profile_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.followup.send(embed=self._page("profile"), ephemeral=True)
+
+    @discord.ui.button(label="📜 Règles", style=discord.ButtonStyle.secondary)
+    async def rules_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.followup.send(embed=self._page("rules"), ephemeral=True)
+
+    @discord.ui.button(label="✖️ Fermer", style=discord.ButtonStyle.danger)
+    async def close_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_message("✅ Menu fermé pour toi.", ephemeral=True)
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""Cartes de profil en PNG (Pillow), pour /profilecard.
+
+Le rendu (render_card) est une fonction pure exécutée dans un pool de process:
+la boucle asyncio ne fait que hacher et lire le cache. Une carte est identifiée
+par le SHA-256 de tout ce qu'elle affiche (CardData + avatar + RENDER_VERSION):
+
+    mémoire (LRU, CARD_CACHE_MEM)  ->  disque (CARD_CACHE_DIR/<hash>.png)  ->  rendu
+
+Un profil inchangé n'est donc jamais redessiné, même après un redémarrage. Les
+durées restantes (VIP, immunité) ne sont pas affichées, seulement l'état actif:
+sinon la carte changerait à chaque seconde. Le module n'importe pas discord
+(chargé dans les process de rendu).
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from functools import partial
+from typing import Awaitable, Callable
+
+from .metrics import METRICS
+
+# À incrémenter quand la mise en page ou CARD_FONT change (invalide tout le cache disque)
+RENDER_VERSION = 1
+
+WIDTH, HEIGHT = 800, 280
+BG = (30, 41, 59)
+PANEL = (15, 23, 42)
+TEXT = (248, 250, 252)
+MUTED = (148, 163, 184)
+
+
+@dataclass(frozen=True, slots=True)
+class CardData:
+    name: str
+    title: str
+    level: int
+    cap: int
+    xp_in_level: int
+    xp_needed: int  # 0 = niveau max
+    balance: int
+    rank: int
+    games: int
+    wins: int
+    losses: int
+    accent: int  # couleur du profil (0xRRGGBB)
+    frame_label: str | None = None
+    frame_color: int | None = None
+    statuses: tuple[str, ...] = ()
+    avatar_key: str | None = None  # identifiant de l'avatar (hash Discord), les octets ne sont pas hachés
+
+    def digest(self) -> str:
+        payload = json.dumps([RENDER_VERSION, asdict(self)], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _rgb(color: int) -> tuple[int, int, int]:
+    return (color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF
+
+
+def _fmt(n: int) -> str:
+    return f"{n:,}".replace(",", " ")
+
+
+# Essayées dans l'ordre si CARD_FONT n'est pas défini (la police intégrée à Pillow n'a pas les accents)
+FALLBACK_FONTS = ("DejaVuSans.ttf", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "Arial.ttf", "arial.ttf")
+
+
+def _font(size: int, path: str | None):
+    from PIL import ImageFont
+
+    for candidate in ((path,) if path else ()) + FALLBACK_FONTS:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1: police bitmap, taille fixe
+        return ImageFont.load_default()
+
+
+def _fit(draw, text: str, font, width: int) -> str:
+    """Tronque text (avec …) pour tenir dans width pixels."""
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+def render_card(data: CardData, avatar: bytes | None = None, font_path: str | None = None) -> bytes:
+    """Dessine la carte et retourne le PNG (bloquant: à lancer dans le pool)."""
+    from PIL import Image, ImageDraw, ImageOps
+
+    accent = _rgb(data.accent)
+    img = Image.new("RGB", (WIDTH, HEIGHT), BG)
+    draw = ImageDraw.Draw(img)
+
+    # cadre: bordure épaisse à la couleur du cadre, sinon liseré à la couleur du profil
+    if data.frame_color is not None:
+        draw.rounded_rectangle((0, 0, WIDTH - 1, HEIGHT - 1), radius=24, outline=_rgb(data.frame_color), width=10)
+    else:
+        draw.rounded_rectangle((0, 0, WIDTH - 1, HEIGHT - 1), radius=24, outline=accent, width=3)
+
+    # avatar rond
+    box = (40, 50, 200, 210)
+    size = box[2] - box[0]
+    draw.ellipse((box[0] - 6, box[1] - 6, box[2] + 6, box[3] + 6), fill=accent)
+    face = None
+    if avatar:
+        try:
+            face = ImageOps.fit(Image.open(io.BytesIO(avatar)).convert("RGB"), (size, size))
+        except Exception:
+            face = None
+    if face is None:
+        face = Image.new("RGB", (size, size), PANEL)
+    mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size - 1, size - 1), fill=255)
+    img.paste(face, box[:2], mask)
+
+    big, mid, small = _font(34, font_path), _font(22, font_path), _font(16, font_path)
+    x, right = 235, WIDTH - 40
+
+    draw.text((x, 36), _fit(draw, data.name, big, right - x), font=big, fill=TEXT)
+    draw.text((x, 84), _fit(draw, f"{data.title} · Niveau {data.level}/{data.cap}", mid, right - x), font=mid, fill=accent)
+
+    # barre d'XP
+    bar = (x, 124, right, 148)
+    draw.rounded_rectangle(bar, radius=12, fill=PANEL)
+    ratio = 1.0 if data.xp_needed <= 0 else max(0.0, min(1.0, data.xp_in_level / max(1, data.xp_needed)))
+    if ratio > 0:
+        draw.rounded_rectangle((bar[0], bar[1], bar[0] + max(24, int((bar[2] - bar[0]) * ratio)), bar[3]), radius=12, fill=accent)
+    xp_text = "MAX" if data.xp_needed <= 0 else f"{_fmt(data.xp_in_level)} / {_fmt(data.xp_needed)} XP"
+    draw.text(((bar[0] + bar[2]) // 2, (bar[1] + bar[3]) // 2), xp_text, font=small, fill=TEXT, anchor="mm")
+
+    # statistiques
+    played = data.wins + data.losses
+    winrate = f"{data.wins * 100 / played:.1f}%" if played else "0.0%"
+    stats = (("Solde", f"{_fmt(data.balance)} KZ"), ("Rang", f"#{data.rank}"), ("Parties", _fmt(data.games)), ("Winrate", winrate))
+    widths = (190, 110, 115, right - x - 415)  # le solde a besoin de place
+    cx = x
+    for (label, value), w in zip(stats, widths):
+        draw.text((cx, 170), label, font=small, fill=MUTED)
+        draw.text((cx, 192), _fit(draw, value, mid, w - 10), font=mid, fill=TEXT)
+        cx += w
+
+    badges = ([data.frame_label] if data.frame_label else []) + list(data.statuses)
+    if badges:
+        draw.text((x, 238), _fit(draw, "  ·  ".join(badges), small, right - x), font=small, fill=MUTED)
+
+    out = io.BytesIO()
+    img.save(out, "PNG", optimize=True)
+    return out.getvalue()
+
+
+METRICS.describe("kz_profile_card_render_seconds_total", "counter", "Temps de rendu cumulé des cartes de profil (pool)")
+
+
+class CardRenderer:
+    """Cache adressé par contenu + pool de process. render() s'appelle depuis la boucle asyncio."""
+
+    def __init__(self, directory: str, workers: int = 2, mem_entries: int = 256, max_files: int = 5000, font_path: str | None = None):
+        self.directory = directory
+        self.workers = max(1, int(workers))
+        self.mem_entries = max(0, int(mem_entries))
+        self.max_files = max(1, int(max_files))
+        self.font_path = font_path
+        self._mem: OrderedDict[str, bytes] = OrderedDict()
+        self._pending: dict[str, asyncio.Future] = {}  # même carte demandée deux fois: un seul rendu
+        self._pool: ProcessPoolExecutor | None = None
+        self._writes = 0
+        self._prune_lock = threading.Lock()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _remember(self, key: str, png: bytes) -> None:
+        if not self.mem_entries:
+            return
+        self._mem[key] = png
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.mem_entries:
+            self._mem.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def _read(self, key: str) -> bytes | None:
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(self._path(key))  # ancienneté = dernier accès (élagage)
+        return data
+
+    def _write(self, key: str, png: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=".part", dir=self.directory)
+        with os.fdopen(fd, "wb") as f:
+            f.write(png)
+        os.replace(tmp, self._path(key))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def _prune(self) -> None:
+        """Garde les max_files cartes les plus récemment servies."""
+        if not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            files = [e for e in os.scandir(self.directory) if e.name.endswith(".png")]
+            if len(files) <= self.max_files:
+                return
+            files.sort(key=lambda e: e.stat().st_mtime)
+            for e in files[: len(files) - self.max_files]:
+                try:
+                    os.remove(e.path)
+                except FileNotFoundError:
+                    pass
+        finally:
+            self._prune_lock.release()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forker le process du bot (threads, connexions SQLite ouvertes) n'est pas sûr
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def _render(self, data: CardData, avatar: bytes | None) -> bytes:
+        loop = asyncio.get_running_loop()
+        job = partial(render_card, data, avatar, self.font_path)
+        pool = self._executor()
+        try:
+            return await loop.run_in_executor(pool, job)
+        except BrokenProcessPool:
+            # worker mort (OOM, crash): nouveau pool, un seul nouvel essai
+            if self._pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            return await loop.run_in_executor(self._executor(), job)
+
+    async def render(self, data: CardData, fetch_avatar: Callable[[], Awaitable[bytes]]) -> bytes:
+        """PNG de la carte. fetch_avatar n'est appelée qu'en cas de rendu (ni en mémoire ni sur disque)."""
+        key = data.digest()
+        png = self._mem.get(key)
+        if png is not None:
+            self._mem.move_to_end(key)
+            METRICS.inc("kz_cache_requests_total", cache="profile_cards", result="hit")
+            return png
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future = loop.create_future()
+        self._pending[key] = fut
+        try:
+            cacheable = True
+            png = await asyncio.to_thread(self._read, key)
+            if png is not None:
+                METRICS.inc("kz_cache_requests_total", cache="profile_cards", result="disk")
+            else:
+                METRICS.inc("kz_cache_requests_total", cache="profile_cards", result="miss")
+                try:
+                    avatar_bytes = await fetch_avatar()
+                except Exception:
+                    avatar_bytes = None  # carte sans avatar plutôt qu'une erreur
+                t = loop.time()
+                png = await self._render(data, avatar_bytes)
+                METRICS.inc("kz_profile_card_render_seconds_total", loop.time() - t)
+                # avatar attendu mais non téléchargé: la clé ne le reflète pas, on ne met pas en cache
+                cacheable = avatar_bytes is not None or data.avatar_key is None
+                if cacheable:
+                    await asyncio.to_thread(self._write, key, png)
+            if cacheable:
+                self._remember(key, png)
+            fut.set_result(png)
+            return png
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # marquée comme lue s'il n'y a pas d'autre demandeur
+            raise
+        finally:
+            self._pending.pop(key, None)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Interface de stockage utilisée par les cogs, par domaine.
+
+Deux implémentations:
+  - db.Database        : SQLite (production)
+  - memory_db.MemoryDatabase : dictionnaires en mémoire (tests de charge, simulations)
+
+Les lignes renvoyées s'indexent par nom de colonne (`row["balance"]`), qu'il
+s'agisse d'un sqlite3.Row ou d'un enregistrement en mémoire.
+"""
+from __future__ import annotations
+
+from typing import Any, Iterable, Protocol, runtime_checkable
+
+from .db import Reason
+
+Row = Any  # sqlite3.Row | memory_db._Record
+
+
+class UserRepository(Protocol):
+    def ensure_user(self, user_id: int, start_balance: int) -> None: ...
+    def get_user(self, user_id: int) -> Row | None: ...
+    def set_user_field(self, user_id: int, field: str, value: Any) -> None: ...
+    def set_balance(self, user_id: int, new_balance: int, reason: int = Reason.ADMIN, ref_id: int | None = None) -> None: ...
+    def add_balance(self, user_id: int, delta: int, reason: int = Reason.OTHER, ref_id: int | None = None) -> int: ...
+    def remove_balance(self, user_id: int, amount: int, reason: int = Reason.OTHER, ref_id: int | None = None) -> int: ...
+    def transfer(
+        self,
+        from_id: int,
+        to_id: int,
+        amount: int,
+        tax_pct: float = 0.0,
+        reason: int = Reason.TRANSFER,
+        start_balance: int = 0,
+    ) -> dict[str, Any]: ...
+    def top_balances(self, limit: int = 10) -> list[Row]: ...
+    def balance_rank(self, user_id: int) -> int: ...
+
+
+class StatsRepository(Protocol):
+    def add_xp(self, user_id: int, amount: int) -> tuple[int, int]: ...
+    def set_xp_level(self, user_id: int, xp: int, level: int, profile_color: str | None = None) -> None: ...
+    def add_stat(self, user_id: int, wins_delta: int = 0, losses_delta: int = 0, games_delta: int = 0) -> None: ...
+    def add_game_stat(
+        self, user_id: int, game: str, games_delta: int = 0, wins_delta: int = 0, losses_delta: int = 0, profit_delta: int = 0
+    ) -> None: ...
+    def get_game_stat(self, user_id: int, game: str) -> dict[str, int] | None: ...
+    def get_all_game_stats(self, user_id: int) -> dict[str, dict[str, int]]: ...
+
+
+class PredictionRepository(Protocol):
+    def upsert_prediction(self, predictor_id: int, target_id: int, bet: int, choice: str) -> None: ...
+    def delete_prediction(self, predictor_id: int, target_id: int) -> Row | None: ...
+    def prediction_pool(self, target_id: int) -> tuple[int, int]: ...
+    def has_pending_predictions(self, target_id: int) -> bool: ...
+    def list_predictions_for_user(self, user_id: int) -> list[Row]: ...
+    def list_prediction_logs_for_user(self, user_id: int, limit: int = 10) -> list[Row]: ...
+
+
+class LoanRepository(Protocol):
+    def loans_count_active_for_user(self, borrower_id: int) -> int: ...
+    def loans_count_pending_for_lender(self, lender_id: int) -> int: ...
+    def loans_next_slot(self, borrower_id: int, max_slots: int) -> int | None: ...
+    def loans_create_request(
+        self,
+        borrower_id: int,
+        principal: int,
+        interest_pct: float,
+        term_days: int,
+        note: str | None,
+        *,
+        kind: str = "BANK",
+        lender_id: int | None = None,
+        slot: int | None = None,
+    ) -> int: ...
+    def loans_get(self, loan_id: int) -> Row | None: ...
+    def loans_list_for_user(self, user_id: int) -> list[Row]: ...
+    def loans_open_for_user(self, user_id: int, statuses: Iterable[str] = ("PENDING", "ACTIVE")) -> list[Row]: ...
+    def loans_history_for_user(self, user_id: int, limit: int = 15) -> list[Row]: ...
+    def loans_get_open_by_slot(self, borrower_id: int, slot: int) -> Row | None: ...
+    def loans_get_pending_by_slot(self, user_id: int, slot: int) -> Row | None: ...
+    def loans_close(self, loan_id: int, status: str, decided_by: int | None = None) -> None: ...
+    def loans_activate(self, loan_id: int, total_due: int, due_at: str, decided_by: int) -> None: ...
+    def loans_repay(self, loan_id: int, amount: int) -> dict[str, Any] | None: ...
+    def loans_list_payments(self, loan_id: int, limit: int = 20) -> list[Row]: ...
+    def loans_list_due(self) -> list[Row]: ...
+    def loans_service_overdue(self, now: Any, penalty_pct: float, period_hours: int, limit: int = 200) -> list[dict[str, Any]]: ...
+
+
+class SettingsRepository(Protocol):
+    def get_setting(self, key: str, default: str | None = None) -> str | None: ...
+    def set_setting(self, key: str, value: str | None) -> None: ...
+    def delete_setting(self, key: str) -> bool: ...
+
+
+@runtime_checkable
+class Storage(UserRepository, StatsRepository, PredictionRepository, LoanRepository, SettingsRepository, Protocol):
+    """Tout ce qu'un moteur doit fournir pour l'économie, les stats, les prêts et les prédictions."""
+
+    def init(self) -> None: ...
@@ -1,8 +1,25 @@
 # -*- coding: utf-8 -*-
+"""Catalogue du shop.
+
+Les items vivent en base (table shop_catalog, une ligne JSON par version publiée,
+cf. /catalog); DEFAULT_ITEMS ne sert qu'à créer la version 1 d'une base neuve.
+La version active est chargée dans un ShopCatalog immuable, remplacé d'un bloc
+(install) au rechargement: une commande en cours garde l'index qu'elle a lu via
+catalog(), les suivantes voient le nouveau. Rien à redémarrer ni à resynchroniser.
+"""
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Literal
+import json
+import re
+import unicodedata
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any, Iterable, Literal
+
+from . import config
+from .effects import get_effect, is_timed
+
+if TYPE_CHECKING:
+    from .db import Database
 
 Rarity = Literal["Common", "Rare", "Epic", "Legendary"]
 Category = Literal["Protection", "VIP", "Boost", "Cosmetics"]
@@ -22,7 +39,8 @@ class ShopItem:
 
 # NOTE:
 # - item_id is the key stored in inventory.
-# - effect_key is used by /use to apply boosts/vip/immunity.
+# - effect_key is used by /use to apply boosts/vip/immunity (cf. effects.EFFECTS).
+# - seed only: the live catalog is the active version in shop_catalog.
 DEFAULT_ITEMS: list[ShopItem] = [
     # Protection
     ShopItem(
@@ -185,12 +203,185 @@ DEFAULT_ITEMS: list[ShopItem] = [
 ]
 
 
+def normalize(text: str) -> str:
+    """Minuscules, sans accents, ponctuation -> espaces ("Cadre Néon" -> "cadre neon")."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.split(r"[^0-9a-z]+", text.lower())).strip()
+
+
+class _TrieNode:
+    __slots__ = ("children", "items")
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TrieNode] = {}
+        self.items: set[int] = set()  # index dans ShopCatalog.items des items dont un mot commence ici
+
+
+class ShopCatalog:
+    """Catalogue indexé, construit une fois: par id, par catégorie, et recherche pour l'autocomplete.
+
+    Recherche (insensible à la casse et aux accents), par ordre de pertinence:
+      0. id exact   1. id ou nom qui commence par la saisie
+      2. chaque mot saisi est le début d'un mot de l'id ou du nom (trie)
+      3. la saisie apparaît n'importe où dans l'id ou le nom
+    """
+
+    def __init__(self, items: Iterable[ShopItem], version: int = 0):
+        self.version = int(version)  # fait partie des clés du cache d'embeds
+        self.items: tuple[ShopItem, ...] = tuple(items)
+        self.by_id: dict[str, ShopItem] = {it.item_id: it for it in self.items}
+        cats: dict[str, list[ShopItem]] = {}
+        for it in self.items:
+            cats.setdefault(it.category, []).append(it)
+        self.by_category: dict[str, tuple[ShopItem, ...]] = {c: tuple(v) for c, v in cats.items()}
+
+        self._keys: tuple[tuple[str, str], ...] = tuple((normalize(it.item_id), normalize(it.name)) for it in self.items)
+        self._root = _TrieNode()
+        for i, (nid, nname) in enumerate(self._keys):
+            for word in set(nid.split() + nname.split()):
+                node = self._root
+                for ch in word:
+                    node = node.children.setdefault(ch, _TrieNode())
+                    node.items.add(i)
+
+    def get(self, item_id: str) -> ShopItem | None:
+        return self.by_id.get(item_id)
+
+    def in_category(self, category: str) -> tuple[ShopItem, ...]:
+        return self.by_category.get(category, ())
+
+    def _prefixed(self, word: str) -> set[int]:
+        node = self._root
+        for ch in word:
+            node = node.children.get(ch)
+            if node is None:
+                return set()
+        return node.items
+
+    def rank(self, query: str, candidates: Iterable[int] | None = None) -> list[int]:
+        """Indices des items correspondant à `query`, triés par pertinence puis ordre du catalogue."""
+        q = normalize(query)
+        pool = range(len(self.items)) if candidates is None else candidates
+        if not q:
+            return list(pool)
+        words = q.split()
+        by_words = set.intersection(*(self._prefixed(w) for w in words))
+        scored = []
+        for i in pool:
+            nid, nname = self._keys[i]
+            if q == nid:
+                score = 0
+            elif nid.startswith(q) or nname.startswith(q):
+                score = 1
+            elif i in by_words:
+                score = 2
+            elif q in nid or q in nname:
+                score = 3
+            else:
+                continue
+            scored.append((score, i))
+        return [i for _, i in sorted(scored)]
+
+    def search(self, query: str, limit: int = 25) -> list[ShopItem]:
+        return [self.items[i] for i in self.rank(query)[:limit]]
+
+    def find(self, query: str) -> ShopItem | None:
+        """Id exact, sinon meilleur résultat de recherche (saisie libre dans /buy)."""
+        it = self.by_id.get(query)
+        if it is None:
+            hits = self.rank(query)
+            it = self.items[hits[0]] if hits else None
+        return it
+
+
+_catalog = ShopCatalog(DEFAULT_ITEMS)
+
+
+def catalog() -> ShopCatalog:
+    """Index en service (à relire à chaque commande: il est remplacé au rechargement)."""
+    return _catalog
+
+
+def install(cat: ShopCatalog) -> None:
+    global _catalog
+    _catalog = cat
+
+
 def get_item(item_id: str) -> ShopItem | None:
-    for it in DEFAULT_ITEMS:
-        if it.item_id == item_id:
-            return it
-    return None
+    return _catalog.by_id.get(item_id)
+
+
+def items_by_category(category: str) -> tuple[ShopItem, ...]:
+    return _catalog.by_category.get(category, ())
+
+
+# ---------- (dé)sérialisation / validation ----------
+def items_to_json(items: Iterable[ShopItem]) -> str:
+    return json.dumps([asdict(it) for it in items], ensure_ascii=False, indent=1)
+
+
+def _item_from_dict(d: dict[str, Any]) -> ShopItem:
+    item_id = str(d.get("item_id") or "").strip()
+    if not re.fullmatch(r"[a-z0-9_]{1,64}", item_id):
+        raise ValueError(f"item_id invalide: {item_id!r}")
+    name = str(d.get("name") or "").strip()
+    if not name:
+        raise ValueError(f"{item_id}: nom manquant")
+    if d.get("category") not in config.SHOP_CATEGORIES:
+        raise ValueError(f"{item_id}: catégorie inconnue {d.get('category')!r}")
+    if d.get("rarity") not in config.RARITY_INFO:
+        raise ValueError(f"{item_id}: rareté inconnue {d.get('rarity')!r}")
+    price = d.get("price")
+    if not isinstance(price, int) or isinstance(price, bool) or price < 0:
+        raise ValueError(f"{item_id}: prix invalide {price!r}")
+    effect_key = d.get("effect_key") or None
+    if effect_key is not None and get_effect(str(effect_key)) is None:
+        raise ValueError(f"{item_id}: effet inconnu {effect_key!r}")
+    duration = d.get("duration_minutes")
+    if duration is not None and (not isinstance(duration, int) or isinstance(duration, bool) or duration <= 0):
+        raise ValueError(f"{item_id}: durée invalide {duration!r}")
+    if duration is None and effect_key is not None and is_timed(str(effect_key)):
+        raise ValueError(f"{item_id}: l'effet {effect_key!r} demande duration_minutes")
+    return ShopItem(
+        item_id, name, d["category"], d["rarity"], price, str(d.get("description") or ""),
+        effect_key=None if effect_key is None else str(effect_key),
+        duration_minutes=duration,
+    )
+
+
+def items_from_json(text: str) -> list[ShopItem]:
+    """Parse et valide un catalogue (liste d'objets ShopItem). ValueError au premier problème."""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON invalide: {e}") from None
+    if not isinstance(data, list) or not data:
+        raise ValueError("le catalogue doit être une liste non vide d'items")
+    items: list[ShopItem] = []
+    seen: set[str] = set()
+    for i, d in enumerate(data):
+        if not isinstance(d, dict):
+            raise ValueError(f"entrée #{i + 1}: objet attendu")
+        it = _item_from_dict(d)
+        if it.item_id in seen:
+            raise ValueError(f"item_id en double: {it.item_id}")
+        seen.add(it.item_id)
+        items.append(it)
+    return items
+
 
+def load_catalog(db: Database) -> ShopCatalog:
+    """Charge la version active depuis la base (bloquant) et la met en service.
 
-def items_by_category(category: str) -> list[ShopItem]:
-    return [it for it in DEFAULT_ITEMS if it.category == category]
+    Base neuve: DEFAULT_ITEMS est publié comme version 1. Sans changement de
+    version, l'index en place est gardé tel quel.
+    """
+    row = db.catalog_get()
+    if row is None:
+        db.catalog_publish(items_to_json(DEFAULT_ITEMS), "catalogue par défaut")
+        row = db.catalog_get()
+    version = int(row["version"])
+    if version != _catalog.version:
+        install(ShopCatalog(items_from_json(row["items_json"]), version))
+    return _catalog
@@ -11,10 +11,21 @@ Lancer:
   pip install -U discord.py python-dotenv
   # .env : DISCORD_TOKEN=...  OWNER_ID=... (optionnel)
   python main.py
+  python main.py --profile-startup   # coût d'import et de setup par module, sans se connecter
 """
 
 import asyncio
+import hashlib
+import json
+import os
 import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+_T0 = time.perf_counter()
 
 import discord
 from discord import app_commands
@@ -22,12 +33,38 @@ from discord.ext import commands
 
 from kz_casino_bot import config
 from kz_casino_bot.db import Database
-from keep_alive import keep_alive
+from kz_casino_bot.embed_cache import EMBEDS
+from kz_casino_bot.health import HealthServer
+from kz_casino_bot.loopmon import LoopMonitor
+from kz_casino_bot.maintenance import DbMaintenance
+from kz_casino_bot.metrics import METRICS
+
+
+EXTENSIONS = (
+    "kz_casino_bot.cogs.economy",
+    "kz_casino_bot.cogs.games",
+    "kz_casino_bot.cogs.shop",
+    "kz_casino_bot.cogs.admin",
+    "kz_casino_bot.cogs.profile",
+    "kz_casino_bot.cogs.help",
+    "kz_casino_bot.cogs.prediction",        # prediction game
+    "kz_casino_bot.cogs.pvp",               # PvP / Duels
+    "kz_casino_bot.cogs.loans",             # prêts (banque + P2P)
+    "kz_casino_bot.cogs.activity_rewards",  # activity rewards
+)
+
+# Clé settings du hash de l'arbre de commandes déjà synchronisé
+COMMAND_TREE_HASH_KEY = "command_tree_hash"
 
 
 class CasinoCommandTree(app_commands.CommandTree):
     """Custom CommandTree avec vérification des salons autorisés."""
 
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError) -> None:
+        cmd = interaction.command.qualified_name if interaction.command else "?"
+        METRICS.inc("kz_command_errors_total", command=cmd)
+        await super().on_error(interaction, error)
+
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         """Vérifie si la commande peut être utilisée dans ce salon."""
         # Récupérer le bot et la db
@@ -82,17 +119,14 @@ class CasinoCommandTree(app_commands.CommandTree):
         config_channels = getattr(config, "ALLOWED_CHANNEL_IDS", []) or []
         config_categories = getattr(config, "ALLOWED_CATEGORY_IDS", []) or []
         
-        # Depuis la base de données
-        db_channels = []
-        db_categories = []
-        try:
-            db_channels = db.list_allowed_channels(interaction.guild.id)
-        except Exception:
-            db_channels = []
+        # Depuis la base de données (en cache, invalidé via la table `changes`)
+        db_channels = frozenset()
+        db_categories = frozenset()
         try:
-            db_categories = db.list_allowed_categories(interaction.guild.id)
+            gate = db.guild_gate(interaction.guild.id)
+            db_channels, db_categories = gate.channels, gate.categories
         except Exception:
-            db_categories = []
+            pass
         
         # Combiner les deux sources
         allowed_channels = set(config_channels) | set(db_channels)
@@ -149,87 +183,258 @@ class CasinoCommandTree(app_commands.CommandTree):
         return False
 
 
-class CasinoBot(commands.Bot):
+class CasinoBot(commands.AutoShardedBot):
     def __init__(self):
         intents = discord.Intents.default()
         intents.voice_states = True  # IMPORTANT pour le tracking vocal
         super().__init__(
             command_prefix="!",
             intents=intents,
-            tree_cls=CasinoCommandTree  # Utilise notre CommandTree personnalisé
+            tree_cls=CasinoCommandTree,  # Utilise notre CommandTree personnalisé
+            shard_count=config.SHARD_COUNT,
+            shard_ids=config.SHARD_IDS,
         )
         self.db = Database(config.DB_PATH)
+        self.db.shard_count = config.SHARD_COUNT or 1
+        self._changes_poller: asyncio.Task | None = None
+        self._maintenance: asyncio.Task | None = None
+        # Durées des étapes de démarrage (secondes), affichées au on_ready
+        self.startup_timings: dict[str, float] = {}
+        self.loopmon: LoopMonitor | None = None  # fourni par main()
 
     async def setup_hook(self):
+        t = time.perf_counter()
+
         # init db
-        self.db.init()
+        await asyncio.to_thread(self.db.init)
 
         # default win gifs
         if self.db.get_setting("win_gifs") is None:
             try:
-                import json as _json
-                self.db.set_setting("win_gifs", _json.dumps(getattr(config, "DEFAULT_WIN_GIFS", [])))
+                self.db.set_setting("win_gifs", json.dumps(getattr(config, "DEFAULT_WIN_GIFS", [])))
             except Exception:
                 self.db.set_setting("win_gifs", "[]")
+        self.startup_timings["db"] = time.perf_counter() - t
+
+        # load cogs (en parallèle: les cog_load qui touchent la DB se chevauchent)
+        t = time.perf_counter()
+        await asyncio.gather(*(self._load_timed(name) for name in EXTENSIONS))
+        self.startup_timings["cogs"] = time.perf_counter() - t
+
+        # embeds statiques (aide, shop, panel): reconstruits après /odds set|reset
+        self.db.subscribe("setting", EMBEDS.invalidate)
+
+        # caches partagés entre process: relecture périodique de la table `changes`
+        await asyncio.to_thread(self.db.poll_changes)
+        self._changes_poller = asyncio.create_task(self._poll_changes())
+
+        # checkpoint du WAL / optimize / vacuum: un seul process par base
+        if config.IS_PRIMARY and config.MAINT_ENABLED:
+            maintenance = DbMaintenance(
+                self.db,
+                int(config.MAINT_WAL_LIMIT_MB * 1024 * 1024),
+                config.MAINT_QUIET_S,
+                config.MAINT_OPTIMIZE_H * 3600,
+                config.MAINT_VACUUM_FREE_PCT,
+                config.MAINT_VACUUM_PAGES,
+                int(config.MAINT_VACUUM_CONVERT_MAX_MB * 1024 * 1024),
+                config.MAINT_VACUUM_CONVERT,
+            )
+            self._maintenance = asyncio.create_task(maintenance.run(config.MAINT_INTERVAL_S))
+
+        # sync commands (seulement si l'arbre a changé, et par un seul process)
+        if config.IS_PRIMARY:
+            t = time.perf_counter()
+            synced = await self.sync_commands_if_changed()
+            self.startup_timings["sync" if synced else "sync (inchangé)"] = time.perf_counter() - t
+
+    async def close(self) -> None:
+        for task in (self._changes_poller, self._maintenance):
+            if task:
+                task.cancel()
+        await super().close()
+
+    async def _poll_changes(self) -> None:
+        while True:
+            await asyncio.sleep(config.CACHE_POLL_INTERVAL_S)
+            try:
+                await asyncio.to_thread(self.db.poll_changes)
+            except Exception as e:
+                print(f"⚠️ Relecture des changements: {type(e).__name__}: {e}")
+
+    async def on_shard_ready(self, shard_id: int) -> None:
+        # shard (re)connecté: la liste de ses serveurs a pu changer
+        self.db.set_shard_count(self.shard_count or 1)
+        self.db.drop_shard_cache(shard_id)
+        print(f"🧩 Shard {shard_id + 1}/{self.shard_count} prêt")
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command) -> None:
+        METRICS.inc("kz_commands_total", command=command.qualified_name)
+
+    async def _load_timed(self, name: str) -> None:
+        t = time.perf_counter()
+        await self.load_extension(name)
+        self.startup_timings[name.rsplit(".", 1)[-1]] = time.perf_counter() - t
+
+    def command_tree_hash(self) -> str:
+        """Empreinte stable du payload envoyé à Discord par tree.sync()."""
+        payload = sorted((cmd.to_dict(self.tree) for cmd in self.tree.get_commands()), key=lambda c: c["name"])
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return f"{self.application_id}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+    async def sync_commands_if_changed(self) -> bool:
+        """Synchronise les slash commands si leur hash diffère du dernier sync (FORCE_SYNC=1 pour forcer)."""
+        digest = self.command_tree_hash()
+        if os.getenv("FORCE_SYNC") != "1" and self.db.get_setting(COMMAND_TREE_HASH_KEY) == digest:
+            print("✅ Slash commands inchangées (sync ignorée)")
+            return False
+        await self.tree.sync()
+        self.db.set_setting(COMMAND_TREE_HASH_KEY, digest)
+        print("✅ Slash commands synchronisées")
+        return True
 
-        # load cogs
-        await self.load_extension("kz_casino_bot.cogs.economy")
-        await self.load_extension("kz_casino_bot.cogs.games")
-        await self.load_extension("kz_casino_bot.cogs.shop")
-        await self.load_extension("kz_casino_bot.cogs.admin")
-        await self.load_extension("kz_casino_bot.cogs.profile")
-        await self.load_extension("kz_casino_bot.cogs.help")
-
-        # NEW: prediction game
-        await self.load_extension("kz_casino_bot.cogs.prediction")
+    def format_startup_timings(self) -> str:
+        parts = [f"{k} {v * 1000:.0f}ms" for k, v in self.startup_timings.items()]
+        return f"⏱️ Démarrage en {time.perf_counter() - _T0:.1f}s — " + ", ".join(parts)
 
-        # NEW: PvP / Duels
-        await self.load_extension("kz_casino_bot.cogs.pvp")
 
-        # NEW: loans / prêts (banque + P2P)
-        await self.load_extension("kz_casino_bot.cogs.loans")
+# Reconnexion après rate limit (429): backoff exponentiel avec jitter
+LOGIN_MAX_ATTEMPTS = 5
+LOGIN_BACKOFF_BASE_S = 5.0
+LOGIN_BACKOFF_MAX_S = 300.0
 
-        # NEW: activity rewards
-        await self.load_extension("kz_casino_bot.cogs.activity_rewards")
 
-        # sync commands
-        await self.tree.sync()
-        print("✅ Slash commands synchronisées")
+def _backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    delay = min(LOGIN_BACKOFF_MAX_S, LOGIN_BACKOFF_BASE_S * (2 ** attempt))
+    if retry_after:
+        delay = max(delay, float(retry_after))
+    return delay * random.uniform(1.0, 1.25)
 
 
 async def main():
     if not config.TOKEN:
         raise RuntimeError("DISCORD_TOKEN manquant. Mets-le dans .env")
-    keep_alive()
-    
-    # Délai pour éviter le rate limit Discord lors des redémarrages
-    import time
-    delay = random.randint(3, 10)
-    print(f"⏳ Attente de {delay}s avant connexion...")
-    time.sleep(delay)
-    
-    bot = CasinoBot()
-
-    @bot.event
-    async def on_ready():
-        print(f"🎰 Connecté en tant que {bot.user}")
+    monitor = None
+    if config.LOOPMON_ENABLED:
+        monitor = LoopMonitor(config.LOOPMON_INTERVAL_S, config.LOOPMON_STALL_S)
+        monitor.start(asyncio_debug=config.LOOPMON_ASYNCIO_DEBUG)
+    health = None
+    if config.HEALTH_ENABLED:
+        health = HealthServer(Database(config.DB_PATH), config.HEALTH_HOST, config.HEALTH_PORT, monitor)
+        await health.start()
 
     try:
-        await bot.start(config.TOKEN)
-    except discord.errors.HTTPException as e:
-        if e.status == 429:
-            print("⚠️ Rate limit Discord ! Attends quelques minutes...")
-            time.sleep(60)
-            await bot.start(config.TOKEN)
-        else:
-            raise
-    except KeyboardInterrupt:
-        pass
+        await _run_bot(health, monitor)
     finally:
-        await bot.close()
+        if health:
+            await health.close()
+        if monitor:
+            monitor.stop()
+
+
+async def _run_bot(health: HealthServer | None, monitor: LoopMonitor | None) -> None:
+    for attempt in range(LOGIN_MAX_ATTEMPTS):
+        # Nouveau client à chaque tentative: setup_hook/extensions ne se rechargent pas sur un client déjà initialisé
+        bot = CasinoBot()
+        bot.loopmon = monitor
+        if health:
+            health.bot = bot
+
+        @bot.event
+        async def on_ready(bot=bot):
+            print(f"🎰 Connecté en tant que {bot.user}")
+            if bot.startup_timings:
+                print(bot.format_startup_timings())
+                bot.startup_timings.clear()
+
+        try:
+            await bot.start(config.TOKEN)
+            return
+        except discord.errors.HTTPException as e:
+            if e.status != 429 or attempt == LOGIN_MAX_ATTEMPTS - 1:
+                raise
+            delay = _backoff_delay(attempt, getattr(e, "retry_after", None))
+            print(f"⚠️ Rate limit Discord ! Nouvelle tentative dans {delay:.0f}s...")
+        finally:
+            await bot.close()
+        await asyncio.sleep(delay)
+
+
+# ============================================
+# Profilage du démarrage (--profile-startup)
+# ============================================
+
+def _profile_imports() -> list[tuple[str, int, int]]:
+    """Importe main + cogs dans un sous-processus `-X importtime`.
+
+    Retourne [(module, self_us, cumulative_us)] pour les imports de premier niveau
+    et tous les modules kz_casino_bot.
+    """
+    code = "import main\n" + "".join(f"import {name}\n" for name in EXTENSIONS)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    out: list[tuple[str, int, int]] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            head, cumulative, raw_name = line.split("|", 2)
+            self_us = int(head.split(":", 1)[1])
+            cum_us = int(cumulative)
+        except ValueError:
+            continue
+        name = raw_name.strip()
+        top_level = len(raw_name) - len(raw_name.lstrip()) <= 1
+        if top_level or name.startswith("kz_casino_bot") or name == "main":
+            out.append((name, self_us, cum_us))
+    return out
+
+
+async def profile_startup() -> None:
+    """Mesure imports + setup (db, cogs, hash des commandes) sur une copie de la DB."""
+    print("⏱️ Imports (cumulé, sous-processus -X importtime)")
+    for name, self_us, cum_us in sorted(_profile_imports(), key=lambda r: -r[2])[:25]:
+        print(f"  {cum_us / 1000:8.1f}ms  (propre {self_us / 1000:6.1f}ms)  {name}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Copie de la DB: les cog_load (recovery escrows, etc.) ne touchent pas la vraie base
+        path = os.path.join(tmp, "profile.db")
+        if os.path.exists(config.DB_PATH):
+            src, dst = sqlite3.connect(config.DB_PATH), sqlite3.connect(path)
+            with dst:
+                src.backup(dst)
+            src.close()
+            dst.close()
+
+        bot = CasinoBot()
+        bot.db = Database(path)
+        try:
+            t = time.perf_counter()
+            await asyncio.to_thread(bot.db.init)
+            bot.startup_timings["db"] = time.perf_counter() - t
+            # séquentiel: coût propre de chaque extension
+            for name in EXTENSIONS:
+                await bot._load_timed(name)
+            t = time.perf_counter()
+            bot.command_tree_hash()
+            bot.startup_timings["hash commandes"] = time.perf_counter() - t
+        finally:
+            await bot.close()
+
+    print("⏱️ Setup")
+    for name, secs in bot.startup_timings.items():
+        print(f"  {secs * 1000:8.1f}ms  {name}")
+    print(f"  {sum(bot.startup_timings.values()) * 1000:8.1f}ms  total")
 
 
 if __name__ == "__main__":
+    if "--profile-startup" in sys.argv[1:]:
+        asyncio.run(profile_startup())
+        sys.exit(0)
     try:
         asyncio.run(main())
     except KeyboardInterrupt: